@@ -1,28 +1,71 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 class MetroNetworkDesignCoverage:
-    def __init__(self, transfer_areas, terminal_nodes, coverage_function):
+    def __init__(self, transfer_areas, terminal_nodes, coverage_function=None, coverage_matrix_function=None,
+                 cache_size=65536, block_size=256, workers=None):
         self.transfer_areas = transfer_areas  # Dictionary of transfer areas
         self.terminal_nodes = terminal_nodes  # Dictionary of terminal nodes
         self.coverage_function = coverage_function  # Function to compute path coverage
+        # Optional vectorized function: (start_nodes, end_nodes) -> len(start_nodes) x len(end_nodes) array
+        self.coverage_matrix_function = coverage_matrix_function
+        self.block_size = block_size  # Start nodes per block of the coverage matrix
+        self.workers = workers  # Threads computing blocks in parallel
         self.solutions = {}  # Dictionary to store solutions
+        if coverage_function is None and coverage_matrix_function is None:
+            raise ValueError("Either coverage_function or coverage_matrix_function is required")
+        # Scalar results are shared by transfer areas with common nodes or terminals
+        self.cached_coverage = lru_cache(maxsize=cache_size)(coverage_function) if coverage_function else None
+
+    def coverage_matrix(self, start_nodes, end_nodes):
+        # Coverage of every (start, end) pair, one row per start node, in the dtype of the
+        # function's results so best_lines returns the same values the function did
+        if self.coverage_matrix_function is not None:
+            return np.asarray(self.coverage_matrix_function(start_nodes, end_nodes))
+        return np.array([[self.cached_coverage(start, end) for end in end_nodes] for start in start_nodes]
+                        ).reshape(len(start_nodes), len(end_nodes))
+
+    def blocked_coverage_matrix(self, start_nodes, end_nodes):
+        # Split the rows in blocks and compute them in parallel when workers is set
+        blocks = [start_nodes[i:i + self.block_size] for i in range(0, len(start_nodes), self.block_size)]
+        if self.workers is not None and self.workers > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                rows = list(executor.map(lambda block: self.coverage_matrix(block, end_nodes), blocks))
+        else:
+            rows = [self.coverage_matrix(block, end_nodes) for block in blocks]
+        return np.vstack(rows) if rows else np.zeros((0, len(end_nodes)))
+
+    def best_lines(self, start_nodes, end_nodes, matrix):
+        # Best terminal per row; a row whose best coverage is not positive has no line
+        best = np.argmax(matrix, axis=1) if len(end_nodes) else np.zeros(len(start_nodes), dtype=np.int64)
+        lines = {}
+        for row, (start_node, column) in enumerate(zip(start_nodes, best)):
+            max_coverage = matrix[row, column].item() if len(end_nodes) else 0
+            if max_coverage > 0:
+                lines[start_node] = ((start_node, end_nodes[column]), max_coverage)
+            else:
+                lines[start_node] = (None, 0)
+        return lines
 
     def compute_best_line(self, start_node, end_nodes):
         # Function to compute the best metro line and its path coverage
-        best_line = None
-        max_coverage = 0
-        for end_node in end_nodes:
-            coverage = self.coverage_function(start_node, end_node)
-            if coverage > max_coverage:
-                max_coverage = coverage
-                best_line = (start_node, end_node)
-        return best_line, max_coverage
+        end_nodes = list(end_nodes)
+        matrix = self.coverage_matrix([start_node], end_nodes)
+        return self.best_lines([start_node], end_nodes, matrix)[start_node]
 
     def algorithm_1(self):
-        # Step 1: Compute best lines for nodes in transfer areas to terminal nodes
+        # Step 1: Compute best lines for nodes in transfer areas to terminal nodes.
+        # Nodes shared by several transfer areas get a single row of the matrix.
+        end_nodes = list(self.terminal_nodes)
+        start_nodes = list(dict.fromkeys(node for area_nodes in self.transfer_areas.values() for node in area_nodes))
+        matrix = self.blocked_coverage_matrix(start_nodes, end_nodes)
+        lines = self.best_lines(start_nodes, end_nodes, matrix)
+
         for area_key, area_nodes in self.transfer_areas.items():
             self.solutions[area_key] = {}
             for start_node in area_nodes:
-                best_line, coverage = self.compute_best_line(start_node, self.terminal_nodes)
-                self.solutions[area_key][start_node] = (best_line, coverage)
+                self.solutions[area_key][start_node] = lines[start_node]
 
         return self.solutions
 
@@ -31,16 +74,17 @@ def coverage_function(start, end):
     # Placeholder coverage function (the actual function should compute real path coverage)
     return abs(hash(start) - hash(end)) % 100
 
-transfer_areas = {
-    'T1': ['A1', 'A2'],
-    'T2': ['B1', 'B2'],
-    'T3': ['C1', 'C2'],
-    'T4': ['D1', 'D2'],
-    'T5': ['E1', 'E2']
-}
+if __name__ == '__main__':
+    transfer_areas = {
+        'T1': ['A1', 'A2'],
+        'T2': ['B1', 'B2'],
+        'T3': ['C1', 'C2'],
+        'T4': ['D1', 'D2'],
+        'T5': ['E1', 'E2']
+    }
 
-terminal_nodes = ['F1', 'F2', 'F3', 'F4']
+    terminal_nodes = ['F1', 'F2', 'F3', 'F4']
 
-metro_network = MetroNetworkDesignCoverage(transfer_areas, terminal_nodes, coverage_function)
-solutions = metro_network.algorithm_1()
-print(solutions)
+    metro_network = MetroNetworkDesignCoverage(transfer_areas, terminal_nodes, coverage_function)
+    solutions = metro_network.algorithm_1()
+    print(solutions)
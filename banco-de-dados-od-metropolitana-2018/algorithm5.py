@@ -1,64 +1,225 @@
+import argparse
+import numpy as np
 import pandas as pd
-import folium
-from folium import plugins
-import json
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse.csgraph import dijkstra
 
 from tqdm import tqdm
 
+from catchment import CatchmentCoverage
+from instrumentation import add_report_arguments, count, finish_from_arguments, start_from_arguments, stage, timed
+from network_coverage import NetworkCoverage
+from render import generate_network_map
+from threshold_sweep import threshold_sweep
+from zone_index import ZoneIndex
+
+def csr_arrays(sources, targets, num_ids):
+    # (indptr, indices) grouping the targets by source; a stable sort keeps the
+    # neighbors of each node in edge order
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(num_ids + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_ids), out=indptr[1:])
+    return indptr, targets[order]
+
+
+def beam_search(indptr, indices, coverage, starts, distance, beam_width, detour=0.5):
+    # Beam version of the greedy walk: keep the beam_width partial paths with the
+    # highest accumulated coverage, expanding all of them at once with array
+    # operations. distance is the hop count from every node to the destination (inf
+    # when unreachable, 0 inside it). A path from a start s may take at most
+    # distance[s] * (1 + detour) hops, so the beam cannot wander off and a shortest
+    # route always stays open. Stops at the first step where some path enters the
+    # destination and returns the best such path; if the beam dies out, the best
+    # partial path seen. Paths never revisit a node.
+    starts = np.asarray(starts, dtype=np.int64)
+    starts = starts[np.isfinite(distance[starts])]
+    if len(starts) == 0:
+        return []
+    order = np.argsort(-coverage[starts], kind='stable')[:beam_width]
+    paths = starts[order][:, None]
+    scores = coverage[paths[:, 0]]
+    # Hops each path may still take
+    remaining = np.floor(distance[paths[:, 0]] * (1 + detour))
+    best_path, best_score = paths[0], scores[0]
+
+    while len(paths):
+        # Every (state, neighbor) pair of the beam in one batch
+        current = paths[:, -1]
+        degree = indptr[current + 1] - indptr[current]
+        parent = np.repeat(np.arange(len(paths)), degree)
+        offsets = np.arange(len(parent)) - np.repeat(np.cumsum(degree) - degree, degree)
+        neighbor = indices[indptr[current][parent] + offsets]
+        count('beam_expansions', len(neighbor))
+
+        valid = (distance[neighbor] <= remaining[parent] - 1) & ~(paths[parent] == neighbor[:, None]).any(axis=1)
+        parent = parent[valid]
+        neighbor = neighbor[valid]
+        if len(neighbor) == 0:
+            break
+        candidate_scores = scores[parent] + coverage[neighbor]
+
+        arrived = distance[neighbor] == 0
+        if arrived.any():
+            best = np.flatnonzero(arrived)[np.argmax(candidate_scores[arrived])]
+            return np.append(paths[parent[best]], neighbor[best]).tolist()
+
+        # One state per node (the highest scoring), then the top beam_width states
+        order = np.lexsort((-candidate_scores, neighbor))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = neighbor[order][1:] != neighbor[order][:-1]
+        keep = order[first]
+        keep = keep[np.argsort(-candidate_scores[keep], kind='stable')[:beam_width]]
+        paths = np.column_stack((paths[parent[keep]], neighbor[keep]))
+        scores = candidate_scores[keep]
+        remaining = remaining[parent[keep]] - 1
+        if scores[0] > best_score:
+            best_path, best_score = paths[0], scores[0]
+
+    return best_path.tolist()
+
+
+# Undirected pruned graph held by each process of the beam pool, sent once by the initializer
+_beam_graph = None
+
+
+def init_beam_worker(indptr, indices, coverage):
+    global _beam_graph
+    _beam_graph = (indptr, indices, coverage)
+
+
+def beam_worker(starts, distance, beam_width, detour):
+    return beam_search(*_beam_graph, starts, distance, beam_width, detour)
+
+
 class MetroNetworkDesign:
-    def __init__(self, nodes_df, edges_df, coverage_threshold, target_zones):
+    def __init__(self, nodes_df, edges_df, coverage_threshold, target_zones, catchment=None):
         # Prune nodes with low path coverage
-        self.nodes = nodes_df[(nodes_df['path_coverage'] > coverage_threshold) | (nodes_df['zone'].isin(target_zones))]
-        self.edges = edges_df[edges_df['source'].isin(self.nodes['id']) & edges_df['target'].isin(self.nodes['id'])]
+        with stage('algorithm5.prune'):
+            self.nodes = nodes_df[(nodes_df['path_coverage'] > coverage_threshold) | (nodes_df['zone'].isin(target_zones))]
+            self.edges = edges_df[edges_df['source'].isin(self.nodes['id']) & edges_df['target'].isin(self.nodes['id'])]
         self.target_zones = target_zones
+        # Optional catchment.CatchmentCoverage: paths are then scored by the coverage
+        # of every node within walking distance of their stations
+        self.catchment = catchment
+        self.zone_index = ZoneIndex.from_nodes(self.nodes)
         self.solutions = []  # List to store solutions
+        self.build_adjacency()
+
+    @timed('algorithm5.build_adjacency')
+    def build_adjacency(self):
+        # Compile the pruned graph once into CSR arrays indexed by node id, so a
+        # hop of the walk only touches the neighbors of the current node
+        num_ids = int(max(self.nodes['id'].max(), self.edges[['source', 'target']].values.max(initial=-1))) + 1
+        sources = self.edges['source'].to_numpy(dtype=np.int64)
+        targets = self.edges['target'].to_numpy(dtype=np.int64)
+
+        self.indptr, self.indices = csr_arrays(sources, targets, num_ids)
+
+        # Nodes that appear as the source of some edge (the walk can leave them)
+        self.has_out = np.diff(self.indptr) > 0
+
+        # The edges only go from lower to higher ids, so the greedy walk can never
+        # move to a lower id. The beam search runs on both directions of every edge.
+        self.beam_indptr, self.beam_indices = csr_arrays(np.concatenate((sources, targets)),
+                                                         np.concatenate((targets, sources)), num_ids)
+        self.beam_graph = sp.csr_matrix((np.ones(len(self.beam_indices)), self.beam_indices, self.beam_indptr),
+                                        shape=(num_ids, num_ids))
+
+        # Dense id -> path_coverage lookup
+        self.coverage = np.zeros(num_ids, dtype=np.float64)
+        self.coverage[self.nodes['id'].to_numpy(dtype=np.int64)] = self.nodes['path_coverage'].to_numpy()
 
     def compute_total_coverage(self, path):
         # Calculate the total path coverage for a given path
-        total_coverage = sum(self.nodes.loc[self.nodes['id'].isin(path), 'path_coverage'])
+        if self.catchment is not None:
+            return self.catchment.path_coverage(path)
+        total_coverage = self.coverage[np.unique(np.asarray(path, dtype=np.int64))].sum()
         return total_coverage
 
+    def network_coverage(self, solutions):
+        # Union coverage of all solution paths, each node counted once; through the
+        # station catchments when a catchment is set, like compute_total_coverage
+        lines = [path for path, _ in solutions.values()]
+        if self.catchment is not None:
+            return NetworkCoverage(self.catchment.coverage, lines, self.catchment.matrix)
+        return NetworkCoverage(self.coverage, lines)
+
     def find_best_path(self, start_node, end_node):
     # Greedy heuristic to find a path with high coverage
-        current_node = start_node
+        current_node = int(start_node)
+        end_node = int(end_node)
         visited = [current_node]
+        visited_set = {current_node}
         
         while current_node != end_node:
             # Get the neighbors of the current node
-            neighbors = self.edges[self.edges['source'] == current_node]['target']
-            if neighbors.empty:
+            neighbors = self.indices[self.indptr[current_node]:self.indptr[current_node + 1]]
+            if len(neighbors) == 0:
                 break
             
             # Filter out neighbors that are isolated and not the end node
-            valid_neighbors = [
-                neighbor for neighbor in neighbors
-                if (neighbor in self.edges['source'].values) or (neighbor == end_node)
-            ]
+            valid_neighbors = neighbors[self.has_out[neighbors] | (neighbors == end_node)]
             
-            if not valid_neighbors:
+            if len(valid_neighbors) == 0:
                 break
             
             # Choose the neighbor with the highest path coverage that hasn't been visited
             best_neighbor = None
             max_coverage = -1
-            for neighbor in valid_neighbors:
-                if neighbor not in visited:
-                    coverage = self.nodes.loc[self.nodes['id'] == neighbor, 'path_coverage'].values[0]
-                    if coverage > max_coverage:
-                        max_coverage = coverage
-                        best_neighbor = neighbor
+            for neighbor, coverage in zip(valid_neighbors.tolist(), self.coverage[valid_neighbors].tolist()):
+                if neighbor not in visited_set and coverage > max_coverage:
+                    max_coverage = coverage
+                    best_neighbor = neighbor
             
             if best_neighbor is None:
                 break
             
             visited.append(best_neighbor)
+            visited_set.add(best_neighbor)
             current_node = best_neighbor
 
+        count('greedy_nodes_visited', len(visited))
         return visited, self.compute_total_coverage(visited)
 
 
-    def algorithm_5(self):
-        solutions = []
+    def find_best_path_beam(self, origin_zone, destination_zone, beam_width, executor=None, workers=1, detour=0.5):
+        # Beam search from every node of the origin zone to any node of the destination
+        # zone. With an executor the start nodes are split into one chunk per worker,
+        # each searched with its own beam, and the best path over the chunks is kept.
+        starts = self.zone_index.nodes(origin_zone)
+        # Hops from every node to the nearest node of the destination zone
+        distance = dijkstra(self.beam_graph, unweighted=True, indices=self.zone_index.nodes(destination_zone),
+                            min_only=True)
+
+        if executor is not None and workers > 1 and len(starts) > 1:
+            chunks = np.array_split(starts, min(workers, len(starts)))
+            paths = list(executor.map(beam_worker, chunks, [distance] * len(chunks),
+                                      [beam_width] * len(chunks), [detour] * len(chunks)))
+        else:
+            paths = [beam_search(self.beam_indptr, self.beam_indices, self.coverage, starts, distance, beam_width,
+                                 detour)]
+
+        # Prefer paths that reach the destination zone, then the highest coverage
+        paths = [path for path in paths if path] or [[int(starts[0])]]
+        scored = [(distance[path[-1]] == 0, self.compute_total_coverage(path), path) for path in paths]
+        _, total_coverage, path = max(scored, key=lambda item: (item[0], item[1]))
+        count('greedy_nodes_visited', len(path))
+        return path, total_coverage
+
+    @timed('algorithm5.algorithm_5')
+    def algorithm_5(self, beam_width=None, workers=None, detour=0.5):
+        # beam_width=None runs the original greedy walk between the first nodes of the
+        # two zones; otherwise a beam search of that width runs from every node of the
+        # origin zone to the destination zone over the undirected graph, with the
+        # starts spread over workers and paths at most (1 + detour) times the hops of
+        # a shortest route. Returns {(origin_zone, destination_zone): (path, coverage)}
+        # like algorithm5_2, since a greedy path can stop short of its destination
+        solutions = {}
+        executor = None
+        if beam_width is not None and workers is not None and workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_beam_worker,
+                                           initargs=(self.beam_indptr, self.beam_indices, self.coverage))
 
         # Define origin and destination zone pairs
         zone_pairs = [
@@ -68,80 +229,79 @@ class MetroNetworkDesign:
         ]
 
         total_pairs = len(zone_pairs)
-        with tqdm(total=total_pairs, desc="Calculating best paths") as pbar:
-            for i, (origin_zone, destination_zone) in enumerate(zone_pairs):
-                origin_nodes = self.nodes[self.nodes['zone'] == origin_zone]
-                destination_nodes = self.nodes[self.nodes['zone'] == destination_zone]
-                if not origin_nodes.empty and not destination_nodes.empty:
-                    start_node = origin_nodes.iloc[0]['id']
-                    end_node = destination_nodes.iloc[0]['id']
-                    best_path, max_coverage = self.find_best_path(start_node, end_node)
-                    solutions.append((best_path, max_coverage))
-                    pbar.update(1)
+        try:
+            with tqdm(total=total_pairs, desc="Calculating best paths") as pbar:
+                for i, (origin_zone, destination_zone) in enumerate(zone_pairs):
+                    # The first node of each zone in table order is the origin/destination
+                    start_node = self.zone_index.first_node(origin_zone)
+                    end_node = self.zone_index.first_node(destination_zone)
+                    count('dataframe_lookups', 2)
+                    if start_node is not None and end_node is not None:
+                        if beam_width is None:
+                            best_path, max_coverage = self.find_best_path(start_node, end_node)
+                        else:
+                            best_path, max_coverage = self.find_best_path_beam(origin_zone, destination_zone,
+                                                                               beam_width, executor, workers or 1,
+                                                                               detour)
+                        solutions[(origin_zone, destination_zone)] = (best_path, max_coverage)
+                        pbar.update(1)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
         return solutions
 
 # Function to generate the HTML content using folium
-def generate_html(nodes_df, solutions):
+@timed('algorithm5.generate_html')
+def generate_html(nodes_df, solutions, edges_df, round_digits=6, simplify_tolerance=None):
     print('generating html')
-    # Initialize a folium map
-    center_lat = nodes_df["y"].mean()
-    center_lng = nodes_df["x"].mean()
-    m = folium.Map(location=[center_lat, center_lng], zoom_start=13)
-
-    # Extract nodes that are part of edges
-    edge_nodes = set()
-    for _, edge in edges_df.iterrows():
-        edge_nodes.add(edge['source'])
-        edge_nodes.add(edge['target'])
-
-    # Filter nodes to include only those in edges
-    filtered_nodes_df = nodes_df[nodes_df['id'].isin(edge_nodes)]
-
-    # Add nodes to map
-    for _, node in filtered_nodes_df.iterrows():
-        folium.CircleMarker(
-            location=[node["y"], node["x"]],
-            radius=5,
-            color='#3388ff',
-            fill=True,
-            fill_color='#3388ff',
-            fill_opacity=0.8,
-            popup=f'Node ID: {node["id"]}<br>Path Coverage: {node["path_coverage"]}'
-        ).add_to(m)
-
-    # Add edges to map
-    for path, _ in solutions:
-        for i in range(len(path) - 1):
-            source_node = filtered_nodes_df[filtered_nodes_df["id"] == path[i]].iloc[0]
-            target_node = filtered_nodes_df[filtered_nodes_df["id"] == path[i + 1]].iloc[0]
-            folium.PolyLine(
-                locations=[
-                    [source_node["y"], source_node["x"]],
-                    [target_node["y"], target_node["x"]]
-                ],
-                color='red'
-            ).add_to(m)
+    # Show every node that is part of an edge, and one polyline per solution path
+    edge_nodes = np.unique(edges_df[['source', 'target']].to_numpy())
+    edge_nodes = edge_nodes[np.isin(edge_nodes, nodes_df['id'].to_numpy())]
 
     # Save the map to an HTML file
     html_file = 'metro_network_solution.html'
-    m.save(html_file)
-    return html_file
+    return generate_network_map(nodes_df, solutions, html_file, node_ids=edge_nodes, round_digits=round_digits,
+                                simplify_tolerance=simplify_tolerance, node_color='#3388ff')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Greedy high-coverage paths between zone pairs (Algorithm 5)")
+    parser.add_argument('--beam-width', type=int, default=None,
+                        help="beam search of this width from every node of the origin zone instead of one greedy walk")
+    parser.add_argument('--workers', type=int, default=None, help="processes for the beam search starts")
+    parser.add_argument('--detour', type=float, default=0.5,
+                        help="beam paths may take up to (1 + detour) times the hops of a shortest route")
+    parser.add_argument('--coverage-threshold', type=float, default=0.01, help="prune nodes with coverage below this")
+    parser.add_argument('--auto-threshold', action='store_true',
+                        help="use the highest coverage threshold that keeps the target zones connected")
+    parser.add_argument('--catchment-radius', type=float, default=None,
+                        help="score paths by the coverage within this walking radius (meters) of their stations")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
 
+    # Example usage
+    nodes_df = pd.read_csv('nodes.csv')
+    edges_df = pd.read_csv('edges.csv')
 
-# Example usage
-nodes_df = pd.read_csv('nodes.csv')
-edges_df = pd.read_csv('edges.csv')
+    # Define a coverage threshold for pruning and target zones
+    coverage_threshold = args.coverage_threshold  # Adjust this threshold based on your dataset
+    target_zones = [173, 53, 24, 215, 59]  # Corresponding to T1, T2, T3, T4, T5
+    if args.auto_threshold:
+        _, recommended = threshold_sweep(nodes_df, edges_df, target_zones, [coverage_threshold])
+        if recommended is not None:
+            coverage_threshold = recommended
+        print(f"Coverage threshold: {coverage_threshold:g}")
 
-# Define a coverage threshold for pruning and target zones
-coverage_threshold = 0.01  # Adjust this threshold based on your dataset
-target_zones = [173, 53, 24, 215, 59]  # Corresponding to T1, T2, T3, T4, T5
+    # Run the algorithm with pruning and a heuristic method
+    catchment = CatchmentCoverage(nodes_df, args.catchment_radius) if args.catchment_radius else None
+    metro_network = MetroNetworkDesign(nodes_df, edges_df, coverage_threshold, target_zones, catchment)
+    solutions = metro_network.algorithm_5(args.beam_width, args.workers, args.detour)
 
-# Run the algorithm with pruning and a heuristic method
-metro_network = MetroNetworkDesign(nodes_df, edges_df, coverage_threshold, target_zones)
-solutions = metro_network.algorithm_5()
+    # Generate the HTML
+    html_file = generate_html(nodes_df, solutions, edges_df)
 
-# Generate the HTML
-html_file = generate_html(nodes_df, solutions)
+    print(f"HTML file created: {html_file}")
 
-print(f"HTML file created: {html_file}")
+    finish_from_arguments(args)
@@ -1,61 +1,326 @@
+import numpy as np
 import pandas as pd
 import networkx as nx
-import folium
-from folium import Popup
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import json
+import os
+
+from candidate_lines import candidate_paths
+from catchment import CatchmentCoverage
+from instrumentation import (add_report_arguments, count, finish_from_arguments, instrumentation,
+                             start_from_arguments, timed)
+from network_coverage import NetworkCoverage, improve_lines, neighbor_sets
+from od_demand import ServedDemand
+from render import generate_network_map
+from routing_index import RoutingIndex
+from snapshot import load_snapshot, save_snapshot
+from zone_index import ZoneIndex
+
+# Relative tolerance for two routes to count as the same length
+TIE_TOLERANCE = 1e-12
+
+
+def tied_path(graph, source, target, distances):
+    # Shortest path rebuilt backwards from target over the CSR graph: at every node the
+    # previous node is the smallest id among the neighbors u on a shortest route
+    # (distances[u] + weight equal to the node's distance up to TIE_TOLERANCE), so the
+    # choice among equally short routes does not depend on the search order
+    path = [target]
+    node = target
+    while node != source:
+        row = slice(graph.indptr[node], graph.indptr[node + 1])
+        neighbors, weights = graph.indices[row], graph.data[row]
+        previous = distances[neighbors]
+        on_route = (previous < distances[node]) & (previous + weights <= distances[node] * (1 + TIE_TOLERANCE))
+        node = int(neighbors[on_route].min())
+        path.append(node)
+    return path[::-1]
+
+
+def single_source_paths(graph, source, targets, method='networkx'):
+    # Shortest paths from source to every target, None where a target is unreachable.
+    # csgraph runs one search from source and breaks ties with tied_path; networkx
+    # runs the bidirectional nx.shortest_path of the original script for every target.
+    if method == 'csgraph':
+        source = int(source)
+        distances = csgraph.dijkstra(graph, directed=False, indices=source)
+        count('dijkstra_calls')
+        count('edges_relaxed', int(np.diff(graph.indptr)[np.isfinite(distances)].sum()))
+        return {target: tied_path(graph, source, int(target), distances)
+                if np.isfinite(distances[int(target)]) else None for target in targets}
+
+    paths = {}
+    for target in targets:
+        count('dijkstra_calls')
+        try:
+            paths[target] = nx.shortest_path(graph, source=source, target=target, weight='weight')
+        except nx.NetworkXNoPath:
+            paths[target] = None
+    return paths
+
+# Graph held by each process of the routing pool, sent once by the initializer
+_routing_graph = None
+_routing_method = None
+
+def init_routing_worker(graph, method):
+    global _routing_graph, _routing_method
+    _routing_graph = graph
+    _routing_method = method
+
+def routing_worker_paths(source, targets):
+    # Counters of a worker process are sent back with its paths
+    instrumentation.reset()
+    paths = single_source_paths(_routing_graph, source, targets, _routing_method)
+    return paths, dict(instrumentation.counters)
 
 class MetroNetworkDesign:
-    def __init__(self, nodes_df=None, edges_df=None, coverage_threshold=None, target_zones=None):
+    def __init__(self, nodes_df=None, edges_df=None, coverage_threshold=None, target_zones=None, catchment=None):
         self.nodes_df = nodes_df
         self.edges_df = edges_df
         self.coverage_threshold = coverage_threshold
         self.target_zones = target_zones
+        # Optional catchment.CatchmentCoverage used to score paths instead of path_coverage
+        self.catchment = catchment
+        self.zone_index = ZoneIndex.from_nodes(nodes_df) if nodes_df is not None else None
         self.graph = self.create_graph() if nodes_df is not None and edges_df is not None else None
         
+    @timed('algorithm5_2.create_graph')
     def create_graph(self):
         graph = nx.Graph()
-        for _, node in self.nodes_df.iterrows():
-            graph.add_node(node['id'], path_coverage=node['path_coverage'], zone=node['zone'], x=node['x'], y=node['y'])
-        for _, edge in self.edges_df.iterrows():
-            source = edge['source']
-            target = edge['target']
-            weight = self.calculate_weight(source, target)
-            graph.add_edge(source, target, weight=weight)
+        node_ids = self.nodes_df['id'].to_numpy()
+        node_attrs = self.nodes_df[['path_coverage', 'zone', 'x', 'y']].to_dict(orient='records')
+        graph.add_nodes_from(zip(node_ids.tolist(), node_attrs))
+        if self.edges_df is not None:
+            sources, targets, weights = self.calculate_weights()
+            graph.add_weighted_edges_from(zip(sources.tolist(), targets.tolist(), weights.tolist()), weight='weight')
         return graph
     
-    def calculate_weight(self, source, target):
-        source_coverage = self.nodes_df[self.nodes_df['id'] == source]['path_coverage'].values[0]
-        target_coverage = self.nodes_df[self.nodes_df['id'] == target]['path_coverage'].values[0]
-        return 1 / min(source_coverage, target_coverage)
+    @timed('algorithm5_2.create_sparse_graph')
+    def create_sparse_graph(self):
+        # Same weighted graph as create_graph, as a symmetric scipy.sparse CSR matrix indexed by node id
+        sources, targets, weights = self.calculate_weights()
+        num_ids = int(max(self.nodes_df['id'].max(), sources.max(initial=-1), targets.max(initial=-1))) + 1
+        # Keep one entry per undirected edge so duplicates are not summed
+        pairs, first = np.unique(np.sort(np.column_stack((sources, targets)), axis=1), axis=0, return_index=True)
+        rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        data = np.concatenate((weights[first], weights[first]))
+        return sp.csr_matrix((data, (rows, cols)), shape=(num_ids, num_ids))
+    
+    def coverage_by_id(self):
+        # Dense id -> path_coverage array
+        node_ids = self.nodes_df['id'].to_numpy(dtype=np.int64)
+        coverage = np.zeros(node_ids.max() + 1, dtype=np.float64)
+        coverage[node_ids] = self.nodes_df['path_coverage'].to_numpy()
+        return coverage
+    
+    def calculate_weights(self):
+        # Weight 1 / min(coverage) for every edge at once
+        coverage = self.coverage_by_id()
+        sources = self.edges_df['source'].to_numpy(dtype=np.int64)
+        targets = self.edges_df['target'].to_numpy(dtype=np.int64)
+        with np.errstate(divide='ignore'):
+            weights = 1 / np.minimum(coverage[sources], coverage[targets])
+        return sources, targets, weights
     
     def find_zone_representatives(self):
         zone_representatives = {}
         for zone in self.target_zones:
-            # Find a node with the highest coverage in the zone to represent it
-            zone_nodes = self.nodes_df[self.nodes_df['zone'] == zone]
-            representative = zone_nodes.loc[zone_nodes['path_coverage'].idxmax()]['id']
-            zone_representatives[zone] = representative
+            # The node with the highest coverage in the zone represents it
+            count('dataframe_lookups')
+            zone_representatives[zone] = self.zone_index.representative(zone)
         return zone_representatives
     
-    def algorithm_5(self, zone_representatives):
+    def build_routing_index(self, zone_representatives=None, num_landmarks=16):
+        # Routing index for the current weighted graph: shortest-path trees from the
+        # zone representatives plus ALT landmarks for any other pair of nodes
+        if zone_representatives is None:
+            zone_representatives = self.find_zone_representatives()
+        return RoutingIndex.build(self.create_sparse_graph(), list(zone_representatives.values()), num_landmarks)
+
+    def load_routing_index(self, directory):
+        # Index saved by save_results; refused if the coverage (and so the weights) changed since
+        routing_index = RoutingIndex.load(directory)
+        if not routing_index.matches(self.create_sparse_graph()):
+            raise ValueError(f"Routing index in {directory} was built for a different graph")
+        return routing_index
+
+    def shortest_path(self, source, target, routing_index=None):
+        # Point-to-point query, answered from the routing index when one is given
+        if routing_index is not None:
+            return routing_index.query(source, target)[0]
+        return single_source_paths(self.graph, source, [target])[target]
+
+    @timed('algorithm5_2.algorithm_5')
+    def algorithm_5(self, zone_representatives, method='networkx', workers=None, verbose=True, pairs=None,
+                    routing_index=None):
+        # method='csgraph' runs one single-source search per representative with
+        # scipy.sparse.csgraph on the CSR matrix and serves every destination from it.
+        # The graph is undirected, so the path for (b, a) is the reversed path for
+        # (a, b) and the last representative never needs its own search. Equally short
+        # routes are broken by smallest node id (see tied_path), so where routes tie the
+        # chosen nodes can differ from the baseline; length and weight are the same.
+        # method='networkx' searches every ordered pair with nx.shortest_path like the
+        # original script and returns exactly its paths, ties included.
+        # workers > 1 spreads the searches across a process pool.
+        # verbose=False replaces the line printed per path with a single summary.
+        # pairs restricts the solve to the given (zone_src, zone_dest) pairs.
+        # routing_index (see build_routing_index) answers the queries without a search
+        # over the whole graph and replaces method and workers.
+        zones = list(zone_representatives.keys())
+        if pairs is None:
+            pairs = [(zone_src, zone_dest) for zone_src in zones for zone_dest in zones if zone_src != zone_dest]
+
+        # With csgraph each unordered pair is searched from the endpoint that comes
+        # first in zone order, with networkx every ordered pair is searched as given
+        position = {zone: i for i, zone in enumerate(zones)}
+        searches = {}
+        for zone_pair in pairs:
+            zone_first, zone_second = sorted(zone_pair, key=position.get) if method == 'csgraph' else zone_pair
+            if zone_second not in searches.get(zone_first, []):
+                searches.setdefault(zone_first, []).append(zone_second)
+        source_zones = list(searches)
+        sources = [zone_representatives[zone] for zone in source_zones]
+        targets = [[zone_representatives[zone] for zone in searches[zone_src]] for zone_src in source_zones]
+        if routing_index is not None:
+            trees = [{target: routing_index.query(source, target)[0] for target in source_targets}
+                     for source, source_targets in zip(sources, targets)]
+        elif workers is not None and workers > 1 and len(sources) > 1:
+            graph = self.create_sparse_graph() if method == 'csgraph' else self.graph
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_routing_worker,
+                                     initargs=(graph, method)) as executor:
+                trees = []
+                for tree, counters in executor.map(routing_worker_paths, sources, targets):
+                    trees.append(tree)
+                    instrumentation.counters.update(counters)
+        else:
+            graph = self.create_sparse_graph() if method == 'csgraph' else self.graph
+            trees = [single_source_paths(graph, source, source_targets, method)
+                     for source, source_targets in zip(sources, targets)]
+
+        coverage = self.coverage_by_id()
+        found_paths = {}
+        for zone_src, tree in zip(source_zones, trees):
+            for zone_dest in searches[zone_src]:
+                path = tree.get(zone_representatives[zone_dest])
+                found_paths[(zone_src, zone_dest)] = path
+                # A reversed path stands in unless the reverse pair has its own search
+                if zone_src not in searches.get(zone_dest, []):
+                    found_paths[(zone_dest, zone_src)] = path[::-1] if path is not None else None
+
         best_paths = {}
+        for zone_src, zone_dest in pairs:
+            path = found_paths[(zone_src, zone_dest)]
+            if path is not None:
+                total_coverage = self.path_coverage(path, coverage)
+                best_paths[(zone_src, zone_dest)] = (path, total_coverage)
+                # Print the path and its total coverage
+                if verbose:
+                    print(f"Path from Zone {zone_src} to Zone {zone_dest}: {path} | Coverage: {total_coverage:.4f}")
+            else:
+                best_paths[(zone_src, zone_dest)] = ([], 0)
+                if verbose:
+                    print(f"No path found from Zone {zone_src} to Zone {zone_dest}")
+
+        if not verbose:
+            found = [(path, coverage) for path, coverage in best_paths.values() if path]
+            print(f"Found {len(found)} of {len(best_paths)} zone-pair paths | "
+                  f"Mean length: {np.mean([len(path) for path, _ in found]) if found else 0:.1f} nodes | "
+                  f"Total coverage: {sum(coverage for _, coverage in found):.4f}")
         
-        for zone_src, src_node in zone_representatives.items():
-            for zone_dest, dest_node in zone_representatives.items():
-                if zone_src != zone_dest:
-                    try:
-                        path = nx.shortest_path(self.graph, source=src_node, target=dest_node, weight='weight')
-                        total_coverage = sum(1 / self.graph[u][v]['weight'] for u, v in zip(path[:-1], path[1:]))
-                        best_paths[(zone_src, zone_dest)] = (path, total_coverage)
-                        # Print the path and its total coverage
-                        print(f"Path from Zone {zone_src} to Zone {zone_dest}: {path} | Coverage: {total_coverage:.4f}")
-                    except nx.NetworkXNoPath:
-                        best_paths[(zone_src, zone_dest)] = ([], 0)
-                        print(f"No path found from Zone {zone_src} to Zone {zone_dest}")
-        
         return best_paths
     
-    def save_results(self, paths, nodes_filename, paths_filename):
+    @timed('algorithm5_2.candidate_lines')
+    def candidate_lines(self, zone_representatives, k=10, workers=None, pairs=None):
+        # Pool of alternative lines: up to k loopless paths per zone pair, shortest
+        # (by 1 / coverage weight) first, as {(zone_src, zone_dest): [(path, coverage), ...]}.
+        # Both directions of a pair share one search; workers > 1 spreads the
+        # shortest-path trees across a process pool.
+        zones = list(zone_representatives.keys())
+        if pairs is None:
+            pairs = [(zone_src, zone_dest) for zone_src in zones for zone_dest in zones if zone_src != zone_dest]
+        node_pairs = list(dict.fromkeys(
+            tuple(sorted((int(zone_representatives[zone_src]), int(zone_representatives[zone_dest]))))
+            for zone_src, zone_dest in pairs))
+        found = candidate_paths(self.create_sparse_graph(), node_pairs, k, workers)
+
+        coverage = self.coverage_by_id()
+        candidates = {}
+        for zone_src, zone_dest in pairs:
+            node_pair = (int(zone_representatives[zone_src]), int(zone_representatives[zone_dest]))
+            paths = found[node_pair] if node_pair in found else [path[::-1] for path in found[node_pair[::-1]]]
+            candidates[(zone_src, zone_dest)] = paths
+        return self.score_paths(candidates, coverage)
+
+    def score_paths(self, candidates, coverage=None):
+        # {key: [path, ...]} -> {key: [(path, coverage), ...]}; catchment scores are one sparse product
+        if self.catchment is None:
+            coverage = self.coverage_by_id() if coverage is None else coverage
+            return {key: [(path, self.path_coverage(path, coverage)) for path in paths]
+                    for key, paths in candidates.items()}
+        flat = [path for paths in candidates.values() for path in paths]
+        scores = iter(self.catchment.paths_coverage(flat).tolist()) if flat else iter(())
+        return {key: [(path, next(scores)) for path in paths] for key, paths in candidates.items()}
+
+    def distinct_lines(self, paths):
+        # Both directions of a zone pair are the same line: {frozenset(pair): (pair, path)}
+        lines = {}
+        for pair, (path, _) in paths.items():
+            if len(path) > 0:
+                lines.setdefault(frozenset(pair), (pair, [int(node) for node in path]))
+        return lines
+
+    def line_network(self, lines):
+        # NetworkCoverage of the lines, scored like path_coverage: through the station
+        # catchments when a catchment is set
+        if self.catchment is not None:
+            return NetworkCoverage(self.catchment.coverage, lines, self.catchment.matrix)
+        return NetworkCoverage(self.coverage_by_id(), lines)
+
+    def network_coverage(self, paths):
+        # Union coverage of the solution: each node's path_coverage counts once, however
+        # many lines stop at (or near) it (see network_coverage.NetworkCoverage)
+        return self.line_network([path for _, path in self.distinct_lines(paths).values()])
+
+    def improve_lines(self, paths, max_growth=0.0, max_rounds=1000):
+        # Local search over the lines of an algorithm_5 solution that raises the
+        # network's union coverage; endpoints stay at the zone representatives and
+        # each line may grow by max_growth times its number of stops
+        lines = self.distinct_lines(paths)
+        coverage = self.coverage_by_id()
+        network = self.line_network([path for _, path in lines.values()])
+        sources = self.edges_df['source'].to_numpy(dtype=np.int64)
+        targets = self.edges_df['target'].to_numpy(dtype=np.int64)
+        neighbors = neighbor_sets(sources, targets, max(len(coverage), int(max(sources.max(initial=-1),
+                                                                               targets.max(initial=-1))) + 1))
+        improve_lines(network, neighbors, max_growth, max_rounds)
+
+        improved = dict(zip(lines, network.lines))
+        best_paths = {}
+        for pair, (path, total_coverage) in paths.items():
+            key = frozenset(pair)
+            if key not in improved:
+                best_paths[pair] = (path, total_coverage)
+                continue
+            line = improved[key] if lines[key][0] == pair else improved[key][::-1]
+            best_paths[pair] = (line, self.path_coverage(line, coverage))
+        return best_paths
+
+    def path_coverage(self, path, coverage=None):
+        # Sum of 1 / weight over the path edges, i.e. the min coverage of each edge, or
+        # the catchment coverage of the path's stations when a catchment is set
+        if self.catchment is not None:
+            return self.catchment.path_coverage(path)
+        if coverage is None:
+            coverage = self.coverage_by_id()
+        path = np.asarray(path, dtype=np.int64)
+        return float(np.minimum(coverage[path[:-1]], coverage[path[1:]]).sum())
+    
+    @timed('algorithm5_2.save_results')
+    def save_results(self, paths, nodes_filename, paths_filename, snapshot_dir=None, routing_index=None):
         # Save nodes information
         self.nodes_df.to_csv(nodes_filename, index=False)
 
@@ -66,10 +331,19 @@ class MetroNetworkDesign:
         # Save paths to JSON
         with open(paths_filename, 'w') as f:
             json.dump(paths_str_keys, f)
+
+        # Optionally save nodes, weighted adjacency and paths as a binary snapshot
+        if snapshot_dir is not None:
+            weights = self.calculate_weights()[2] if self.edges_df is not None else None
+            save_snapshot(snapshot_dir, self.nodes_df, self.edges_df, weights, paths)
+            # The routing index is kept next to the results it was built with
+            if routing_index is not None:
+                routing_index.save(os.path.join(snapshot_dir, 'routing_index'))
     
     def load_results(self, nodes_filename, paths_filename):
         # Load nodes information
         self.nodes_df = pd.read_csv(nodes_filename)
+        self.zone_index = ZoneIndex.from_nodes(self.nodes_df)
         self.graph = self.create_graph()
         
         # Load paths
@@ -81,66 +355,97 @@ class MetroNetworkDesign:
         
         return paths
     
-    def generate_map(self, paths, output_filename="metro_network_map.html"):
-        m = folium.Map(location=[self.nodes_df['y'].mean(), self.nodes_df['x'].mean()], zoom_start=13)
-        
-        # Gather all nodes and edges involved in the paths
-        nodes_in_paths = set()
-        edges_in_paths = []
-        
-        for (zone_src, zone_dest), (path, coverage) in paths.items():
-            if path:
-                nodes_in_paths.update(path)
-                edges_in_paths.extend([(path[i], path[i + 1]) for i in range(len(path) - 1)])
-        
-        # Plot only the nodes involved in the paths
-        for node_id in nodes_in_paths:
-            node = self.nodes_df[self.nodes_df['id'] == node_id].iloc[0]
-            folium.CircleMarker(
-                location=[node['y'], node['x']],
-                radius=5,
-                color='blue',
-                fill=True,
-                fill_color='blue',
-                fill_opacity=0.7,
-                popup=Popup(f"Node ID: {node['id']}<br>Zone: {node['zone']}<br>Coverage: {node['path_coverage']}"),
-            ).add_to(m)
-        
-        # Plot the edges from the solution paths
-        for src, tgt in edges_in_paths:
-            src_node = self.nodes_df[self.nodes_df['id'] == src].iloc[0]
-            tgt_node = self.nodes_df[self.nodes_df['id'] == tgt].iloc[0]
-            folium.PolyLine(
-                locations=[(src_node['y'], src_node['x']), (tgt_node['y'], tgt_node['x'])],
-                color='red',
-                weight=3,
-                opacity=0.7,
-            ).add_to(m)
-        
-        m.save(output_filename)
+    def load_snapshot_results(self, snapshot_dir, build_graph=False):
+        # Reload a solved scenario from a binary snapshot. Rendering a map only needs
+        # nodes_df, so the networkx graph is only rebuilt on request; the weighted
+        # CSR matrix is available without copies as self.sparse_graph
+        snapshot = load_snapshot(snapshot_dir)
+        self.nodes_df = snapshot.nodes_df()
+        self.zone_index = ZoneIndex.from_nodes(self.nodes_df)
+        self.edges_df = snapshot.edges_df() if 'indptr' in snapshot else None
+        self.sparse_graph = snapshot.csr_matrix() if 'indptr' in snapshot else None
+        self.graph = self.create_graph() if build_graph else None
+        return snapshot.paths()
+    
+    @timed('algorithm5_2.generate_map')
+    def generate_map(self, paths, output_filename="metro_network_map.html", round_digits=6, simplify_tolerance=None):
+        # One polyline per solution path and one GeoJSON layer with the nodes on the paths
+        return generate_network_map(self.nodes_df, paths, output_filename,
+                                    round_digits=round_digits, simplify_tolerance=simplify_tolerance)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shortest paths between target zones (Algorithm 5)")
+    parser.add_argument('--summary', action='store_true', help="print a summary instead of every path")
+    parser.add_argument('--catchment-radius', type=float, default=None,
+                        help="score paths by the coverage within this walking radius (meters) of their stations")
+    parser.add_argument('--candidates', type=int, default=0, metavar='K',
+                        help="also generate up to K alternative candidate lines per zone pair")
+    parser.add_argument('--method', choices=['networkx', 'csgraph'], default='networkx',
+                        help="networkx searches every zone pair like the original script; csgraph runs one "
+                             "search per zone and reuses it for every destination, and where two routes have "
+                             "equal weight it can pick a different one than networkx")
+    parser.add_argument('--workers', type=int, default=None, help="processes for the searches and candidate lines")
+    parser.add_argument('--improve', action='store_true',
+                        help="improve the network's union coverage with a local search over the lines")
+    parser.add_argument('--max-growth', type=float, default=0.0,
+                        help="fraction of extra stops each line may gain in the local search")
+    parser.add_argument('--od-matrix', help="report the OD demand served by the lines (matriz_od.npz)")
+    parser.add_argument('--routing-index', action='store_true',
+                        help="answer the queries from a precomputed routing index")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
+
+    # Example usage
+    nodes_df = pd.read_csv('nodes.csv')
+    edges_df = pd.read_csv('edges.csv')
+
+    coverage_threshold = 0.01  # Adjust this threshold based on your dataset
+    target_zones = [173, 53, 24, 215, 59]  # Corresponding to T1, T2, T3, T4, T5
+
+    catchment = CatchmentCoverage(nodes_df, args.catchment_radius) if args.catchment_radius else None
+    metro_network = MetroNetworkDesign(nodes_df, edges_df, coverage_threshold, target_zones, catchment)
+
+    # Find zone representatives based on highest path coverage
+    zone_representatives = metro_network.find_zone_representatives()
+
+    # Optionally precompute the routing index once for this graph
+    routing_index = metro_network.build_routing_index(zone_representatives) if args.routing_index else None
 
-# Example usage
-nodes_df = pd.read_csv('nodes.csv')
-edges_df = pd.read_csv('edges.csv')
+    # Find the paths for all source-destination pairs between zones
+    paths = metro_network.algorithm_5(zone_representatives, args.method, args.workers, verbose=not args.summary,
+                                      routing_index=routing_index)
 
-coverage_threshold = 0.01  # Adjust this threshold based on your dataset
-target_zones = [173, 53, 24, 215, 59]  # Corresponding to T1, T2, T3, T4, T5
+    # Optionally improve the union coverage of the whole network
+    if args.improve:
+        before = metro_network.network_coverage(paths).total
+        paths = metro_network.improve_lines(paths, args.max_growth)
+        print(f"Network coverage: {before:.4f} -> {metro_network.network_coverage(paths).total:.4f}")
 
-metro_network = MetroNetworkDesign(nodes_df, edges_df, coverage_threshold, target_zones)
+    # Optionally score the network by the survey trips it serves
+    if args.od_matrix:
+        served_demand = ServedDemand.load(nodes_df, args.od_matrix)
+        lines = [path for _, path in metro_network.distinct_lines(paths).values()]
+        print(f"OD demand served: {served_demand.network_served(lines):.0f} trips")
 
-# Find zone representatives based on highest path coverage
-zone_representatives = metro_network.find_zone_representatives()
+    # Optionally build the pool of alternative candidate lines per zone pair
+    if args.candidates:
+        candidates = metro_network.candidate_lines(zone_representatives, args.candidates, args.workers)
+        print(f"{sum(len(lines) for lines in candidates.values())} candidate lines for {len(candidates)} zone pairs")
 
-# Find the paths for all source-destination pairs between zones
-paths = metro_network.algorithm_5(zone_representatives)
+    # Save results
+    metro_network.save_results(paths, 'nodes_saved.csv', 'paths_saved.json')
 
-# Save results
-metro_network.save_results(paths, 'nodes_saved.csv', 'paths_saved.json')
+    # Generate the map
+    metro_network.generate_map(paths)
 
-# Generate the map
-metro_network.generate_map(paths)
+    finish_from_arguments(args)
 
-# To reload the results later
-# metro_network = MetroNetworkDesign()
-# loaded_paths = metro_network.load_results('nodes_saved.csv', 'paths_saved.json')
-# metro_network.generate_map(loaded_paths, "loaded_metro_network_map.html")
+    # To reload the results later
+    # metro_network = MetroNetworkDesign()
+    # loaded_paths = metro_network.load_results('nodes_saved.csv', 'paths_saved.json')
+    # metro_network.generate_map(loaded_paths, "loaded_metro_network_map.html")
+    # or, from a binary snapshot written by save_results(..., snapshot_dir='results_snapshot'):
+    # loaded_paths = metro_network.load_snapshot_results('results_snapshot')
+    # and the routing index saved with save_results(..., routing_index=routing_index):
+    # routing_index = metro_network.load_routing_index('results_snapshot/routing_index')
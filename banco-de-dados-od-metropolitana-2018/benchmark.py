@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+import algorithm5
+import algorithm5_2
+from create_points_and_nodes import assign_zones, build_edges, grid_coordinates
+from readcsv import normalize_coverage
+
+# Grid sizes (nodes): a small grid, today's Recife grid, and region-scale grids
+DEFAULT_SIZES = [10_000, 40_000]
+ALL_SIZES = [10_000, 40_000, 250_000, 1_000_000]
+
+# Same settings as the example usage in algorithm5.py / algorithm5_2.py
+COVERAGE_THRESHOLD = 0.01
+TARGET_ZONES = [173, 53, 24, 215, 59]
+
+SPACING_IN_METERS = 400
+ZONES_PER_SIDE = 16  # 256 zones, numbered 1..256 like the traffic zones
+
+
+def synthetic_zones(num_nodes, seed=0):
+    # Square lattice of ZONES_PER_SIDE^2 rectangular zones sized so that a grid at
+    # SPACING_IN_METERS has about num_nodes points, with a random demand per zone
+    rng = np.random.default_rng(seed)
+    distance_in_degrees = SPACING_IN_METERS / 111320
+    extent = np.ceil(np.sqrt(num_nodes)) * distance_in_degrees
+    minx, miny = -35.0, -8.0
+    cuts = np.linspace(0, extent, ZONES_PER_SIDE + 1)
+
+    geometries = []
+    properties = []
+    for i in range(ZONES_PER_SIDE):
+        for j in range(ZONES_PER_SIDE):
+            geometries.append(box(minx + cuts[i], miny + cuts[j], minx + cuts[i + 1], miny + cuts[j + 1]))
+            zone = str(len(geometries))
+            properties.append({'ZONA': zone, 'CODIGOZONA': zone, 'FREQUENCIA': int(rng.integers(100, 50_000))})
+
+    # Offset the lattice so no point falls exactly on a zone border
+    offset = 0.37 * distance_in_degrees
+    bounds = (minx + offset, miny + offset, minx + extent, miny + extent)
+    return geometries, properties, bounds
+
+
+def run_stage(name, func, repeat, trace_memory):
+    # Best-of-repeat wall time without tracing, then one traced run for peak memory
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        result = func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    print(f"  {name:<28} {min(seconds):9.3f} s" + (f" {peak_mb:10.1f} MB" if peak_mb is not None else ""))
+    return result, {'seconds': min(seconds), 'peak_mb': peak_mb}
+
+
+def quiet(func):
+    # algorithm5_2.algorithm_5 prints every path and tqdm writes to stderr
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return func()
+    return wrapper
+
+
+def benchmark_size(num_nodes, repeat=1, trace_memory=True, output_dir=None):
+    stages = {}
+    geometries, properties, bounds = synthetic_zones(num_nodes)
+    grid_x, grid_y, distance_in_degrees = grid_coordinates(bounds, SPACING_IN_METERS)
+
+    points_df, stages['zone_assignment'] = run_stage(
+        'zone_assignment', lambda: assign_zones(geometries, properties, grid_x, grid_y), repeat, trace_memory)
+    edges_df, stages['edge_building'] = run_stage(
+        'edge_building', lambda: build_edges(points_df, distance_in_degrees), repeat, trace_memory)
+    nodes_df, stages['coverage_normalization'] = run_stage(
+        'coverage_normalization', lambda: normalize_coverage(points_df.copy()), repeat, trace_memory)
+    nodes_df['zone'] = nodes_df['zone'].astype(np.int64)
+
+    greedy, stages['algorithm5_init'] = run_stage(
+        'algorithm5_init',
+        lambda: algorithm5.MetroNetworkDesign(nodes_df, edges_df, COVERAGE_THRESHOLD, TARGET_ZONES),
+        repeat, trace_memory)
+    _, stages['algorithm5_routing'] = run_stage(
+        'algorithm5_routing', quiet(greedy.algorithm_5), repeat, trace_memory)
+
+    network, stages['algorithm5_2_create_graph'] = run_stage(
+        'algorithm5_2_create_graph',
+        lambda: algorithm5_2.MetroNetworkDesign(nodes_df, edges_df, COVERAGE_THRESHOLD, TARGET_ZONES),
+        repeat, trace_memory)
+    paths, stages['algorithm5_2_routing'] = run_stage(
+        'algorithm5_2_routing', quiet(lambda: network.algorithm_5(network.find_zone_representatives())),
+        repeat, trace_memory)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_path = os.path.join(output_dir or tmp, f'benchmark_map_{num_nodes}.html')
+        _, stages['map_generation'] = run_stage(
+            'map_generation', lambda: network.generate_map(paths, map_path), repeat, trace_memory)
+        stages['map_generation']['html_bytes'] = os.path.getsize(map_path)
+
+    return {'nodes': len(nodes_df), 'edges': len(edges_df), 'zones': len(geometries), 'stages': stages}
+
+
+def current_commit():
+    # Short hash of the checked-out commit, so a results file says which code it measured
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    # Print time ratios (current / baseline) for every stage present in both runs
+    print(f"\nChange against {baseline.get('commit') or 'baseline'} (current / previous time):")
+    for size, current in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if previous is None:
+            continue
+        print(f"  {size} nodes")
+        for stage, measured in current['stages'].items():
+            before = previous['stages'].get(stage)
+            if before and before['seconds'] > 0:
+                print(f"    {stage:<28} {measured['seconds'] / before['seconds']:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic grids")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f"grid sizes in nodes (all: {' '.join(map(str, ALL_SIZES))})")
+    parser.add_argument('--repeat', type=int, default=1, help="timed runs per stage, the best is kept")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak-memory run")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file for the results")
+    parser.add_argument('--output-dir', default=None,
+                        help="keep the generated artifacts (maps) here; html_bytes is measured on these files")
+    parser.add_argument('--compare', help="results JSON to compare against, e.g. benchmark_66d1e2b.json")
+    args = parser.parse_args()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    results = {
+        'commit': current_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'sizes': {},
+    }
+    for num_nodes in args.sizes:
+        print(f"{num_nodes} nodes")
+        results['sizes'][str(num_nodes)] = benchmark_size(num_nodes, args.repeat, not args.no_memory,
+                                                          args.output_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import bisect
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+from instrumentation import count, instrumentation, timed
+from routing_index import symmetric_csr
+
+# K shortest loopless paths between terminal nodes (Yen's algorithm with Lawler's
+# change: a new path only spurs from the node where it left its parent path).
+#
+# Every target keeps one shortest-path tree towards it, shared by all the sources
+# and all k iterations. Spur paths are A* searches with the exact unrestricted
+# distance to the target as the heuristic, and a search stops at the first node
+# whose tree path to the target avoids the root path. That is checked with subtree
+# intervals of the tree, so most spur searches settle only a handful of nodes.
+
+
+class TargetTree:
+    def __init__(self, matrix, target):
+        # Distance to the target and next hop towards it for every node
+        self.target = target
+        distances, predecessors = csgraph.dijkstra(matrix, directed=False, indices=target, return_predecessors=True)
+        count('dijkstra_calls')
+        self.distances = distances.tolist()
+        self.next_hop = predecessors.tolist()
+
+        # Preorder position and subtree end of every node of the tree rooted at the
+        # target: the tree path from u passes through r iff tin[r] <= tin[u] < tout[r]
+        reached = np.flatnonzero(predecessors >= 0)
+        tree = sp.csr_matrix((np.ones(len(reached)), (predecessors[reached], reached)), shape=matrix.shape)
+        order = csgraph.depth_first_order(tree, target, directed=True, return_predecessors=False)
+        tin = np.full(matrix.shape[0], -1, dtype=np.int64)
+        tin[order] = np.arange(len(order))
+        size = np.ones(matrix.shape[0], dtype=np.int64)
+        next_hop = self.next_hop
+        size_list = size.tolist()
+        for node in order[:0:-1].tolist():
+            size_list[next_hop[node]] += size_list[node]
+        self.tin = tin
+        self.tin_list = tin.tolist()
+        self.tout = tin + np.asarray(size_list, dtype=np.int64)
+
+    def path(self, node):
+        # Tree path node -> target
+        path = [node]
+        while path[-1] != self.target:
+            path.append(self.next_hop[path[-1]])
+        return path
+
+
+def adjacency_lists(matrix):
+    indptr = matrix.indptr.tolist()
+    indices = matrix.indices.tolist()
+    weights = matrix.data.tolist()
+    return [list(zip(indices[indptr[v]:indptr[v + 1]], weights[indptr[v]:indptr[v + 1]]))
+            for v in range(len(indptr) - 1)]
+
+
+def spur_path(adjacency, tree, spur, root_nodes, removed):
+    # Cheapest path spur -> target avoiding the root path nodes and the removed first
+    # hops; returns (path, cost) or (None, inf)
+    distances = tree.distances
+    tin = tree.tin_list
+    root_set = set(root_nodes)
+
+    # Union of the root nodes' subtrees as sorted disjoint preorder intervals: a node's
+    # tree path is usable iff its preorder position falls outside all of them
+    order = np.argsort(tree.tin[root_nodes])
+    starts = tree.tin[root_nodes][order]
+    ends = np.maximum.accumulate(tree.tout[root_nodes][order])
+    first = np.concatenate(([True], starts[1:] >= ends[:-1]))
+    last = np.concatenate((first[1:], [True]))
+    starts = starts[first].tolist()
+    ends = ends[last].tolist()
+
+    best = {spur: 0.0}
+    previous = {spur: None}
+    heap = [(distances[spur], 0.0, spur)]
+    settled = 0
+    while heap:
+        estimate, cost, node = heapq.heappop(heap)
+        if cost > best[node]:
+            continue
+        settled += 1
+        # The spur node is its own root node, so it never ends the search
+        position = bisect.bisect_right(starts, tin[node]) - 1
+        if position < 0 or tin[node] >= ends[position]:
+            count('spur_searches')
+            count('spur_nodes_settled', settled)
+            path = [node]
+            while previous[path[-1]] is not None:
+                path.append(previous[path[-1]])
+            return path[::-1] + tree.path(node)[1:], estimate
+        for neighbor, weight in adjacency[node]:
+            if neighbor in root_set or (node == spur and neighbor in removed):
+                continue
+            remaining = distances[neighbor]
+            if remaining == np.inf:
+                continue
+            candidate = cost + weight
+            if candidate < best.get(neighbor, np.inf):
+                best[neighbor] = candidate
+                previous[neighbor] = node
+                heapq.heappush(heap, (candidate + remaining, candidate, neighbor))
+    count('spur_searches')
+    count('spur_nodes_settled', settled)
+    return None, np.inf
+
+
+def k_shortest_paths(adjacency, tree, source, k):
+    # Up to k loopless paths source -> target in increasing cost
+    if tree.distances[source] == np.inf:
+        return []
+    paths = [tree.path(source)]
+    deviations = [0]
+    candidates = []
+    seen = {tuple(paths[0])}
+    while len(paths) < k:
+        path = paths[-1]
+        cumulative = np.concatenate(([0.0], np.cumsum([dict(adjacency[a])[b] for a, b in zip(path, path[1:])])))
+
+        # Common prefix length of the newest path with every accepted path, so the
+        # edges to remove at each spur node come without comparing prefixes again
+        common = []
+        for other in paths[:-1]:
+            length = 0
+            for a, b in zip(path, other):
+                if a != b:
+                    break
+                length += 1
+            common.append(length)
+
+        for i in range(deviations[-1], len(path) - 1):
+            removed = {path[i + 1]}
+            removed.update(other[i + 1] for other, length in zip(paths[:-1], common) if length > i)
+            spur, cost = spur_path(adjacency, tree, path[i], path[:i + 1], removed)
+            if spur is None:
+                continue
+            new_path = path[:i] + spur
+            key = tuple(new_path)
+            if key not in seen:
+                seen.add(key)
+                heapq.heappush(candidates, (float(cumulative[i]) + cost, len(seen), new_path, i))
+
+        if not candidates:
+            break
+        _, _, new_path, deviation = heapq.heappop(candidates)
+        paths.append(new_path)
+        deviations.append(deviation)
+    return paths
+
+
+# Graph held by each process of the candidate pool, sent once by the initializer
+_candidate_matrix = None
+_candidate_adjacency = None
+
+
+def init_candidate_worker(matrix):
+    global _candidate_matrix, _candidate_adjacency
+    _candidate_matrix = matrix
+    _candidate_adjacency = adjacency_lists(matrix)
+
+
+def target_candidates(target, sources, k):
+    # All the sources of one target share its tree
+    tree = TargetTree(_candidate_matrix, target)
+    return {source: k_shortest_paths(_candidate_adjacency, tree, source, k) for source in sources}
+
+
+def candidate_worker(target, sources, k):
+    # Counters of a worker process are sent back with its paths
+    instrumentation.reset()
+    paths = target_candidates(target, sources, k)
+    return paths, dict(instrumentation.counters)
+
+
+@timed('candidate_lines.candidate_paths')
+def candidate_paths(matrix, node_pairs, k, workers=None):
+    # {(source, target): [path, ...]} with up to k paths per unordered node pair
+    matrix = symmetric_csr(matrix)
+
+    # Alternate which endpoint is the tree root so the work is spread over the trees
+    searches = {}
+    for i, (source, target) in enumerate(node_pairs):
+        if i % 2:
+            searches.setdefault(target, []).append(source)
+        else:
+            searches.setdefault(source, []).append(target)
+    targets = list(searches)
+    sources = [searches[target] for target in targets]
+
+    if workers is not None and workers > 1 and len(targets) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_candidate_worker,
+                                 initargs=(matrix,)) as executor:
+            results = []
+            for paths, counters in executor.map(candidate_worker, targets, sources, [k] * len(targets)):
+                results.append(paths)
+                instrumentation.counters.update(counters)
+    else:
+        init_candidate_worker(matrix)
+        results = [target_candidates(target, target_sources, k) for target, target_sources in zip(targets, sources)]
+
+    found = {}
+    for target, paths in zip(targets, results):
+        for source, source_paths in paths.items():
+            found[(source, target)] = source_paths
+            found[(target, source)] = [path[::-1] for path in source_paths]
+    return {pair: found[pair] for pair in node_pairs}
@@ -0,0 +1,72 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.spatial import cKDTree
+
+from instrumentation import timed
+
+# Station catchment coverage. Row s of the catchment matrix marks every node within
+# walking radius of a station at node s (s included), indexed by node id. A path
+# covers the union of its stations' rows, so scoring many paths at once is a sparse
+# product with their node incidence matrix and no spatial query per path.
+
+# Same degrees-to-meters approximation as create_points_and_nodes.py
+meters_per_degree = 111320
+
+
+@timed('catchment.catchment_matrix')
+def catchment_matrix(nodes_df, radius_in_meters=400):
+    # Symmetric CSR (num_ids x num_ids) with a 1 for every node pair within the radius
+    node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+    num_ids = int(node_ids.max()) + 1 if len(node_ids) else 0
+    tree = cKDTree(nodes_df[['x', 'y']].to_numpy())
+    pairs = tree.query_pairs(radius_in_meters / meters_per_degree * (1 + 1e-6), output_type='ndarray')
+    rows = np.concatenate((node_ids[pairs[:, 0]], node_ids[pairs[:, 1]], node_ids))
+    cols = np.concatenate((node_ids[pairs[:, 1]], node_ids[pairs[:, 0]], node_ids))
+    return sp.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(num_ids, num_ids))
+
+
+def incidence_matrix(paths, num_ids):
+    # (num_paths x num_ids) with a 1 for every node on each path
+    lengths = [len(path) for path in paths]
+    rows = np.repeat(np.arange(len(paths)), lengths)
+    cols = np.concatenate([np.asarray(path, dtype=np.int64) for path in paths] + [np.empty(0, dtype=np.int64)])
+    incidence = sp.csr_matrix((np.ones(len(cols), dtype=np.int32), (rows, cols)), shape=(len(paths), num_ids))
+    incidence.sum_duplicates()
+    return incidence
+
+
+class CatchmentCoverage:
+    def __init__(self, nodes_df, radius_in_meters=400, matrix=None):
+        self.radius_in_meters = radius_in_meters
+        self.matrix = catchment_matrix(nodes_df, radius_in_meters) if matrix is None else matrix.tocsr()
+        node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+        self.coverage = np.zeros(self.matrix.shape[0], dtype=np.float64)
+        self.coverage[node_ids] = nodes_df['path_coverage'].to_numpy(dtype=np.float64)
+
+    def save(self, filename):
+        sp.save_npz(filename, self.matrix)
+
+    @classmethod
+    def load(cls, nodes_df, filename, radius_in_meters=None):
+        return cls(nodes_df, radius_in_meters, sp.load_npz(filename))
+
+    def reached(self, paths):
+        # (num_paths x num_ids) with a 1 for every node in the catchment of each path
+        reached = incidence_matrix(paths, self.matrix.shape[0]) @ self.matrix
+        reached.data[:] = 1
+        return reached
+
+    def paths_coverage(self, paths):
+        # Catchment coverage of each path
+        return np.asarray(self.reached(paths) @ self.coverage).ravel()
+
+    def path_coverage(self, path):
+        return float(self.paths_coverage([path])[0])
+
+    def network_coverage(self, paths):
+        # Union catchment coverage of a set of lines, each node counted once
+        return self.path_coverage(np.concatenate([np.asarray(path, dtype=np.int64) for path in paths]
+                                                 + [np.empty(0, dtype=np.int64)]))
+
+    def covered_nodes(self, paths):
+        return np.flatnonzero(np.asarray(self.reached(paths).sum(axis=0)).ravel())
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from catchment import meters_per_degree
+
+
+@pytest.fixture
+def make_lattice():
+    # Factory for a rows x cols lattice (square by default) spacing_in_meters apart,
+    # ids row by row. path_coverage is ((id * 37) % 13) + 0.25 and the four quadrants
+    # get the four zones. Edges go from lower to higher ids as build_edges writes
+    # them: every right neighbor, then every neighbor below.
+    def make(rows=8, cols=None, spacing_in_meters=400, zones=(1, 2, 3, 4)):
+        cols = rows if cols is None else cols
+        ids = np.arange(rows * cols)
+        row, col = np.divmod(ids, cols)
+        step = spacing_in_meters / meters_per_degree
+        nodes_df = pd.DataFrame({'id': ids, 'x': col * step, 'y': row * step,
+                                 'path_coverage': ((ids * 37) % 13) + 0.25,
+                                 'zone': np.asarray(zones)[(row >= rows // 2) * 2 + (col >= cols // 2)]})
+        right = ids[col < cols - 1]
+        down = ids[row < rows - 1]
+        edges_df = pd.DataFrame({'source': np.concatenate((right, down)),
+                                 'target': np.concatenate((right + 1, down + cols))})
+        return nodes_df, edges_df
+    return make
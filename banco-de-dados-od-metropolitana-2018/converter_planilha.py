@@ -1,42 +1,135 @@
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 
-# Leitura da planilha CSV
-df = pd.read_csv('BANCO DE DADOS OD 2018 Março_2020.csv', sep=';')
-
-# Lista para armazenar os resultados
-result_rows = {}
-
-# Iterando sobre as linhas da tabela original
-for row in df.to_dict(orient="records"):
-    # Para Zona Educacao
-    if row['Zona Educacao'] in result_rows:
-        result_rows[row['Zona Educacao']] = int(row['FREQUENCIA AULA']) + int(result_rows[row['Zona Educacao']])
-    else:
-        result_rows[row['Zona Educacao']] = int(row['FREQUENCIA AULA'])
-
-    if row['Zona Trabalho'] in result_rows:
-        result_rows[row['Zona Trabalho']] = int(row['FREQUENCIA TRABALHO']) + int(result_rows[row['Zona Trabalho']])
-    else:
-        result_rows[row['Zona Trabalho']] = int(row['FREQUENCIA TRABALHO'])
-    # Para Zona Residencia com ORIGEM TRABALHO igual a RESIDENCIA
-    if row['ORIGEM TRABALHO'] == 'RESIDENCIA':
-        if row['Zona Residencia'] in result_rows:
-            result_rows[row['Zona Residencia']] = int(row['FREQUENCIA TRABALHO']) + int(result_rows[row['Zona Residencia']])
-        else:
-            result_rows[row['Zona Residencia']] = int(row['FREQUENCIA TRABALHO'])
-
-    # Para Zona Residencia com ORIGEM AULA igual a RESIDENCIA
-    if row['ORIGEM AULA'] == 'RESIDENCIA':
-        if row['Zona Residencia'] in result_rows:
-            result_rows[row['Zona Residencia']] = int(row['FREQUENCIA AULA']) + int(result_rows[row['Zona Residencia']])
-        else:
-            result_rows[row['Zona Residencia']] = int(row['FREQUENCIA AULA'])
-
-data_list = [{'ZONA': key, 'FREQUENCIA': value} for key, value in result_rows.items()]
-
-
-# Criar DataFrame a partir dos resultados
-result_df = pd.DataFrame(data_list)
-
-# Salvar o resultado em um novo CSV
-result_df.to_csv('resultado.csv', index=False)
\ No newline at end of file
+# Planilha da pesquisa OD e colunas usadas na agregação
+CAMINHO_PLANILHA = 'BANCO DE DADOS OD 2018 Março_2020.csv'
+COLUNAS_ZONA = ['Zona Educacao', 'Zona Trabalho', 'Zona Residencia']
+COLUNAS_FREQUENCIA = ['FREQUENCIA AULA', 'FREQUENCIA TRABALHO']
+COLUNAS_ORIGEM = ['ORIGEM TRABALHO', 'ORIGEM AULA']
+
+# Quantidade de linhas lidas por vez
+TAMANHO_BLOCO = 500_000
+
+# Arquivo da matriz origem-destino esparsa (zona de residência -> zona de trabalho/educação)
+CAMINHO_MATRIZ_OD = 'matriz_od.npz'
+
+
+def agregar_bloco(bloco, inicio):
+    # Cada linha contribui para até quatro zonas, na mesma ordem do laço original:
+    # educação, trabalho, residência (trabalho) e residência (aula).
+    # POSICAO guarda a primeira contribuição de cada zona para manter a ordem de saída.
+    posicao = (inicio + pd.RangeIndex(len(bloco))) * 4
+    residencia_trabalho = (bloco['ORIGEM TRABALHO'] == 'RESIDENCIA').to_numpy()
+    residencia_aula = (bloco['ORIGEM AULA'] == 'RESIDENCIA').to_numpy()
+
+    contribuicoes = pd.concat([
+        pd.DataFrame({'ZONA': bloco['Zona Educacao'].to_numpy(),
+                      'FREQUENCIA': bloco['FREQUENCIA AULA'].to_numpy(),
+                      'POSICAO': posicao}),
+        pd.DataFrame({'ZONA': bloco['Zona Trabalho'].to_numpy(),
+                      'FREQUENCIA': bloco['FREQUENCIA TRABALHO'].to_numpy(),
+                      'POSICAO': posicao + 1}),
+        pd.DataFrame({'ZONA': bloco['Zona Residencia'].to_numpy()[residencia_trabalho],
+                      'FREQUENCIA': bloco['FREQUENCIA TRABALHO'].to_numpy()[residencia_trabalho],
+                      'POSICAO': posicao[residencia_trabalho] + 2}),
+        pd.DataFrame({'ZONA': bloco['Zona Residencia'].to_numpy()[residencia_aula],
+                      'FREQUENCIA': bloco['FREQUENCIA AULA'].to_numpy()[residencia_aula],
+                      'POSICAO': posicao[residencia_aula] + 3}),
+    ], ignore_index=True)
+
+    return somar_parciais(contribuicoes)
+
+
+def viagens_bloco(bloco):
+    # Viagens residência -> trabalho e residência -> educação de cada linha, com a
+    # frequência correspondente como peso; linhas sem alguma das zonas são ignoradas
+    residencia_trabalho = (bloco['ORIGEM TRABALHO'] == 'RESIDENCIA').to_numpy()
+    residencia_aula = (bloco['ORIGEM AULA'] == 'RESIDENCIA').to_numpy()
+    viagens = pd.concat([
+        pd.DataFrame({'ORIGEM': bloco['Zona Residencia'].to_numpy()[residencia_trabalho],
+                      'DESTINO': bloco['Zona Trabalho'].to_numpy()[residencia_trabalho],
+                      'VIAGENS': bloco['FREQUENCIA TRABALHO'].to_numpy()[residencia_trabalho]}),
+        pd.DataFrame({'ORIGEM': bloco['Zona Residencia'].to_numpy()[residencia_aula],
+                      'DESTINO': bloco['Zona Educacao'].to_numpy()[residencia_aula],
+                      'VIAGENS': bloco['FREQUENCIA AULA'].to_numpy()[residencia_aula]}),
+    ], ignore_index=True).dropna(subset=['ORIGEM', 'DESTINO'])
+    return somar_viagens(viagens)
+
+
+def somar_viagens(viagens):
+    return viagens.groupby(['ORIGEM', 'DESTINO'], sort=False)['VIAGENS'].sum().reset_index()
+
+
+def montar_matriz_od(viagens):
+    # Matriz esparsa CSR (zonas x zonas) e os rótulos das zonas, em ordem
+    zonas = np.array(sorted(set(viagens['ORIGEM']) | set(viagens['DESTINO'])), dtype=str)
+    origem = np.searchsorted(zonas, viagens['ORIGEM'].to_numpy(dtype=str))
+    destino = np.searchsorted(zonas, viagens['DESTINO'].to_numpy(dtype=str))
+    matriz = sp.csr_matrix((viagens['VIAGENS'].to_numpy(dtype=np.int64), (origem, destino)),
+                           shape=(len(zonas), len(zonas)))
+    return zonas, matriz
+
+
+def salvar_matriz_od(caminho, zonas, matriz):
+    # Formato compacto: rótulos das zonas e os arrays CSR da matriz
+    matriz = matriz.tocsr()
+    np.savez_compressed(caminho, zonas=zonas, indptr=matriz.indptr, indices=matriz.indices, dados=matriz.data)
+
+
+def carregar_matriz_od(caminho=CAMINHO_MATRIZ_OD):
+    with np.load(caminho) as arquivo:
+        zonas = arquivo['zonas']
+        matriz = sp.csr_matrix((arquivo['dados'], arquivo['indices'], arquivo['indptr']),
+                               shape=(len(zonas), len(zonas)))
+    return zonas, matriz
+
+
+def somar_parciais(parciais):
+    return parciais.groupby('ZONA', dropna=False, sort=False).agg(
+        FREQUENCIA=('FREQUENCIA', 'sum'), POSICAO=('POSICAO', 'min')
+    ).reset_index()
+
+
+def agregar_planilha(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    return processar_planilha(caminho, tamanho_bloco, incluir_od=False)[0]
+
+
+def processar_planilha(caminho, tamanho_bloco=TAMANHO_BLOCO, incluir_od=True):
+    # Uma única leitura da planilha CSV em blocos, apenas com as colunas necessárias.
+    # Devolve o total por zona e, se pedido, a matriz OD (zonas, matriz)
+    tipos = {coluna: str for coluna in COLUNAS_ZONA}
+    tipos.update({coluna: 'int32' for coluna in COLUNAS_FREQUENCIA})
+    tipos.update({coluna: 'category' for coluna in COLUNAS_ORIGEM})
+    leitor = pd.read_csv(caminho, sep=';', usecols=COLUNAS_ZONA + COLUNAS_FREQUENCIA + COLUNAS_ORIGEM,
+                         dtype=tipos, chunksize=tamanho_bloco)
+
+    parciais = []
+    parciais_od = []
+    inicio = 0
+    for bloco in leitor:
+        parciais.append(agregar_bloco(bloco, inicio))
+        if incluir_od:
+            parciais_od.append(viagens_bloco(bloco))
+        inicio += len(bloco)
+
+    # Juntar os resultados parciais de cada bloco
+    resultado = somar_parciais(pd.concat(parciais, ignore_index=True))
+    resultado = resultado.sort_values('POSICAO', kind='stable')
+    resultado = resultado[['ZONA', 'FREQUENCIA']].reset_index(drop=True)
+
+    matriz_od = None
+    if incluir_od:
+        matriz_od = montar_matriz_od(somar_viagens(pd.concat(parciais_od, ignore_index=True)))
+    return resultado, matriz_od
+
+
+if __name__ == '__main__':
+    result_df, (zonas, matriz) = processar_planilha(CAMINHO_PLANILHA)
+
+    # Salvar o resultado em um novo CSV
+    result_df.to_csv('resultado.csv', index=False)
+
+    # Salvar a matriz OD esparsa
+    salvar_matriz_od(CAMINHO_MATRIZ_OD, zonas, matriz)
+    print(f"Matriz OD: {len(zonas)} zonas, {matriz.nnz} pares com viagens, {matriz.sum()} viagens")
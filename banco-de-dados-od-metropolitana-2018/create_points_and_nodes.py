@@ -1,76 +1,343 @@
-import geopandas as gpd
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import json
 import numpy as np
 import pandas as pd
-from shapely.geometry import Point, LineString, shape
-from shapely.ops import unary_union
+import shapely
+from shapely import STRtree
+from shapely.geometry import shape
 from scipy.spatial import cKDTree
-from tqdm import tqdm
 
-# Load the GeoJSON data using the json module
-geojson_path = 'zonas_com_frequencia.geojson'
-with open(geojson_path, 'r') as f:
-    geojson_data = json.load(f)
+from geometry_store import load_zone_store
+from instrumentation import add_report_arguments, finish_from_arguments, start_from_arguments, stage, timed
+from snapshot import save_snapshot
 
-# Extract geometries and properties from the GeoJSON features
-geometries = [shape(feature["geometry"]) for feature in geojson_data["features"]]
-properties = [feature["properties"] for feature in geojson_data["features"]]
+# Convert meters to degrees approximately (for equatorial regions)
+meters_per_degree = 111320  # Approx. meters per degree at the equator
 
-# Extract the bounding box of all geometries
-bounds = unary_union(geometries).bounds
-minx, miny, maxx, maxy = bounds
+# Default grid settings, shared with pipeline.py
+SPACING_IN_METERS = 400
+MIN_SPACING_IN_METERS = 200  # finest adaptive cell
+ADAPTIVE_LEVELS = 3
 
-# Convert 400 meters to degrees approximately (for equatorial regions)
-meters_per_degree = 111320  # Approx. meters per degree at the equator
-distance_in_degrees = 400 / meters_per_degree
-
-# Generate grid points
-x_coords = np.arange(minx, maxx, distance_in_degrees)
-y_coords = np.arange(miny, maxy, distance_in_degrees)
-grid_points = [Point(x, y) for x in x_coords for y in y_coords]
-
-# Filter points that are within the original geometries and assign path_coverage and zone
-filtered_points = []
-point_data = []
-for point in tqdm(grid_points, desc="Filtering points"):
-    for geom, prop in zip(geometries, properties):
-        if geom.contains(point):
-            point_data.append((point.x, point.y, prop['FREQUENCIA'], prop['ZONA']))
-            filtered_points.append(point)
-            break
-
-# Create a list of coordinates and path_coverage from filtered points
-point_coords = [(point.x, point.y) for point in filtered_points]
-
-# Build a k-d tree for efficient neighbor search
-tree = cKDTree(point_coords)
-
-# Define the maximum distance for neighbors (400 meters in degrees)
-max_distance = distance_in_degrees
-
-# Find pairs of points within the maximum distance
-edges = tree.query_pairs(max_distance)
-
-# Convert pairs of indices to pairs of points
-edges_points = []
-for i, j in tqdm(edges, desc="Creating edges"):
-    edges_points.append((filtered_points[i], filtered_points[j]))
-
-# Prepare data for points and edges
-points_data = [{'id': idx, 'x': x, 'y': y, 'path_coverage': path_coverage, 'zone': zone}
-               for idx, (x, y, path_coverage, zone) in enumerate(point_data)]
-edges_data = [{'source': i, 'target': j} for i, j in edges]
-
-# Create DataFrames for points and edges
-points_df = pd.DataFrame(points_data)
-edges_df = pd.DataFrame(edges_data)
-
-# Save points and edges to a CSV file
-output_csv = 'grid.csv'
-with open(output_csv, 'w') as f:
-    f.write('# Points\n')
-    points_df.to_csv(f, index=False)
-    f.write('\n# Edges\n')
-    edges_df.to_csv(f, index=False)
-
-print(f"New CSV file created at: {output_csv}")
+
+@timed('grid.load_zones')
+def load_zones(geojson_path, use_cache=True):
+    # Zone geometries and properties, decoded from the geometry cache while the file is unchanged
+    if use_cache:
+        store = load_zone_store(geojson_path)
+        return list(store.geometries), store.properties
+
+    # Load the GeoJSON data using the json module
+    with open(geojson_path, 'r') as f:
+        geojson_data = json.load(f)
+
+    # Extract geometries and properties from the GeoJSON features
+    geometries = [shape(feature["geometry"]) for feature in geojson_data["features"]]
+    properties = [feature["properties"] for feature in geojson_data["features"]]
+    return geometries, properties
+
+
+def lattice_axes(bounds, spacing_in_meters=400):
+    # x and y coordinates of the regular lattice over the bounding box
+    minx, miny, maxx, maxy = bounds
+    distance_in_degrees = spacing_in_meters / meters_per_degree
+    x_coords = np.arange(minx, maxx, distance_in_degrees)
+    y_coords = np.arange(miny, maxy, distance_in_degrees)
+    return x_coords, y_coords, distance_in_degrees
+
+
+def grid_coordinates(bounds, spacing_in_meters=400):
+    # Regular lattice over the bounding box, x-major like the original nested loops
+    x_coords, y_coords, distance_in_degrees = lattice_axes(bounds, spacing_in_meters)
+    grid_x, grid_y = np.meshgrid(x_coords, y_coords, indexing='ij')
+    return grid_x.ravel(), grid_y.ravel(), distance_in_degrees
+
+
+def zone_of_points(geometries, grid_x, grid_y, zone_tree=None):
+    # Index of the zone holding each point, -1 outside every zone.
+    # The STRtree only tests the zones whose bounding box holds the point, and the
+    # point-in-polygon test runs vectorized over the whole coordinate array.
+    if zone_tree is None:
+        zone_tree = STRtree(geometries)
+    point_idx, geom_idx = zone_tree.query(shapely.points(grid_x, grid_y), predicate='within')
+
+    # A point on a shared border falls in more than one zone: keep the first zone in
+    # file order, as the original loop did
+    order = np.lexsort((geom_idx, point_idx))
+    point_idx = point_idx[order]
+    geom_idx = geom_idx[order]
+    first = np.ones(len(point_idx), dtype=bool)
+    first[1:] = point_idx[1:] != point_idx[:-1]
+    point_zone = np.full(len(grid_x), -1, dtype=np.int64)
+    point_zone[point_idx[first]] = geom_idx[first]
+    return point_zone
+
+
+@timed('grid.assign_zones')
+def assign_zones(geometries, properties, grid_x, grid_y):
+    # Filter points that are within the original geometries and assign path_coverage and zone
+    point_zone = zone_of_points(geometries, grid_x, grid_y)
+    point_idx = np.flatnonzero(point_zone >= 0)
+    return points_frame(properties, grid_x[point_idx], grid_y[point_idx], point_zone[point_idx])
+
+
+def points_frame(properties, x, y, geom_idx):
+    # Nodes table with ids in the given order and the zone's FREQUENCIA as path_coverage
+    frequencies = np.array([prop['FREQUENCIA'] for prop in properties], dtype=object)
+    zones = np.array([prop['ZONA'] for prop in properties], dtype=object)
+    return pd.DataFrame({
+        'id': np.arange(len(geom_idx)),
+        'x': x,
+        'y': y,
+        'path_coverage': frequencies[geom_idx],
+        'zone': zones[geom_idx],
+    }).infer_objects()
+
+
+def zone_densities(geometries, properties):
+    # Demand density of each zone in FREQUENCIA per km2
+    area_km2 = shapely.area(np.asarray(geometries, dtype=object)) * (meters_per_degree / 1000) ** 2
+    frequencies = np.array([prop['FREQUENCIA'] for prop in properties], dtype=np.float64)
+    return frequencies / area_km2
+
+
+def block_reduce(values, size, reducer):
+    # Reduce every aligned size x size block of a 2-D array
+    rows, cols = values.shape
+    return reducer(values.reshape(rows // size, size, cols // size, size), axis=(1, 3))
+
+
+def expand(values, size):
+    return np.repeat(np.repeat(values, size, axis=0), size, axis=1)
+
+
+@timed('grid.build_adaptive_grid')
+def build_adaptive_grid(geometries, properties, bounds, min_spacing_in_meters=MIN_SPACING_IN_METERS,
+                        levels=ADAPTIVE_LEVELS, dense_density=None, sparse_density=None):
+    # Quadtree grid: cells are min_spacing wide where zone demand density is high,
+    # 2x wider in between and 2^(levels - 1)x wider where it is low. By default the
+    # upper and lower quartiles of the zone densities split dense/medium/sparse.
+    # Each leaf cell becomes a node at its center, and leaves sharing a border are
+    # connected, also across levels. Returns (points_df, edges_df) with the same
+    # columns as the uniform grid.
+    densities = zone_densities(geometries, properties)
+    if dense_density is None:
+        dense_density = np.quantile(densities, 0.75)
+    if sparse_density is None:
+        sparse_density = np.quantile(densities, 0.25)
+
+    # Cell size (in finest cells) wanted by each zone
+    coarsest = 2 ** (levels - 1)
+    wanted_size = np.where(densities >= dense_density, 1,
+                           np.where(densities <= sparse_density, coarsest, min(2, coarsest)))
+
+    # Finest lattice, padded so the coarsest blocks tile it exactly
+    minx, miny, maxx, maxy = bounds
+    distance_in_degrees = min_spacing_in_meters / meters_per_degree
+    num_x = -(-int(np.ceil((maxx - minx) / distance_in_degrees)) // coarsest) * coarsest
+    num_y = -(-int(np.ceil((maxy - miny) / distance_in_degrees)) // coarsest) * coarsest
+    grid_x, grid_y = np.meshgrid(minx + np.arange(num_x) * distance_in_degrees,
+                                 miny + np.arange(num_y) * distance_in_degrees, indexing='ij')
+    cell_zone = zone_of_points(geometries, grid_x.ravel(), grid_y.ravel()).reshape(num_x, num_y)
+    inside = cell_zone >= 0
+    cell_wanted = np.where(inside, wanted_size[np.maximum(cell_zone, 0)], np.iinfo(np.int64).max)
+
+    # Top-down: a block is a leaf when every zone inside it accepts that cell size;
+    # otherwise it is split into four blocks of half the size
+    leaf_masks = []
+    covered = np.zeros((num_x, num_y), dtype=bool)
+    size = coarsest
+    while size >= 1:
+        fits = block_reduce(cell_wanted, size, np.min) >= size
+        has_inside = block_reduce(inside, size, np.any)
+        free = ~block_reduce(covered, size, np.any)
+        leaf = fits & has_inside & free
+        leaf_masks.append((size, leaf))
+        covered |= expand(leaf, size)
+        size //= 2
+
+    # Leaf centers and the finest cells each leaf owns
+    owner = np.full((num_x, num_y), -1, dtype=np.int64)
+    centers_x, centers_y, leaf_count = [], [], 0
+    for size, leaf in leaf_masks:
+        block_i, block_j = np.nonzero(leaf)
+        ids = leaf_count + np.arange(len(block_i))
+        block_owner = np.full(leaf.shape, -1, dtype=np.int64)
+        block_owner[block_i, block_j] = ids
+        expanded = expand(block_owner, size)
+        owner = np.where(expanded >= 0, expanded, owner)
+        centers_x.append(minx + (block_i * size + (size - 1) / 2) * distance_in_degrees)
+        centers_y.append(miny + (block_j * size + (size - 1) / 2) * distance_in_degrees)
+        leaf_count += len(block_i)
+    centers_x = np.concatenate(centers_x)
+    centers_y = np.concatenate(centers_y)
+
+    # Zone of a leaf: the zone holding most of its inside finest cells
+    owned = inside & (owner >= 0)
+    pairs, pair_counts = np.unique(np.column_stack((owner[owned], cell_zone[owned])), axis=0, return_counts=True)
+    order = np.lexsort((-pair_counts, pairs[:, 0]))
+    pairs = pairs[order]
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = pairs[1:, 0] != pairs[:-1, 0]
+    leaf_zone = np.empty(leaf_count, dtype=np.int64)
+    leaf_zone[pairs[first, 0]] = pairs[first, 1]
+
+    # Neighboring finest cells with different owners connect their leaves
+    horizontal = np.column_stack((owner[:-1, :].ravel(), owner[1:, :].ravel()))
+    vertical = np.column_stack((owner[:, :-1].ravel(), owner[:, 1:].ravel()))
+    links = np.vstack((horizontal, vertical))
+    links = links[(links[:, 0] >= 0) & (links[:, 1] >= 0) & (links[:, 0] != links[:, 1])]
+
+    # Number nodes x-major like the uniform grid and keep source < target
+    node_order = np.lexsort((centers_y, centers_x))
+    new_id = np.empty(leaf_count, dtype=np.int64)
+    new_id[node_order] = np.arange(leaf_count)
+    links = np.unique(np.sort(new_id[links], axis=1), axis=0)
+
+    frequencies = np.array([prop['FREQUENCIA'] for prop in properties], dtype=object)
+    zones = np.array([prop['ZONA'] for prop in properties], dtype=object)
+    points_df = pd.DataFrame({
+        'id': np.arange(leaf_count),
+        'x': centers_x[node_order],
+        'y': centers_y[node_order],
+        'path_coverage': frequencies[leaf_zone[node_order]],
+        'zone': zones[leaf_zone[node_order]],
+    }).infer_objects()
+    edges_df = pd.DataFrame({'source': links[:, 0], 'target': links[:, 1]})
+    return points_df, edges_df
+
+
+@timed('grid.build_edges')
+def build_edges(points_df, max_distance):
+    # Build a k-d tree for efficient neighbor search
+    tree = cKDTree(points_df[['x', 'y']].to_numpy())
+
+    # Find pairs of points within the maximum distance. The lattice steps come from
+    # np.arange and can exceed the spacing by a rounding error, so allow a tiny slack
+    edges = tree.query_pairs(max_distance * (1 + 1e-6))
+    return pd.DataFrame([{'source': i, 'target': j} for i, j in edges], columns=['source', 'target'])
+
+
+# Zones held by each process of the tile pool, sent once by the initializer
+_tile_geometries = None
+_tile_zone_tree = None
+
+
+def init_tile_worker(geometries):
+    global _tile_geometries, _tile_zone_tree
+    _tile_geometries = geometries
+    _tile_zone_tree = STRtree(geometries)
+
+
+def build_tile(x_coords, y_coords, i0, j0, core_x, core_y, num_y, max_distance):
+    # Zones and edges of one tile of the lattice. The tile owns core_x x core_y points
+    # from lattice index (i0, j0); x_coords/y_coords also cover one spacing past its
+    # upper borders, so the edges leaving the tile are found too. Returns the global
+    # x-major flat index and zone of each inside point, whether the tile owns it and
+    # the edges as int32 pairs of positions in those arrays.
+    grid_x, grid_y = np.meshgrid(x_coords, y_coords, indexing='ij')
+    point_zone = zone_of_points(_tile_geometries, grid_x.ravel(), grid_y.ravel(), _tile_zone_tree)
+    point_idx = np.flatnonzero(point_zone >= 0)
+    local_i, local_j = np.divmod(point_idx, len(y_coords))
+    flat = (i0 + local_i) * num_y + (j0 + local_j)
+    owned = (local_i < core_x) & (local_j < core_y)
+    tree = cKDTree(np.column_stack((grid_x.ravel()[point_idx], grid_y.ravel()[point_idx])))
+    edges = tree.query_pairs(max_distance * (1 + 1e-6), output_type='ndarray').astype(np.int32)
+    return flat, point_zone[point_idx], owned, edges
+
+
+@timed('grid.build_grid_tiled')
+def build_grid_tiled(geometries, properties, bounds, spacing_in_meters=400, tile_size=512, workers=None):
+    # Same nodes as assign_zones over grid_coordinates and the same edges as
+    # build_edges, built tile by tile (tile_size x tile_size lattice points) in a
+    # process pool so memory is bounded by the tile size. Node ids follow the x-major
+    # lattice order of the single-process build; edges come sorted by (source, target).
+    x_coords, y_coords, distance_in_degrees = lattice_axes(bounds, spacing_in_meters)
+    num_x, num_y = len(x_coords), len(y_coords)
+
+    tiles = [(x_coords[i0:i0 + tile_size + 1], y_coords[j0:j0 + tile_size + 1], i0, j0,
+              min(tile_size, num_x - i0), min(tile_size, num_y - j0), num_y, distance_in_degrees)
+             for i0 in range(0, num_x, tile_size) for j0 in range(0, num_y, tile_size)]
+
+    if workers is not None and workers > 1 and len(tiles) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_tile_worker,
+                                 initargs=(geometries,)) as executor:
+            results = list(executor.map(build_tile, *zip(*tiles)))
+    else:
+        init_tile_worker(geometries)
+        results = [build_tile(*tile) for tile in tiles]
+
+    # Stitch: ids are the ranks of the owned flat indices, edges are mapped to them
+    # and the ones found by two neighboring tiles are kept once
+    flat = np.concatenate([tile_flat[owned] for tile_flat, _, owned, _ in results])
+    geom_idx = np.concatenate([zone[owned] for _, zone, owned, _ in results])
+    order = np.argsort(flat, kind='stable')
+    flat = flat[order]
+    geom_idx = geom_idx[order]
+    edges = np.concatenate([np.searchsorted(flat, tile_flat[tile_edges]) for tile_flat, _, _, tile_edges in results]
+                           + [np.empty((0, 2), dtype=np.int64)])
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    i, j = np.divmod(flat, num_y)
+    points_df = points_frame(properties, x_coords[i], y_coords[j], geom_idx)
+    edges_df = pd.DataFrame({'source': edges[:, 0], 'target': edges[:, 1]})
+    return points_df, edges_df
+
+
+@timed('grid.write_grid_csv')
+def write_grid_csv(points_df, edges_df, output_csv):
+    # Save points and edges to a CSV file
+    with open(output_csv, 'w') as f:
+        f.write('# Points\n')
+        points_df.to_csv(f, index=False)
+        f.write('\n# Edges\n')
+        edges_df.to_csv(f, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the grid of points and edges over the traffic zones")
+    parser.add_argument('--spacing', type=float, default=SPACING_IN_METERS, help="uniform grid spacing in meters")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="quadtree grid refined where zone demand density is high")
+    parser.add_argument('--min-spacing', type=float, default=MIN_SPACING_IN_METERS,
+                        help="finest adaptive cell size in meters")
+    parser.add_argument('--levels', type=int, default=ADAPTIVE_LEVELS,
+                        help="adaptive cell sizes (min-spacing doubled each level)")
+    parser.add_argument('--tiled', action='store_true', help="build the uniform grid tile by tile in a process pool")
+    parser.add_argument('--tile-size', type=int, default=512, help="lattice points per tile side")
+    parser.add_argument('--workers', type=int, default=None, help="processes for the tiled build")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
+
+    geometries, properties = load_zones('zonas_com_frequencia.geojson')
+
+    # Extract the bounding box of all geometries
+    bounds = tuple(shapely.total_bounds(geometries))
+
+    if args.adaptive:
+        points_df, edges_df = build_adaptive_grid(geometries, properties, bounds, args.min_spacing, args.levels)
+    elif args.tiled:
+        points_df, edges_df = build_grid_tiled(geometries, properties, bounds, args.spacing, args.tile_size,
+                                               args.workers)
+    else:
+        # Generate grid points args.spacing (400) meters apart
+        grid_x, grid_y, distance_in_degrees = grid_coordinates(bounds, args.spacing)
+        points_df = assign_zones(geometries, properties, grid_x, grid_y)
+
+        # Define the maximum distance for neighbors (the grid spacing in degrees)
+        max_distance = distance_in_degrees
+        edges_df = build_edges(points_df, max_distance)
+
+    output_csv = 'grid.csv'
+    write_grid_csv(points_df, edges_df, output_csv)
+    print(f"New CSV file created at: {output_csv}")
+
+    # Save the same tables as a memory-mappable binary snapshot
+    output_snapshot = 'grid_snapshot'
+    with stage('grid.save_snapshot'):
+        save_snapshot(output_snapshot, points_df, edges_df)
+    print(f"Binary snapshot created at: {output_snapshot}")
+
+    finish_from_arguments(args)
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from instrumentation import count, timed
+
+# Columnar cache of GeoJSON zone files. The first load parses the GeoJSON and writes
+# the geometries as one WKB blob with offsets, their bounds and the feature
+# properties to <geojson dir>/geometry_cache/<file name>-<hash>/; later loads only
+# decode the WKB. Entries are keyed by the SHA-256 of the GeoJSON file, so editing
+# the file rebuilds its entry. Simplified copies for display are cached per tolerance.
+
+CACHE_DIR = 'geometry_cache'
+STORE_VERSION = 1
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_wkb(directory, name, geometries):
+    blobs = shapely.to_wkb(geometries)
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    with open(os.path.join(directory, f'{name}.wkb'), 'wb') as f:
+        f.write(b''.join(blobs))
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets)
+
+
+def read_wkb(directory, name):
+    with open(os.path.join(directory, f'{name}.wkb'), 'rb') as f:
+        data = f.read()
+    offsets = np.load(os.path.join(directory, f'{name}_offsets.npy')).tolist()
+    return shapely.from_wkb([data[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+
+
+class ZoneStore:
+    def __init__(self, directory, geometries, properties, bounds, meta):
+        self.directory = directory
+        self.geometries = geometries
+        self.properties = properties
+        self.bounds = bounds  # (num_zones, 4): minx, miny, maxx, maxy
+        self.total_bounds = tuple(meta['total_bounds'])
+        self.crs = meta['crs']
+        self.simplified_cache = {}
+
+    @staticmethod
+    def entry_directory(geojson_path, cache_dir=None):
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(geojson_path)), CACHE_DIR)
+        name = os.path.basename(geojson_path)
+        return cache_dir, name, os.path.join(cache_dir, f'{name}-{file_hash(geojson_path)[:16]}')
+
+    @classmethod
+    @timed('geometry_store.build')
+    def build(cls, geojson_path, directory):
+        with open(geojson_path, 'r') as f:
+            geojson_data = json.load(f)
+        geometries = np.array([shape(feature['geometry']) for feature in geojson_data['features']], dtype=object)
+        properties = [feature['properties'] for feature in geojson_data['features']]
+        bounds = shapely.bounds(geometries)
+        crs = (geojson_data.get('crs') or {}).get('properties', {}).get('name', 'EPSG:4326')
+        meta = {
+            'version': STORE_VERSION,
+            'source': os.path.basename(geojson_path),
+            'total_bounds': [float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+                             float(bounds[:, 2].max()), float(bounds[:, 3].max())],
+            'crs': crs,
+        }
+
+        # Written to a temporary directory first so a partial entry is never read
+        tmp_directory = directory + '.tmp'
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        write_wkb(tmp_directory, 'geometry', geometries)
+        np.save(os.path.join(tmp_directory, 'bounds.npy'), bounds)
+        with open(os.path.join(tmp_directory, 'properties.json'), 'w') as f:
+            json.dump(properties, f)
+        with open(os.path.join(tmp_directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        return cls(directory, geometries, properties, bounds, meta)
+
+    @classmethod
+    @timed('geometry_store.read')
+    def read(cls, directory):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, 'properties.json'), 'r') as f:
+            properties = json.load(f)
+        return cls(directory, read_wkb(directory, 'geometry'), properties,
+                   np.load(os.path.join(directory, 'bounds.npy')), meta)
+
+    def simplified(self, tolerance):
+        # Geometries simplified with the given tolerance (degrees), cached on disk
+        if tolerance not in self.simplified_cache:
+            name = f'simplified_{tolerance:g}'
+            if os.path.exists(os.path.join(self.directory, f'{name}.wkb')):
+                geometries = read_wkb(self.directory, name)
+            else:
+                geometries = shapely.simplify(self.geometries, tolerance, preserve_topology=True)
+                write_wkb(self.directory, name, geometries)
+            self.simplified_cache[tolerance] = geometries
+        return self.simplified_cache[tolerance]
+
+    def geodataframe(self, simplify_tolerance=None):
+        import geopandas as gpd
+        geometries = self.geometries if simplify_tolerance is None else self.simplified(simplify_tolerance)
+        return gpd.GeoDataFrame(self.properties, geometry=list(geometries), crs=self.crs)
+
+
+def load_zone_store(geojson_path, cache_dir=None, prepare=True):
+    # Zone store for a GeoJSON file, built on first use or when the file changed.
+    # prepare=True prepares the geometries for repeated predicates (within/contains).
+    cache_dir, name, directory = ZoneStore.entry_directory(geojson_path, cache_dir)
+    valid = False
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            valid = json.load(f).get('version') == STORE_VERSION
+    if valid:
+        count('geometry_cache_hits')
+        store = ZoneStore.read(directory)
+    else:
+        # Drop the entries of older versions of the same file
+        if os.path.isdir(cache_dir):
+            for entry in os.listdir(cache_dir):
+                if entry.startswith(f'{name}-'):
+                    shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        store = ZoneStore.build(geojson_path, directory)
+    if prepare:
+        shapely.prepare(store.geometries)
+    return store
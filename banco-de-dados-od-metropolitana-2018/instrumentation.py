@@ -0,0 +1,119 @@
+import csv
+import functools
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Shared timing/memory/counter collection for the pipeline scripts. Stage timings are
+# aggregated by name (calls, total seconds, peak traced memory) so instrumented code
+# can run in loops without the report growing; counters track hot operations such as
+# Dijkstra calls, nodes visited by the greedy walk, or zone -> node lookups
+# (dataframe_lookups, which filtered the nodes table before the zone index).
+
+
+class Instrumentation:
+    def __init__(self):
+        self.stages = {}
+        self.counters = Counter()
+        self.trace_memory = False
+        self.peak_stack = []
+
+    def reset(self):
+        self.stages = {}
+        self.counters = Counter()
+        self.peak_stack = []
+
+    def start_memory_tracing(self):
+        # tracemalloc slows Python-heavy code down, so it is only on when asked for
+        self.trace_memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # Peak memory of a stage includes the peaks of the stages nested in it
+            if self.peak_stack:
+                self.peak_stack[-1] = max(self.peak_stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peak_stack.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if tracing:
+                peak = max(self.peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+                if self.peak_stack:
+                    self.peak_stack[-1] = max(self.peak_stack[-1], peak)
+            record = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_mb': None})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            if peak is not None:
+                record['peak_mb'] = max(record['peak_mb'] or 0.0, peak / 2 ** 20)
+
+    def timed(self, name=None):
+        # Decorator form of stage(); the stage name defaults to the function's qualified name
+        def decorator(func):
+            stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def report(self):
+        return {'stages': self.stages, 'counters': dict(self.counters)}
+
+    def write_report(self, path):
+        # JSON by default, CSV when the file name ends in .csv
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['kind', 'name', 'calls', 'seconds', 'peak_mb', 'value'])
+                for name, record in self.stages.items():
+                    writer.writerow(['stage', name, record['calls'], record['seconds'], record['peak_mb'], ''])
+                for name, value in self.counters.items():
+                    writer.writerow(['counter', name, '', '', '', value])
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+
+    def summary(self):
+        lines = [f"{name}: {record['calls']} call(s), {record['seconds']:.3f} s"
+                 + (f", peak {record['peak_mb']:.1f} MB" if record['peak_mb'] is not None else "")
+                 for name, record in self.stages.items()]
+        lines += [f"{name}: {value}" for name, value in self.counters.items()]
+        return '\n'.join(lines)
+
+
+# Instance shared by every script in the pipeline
+instrumentation = Instrumentation()
+stage = instrumentation.stage
+timed = instrumentation.timed
+count = instrumentation.count
+
+
+def add_report_arguments(parser):
+    parser.add_argument('--report', help="write stage timings and counters to this JSON/CSV file")
+    parser.add_argument('--trace-memory', action='store_true', help="record tracemalloc peak memory per stage")
+
+
+def start_from_arguments(args):
+    if args.trace_memory:
+        instrumentation.start_memory_tracing()
+
+
+def finish_from_arguments(args):
+    if args.report:
+        instrumentation.write_report(args.report)
+        print(f"Instrumentation report written to {args.report}")
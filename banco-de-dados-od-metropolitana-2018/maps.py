@@ -1,11 +1,15 @@
-import geopandas as gpd
 import pandas as pd
 import folium
 from folium import Choropleth, GeoJson
 
-# Carregar o arquivo GeoJSON
+from geometry_store import load_zone_store
+
+# Tolerância (em graus) para simplificar as zonas no mapa; None mantém a geometria original
+TOLERANCIA_SIMPLIFICACAO = None
+
+# Carregar as zonas do cache de geometrias (o GeoJSON só é lido quando muda)
 geojson_path = 'ZONAS-DE-TRAFEGO-2021-sem-pontos.geojson'
-gdf = gpd.read_file(geojson_path)
+gdf = load_zone_store(geojson_path, prepare=False).geodataframe(TOLERANCIA_SIMPLIFICACAO)
 
 # Carregar o arquivo CSV
 csv_path = 'resultado.csv'
@@ -0,0 +1,167 @@
+from collections import Counter
+
+import numpy as np
+
+from instrumentation import count, timed
+
+# Union coverage of a whole network of lines. A node counts once however many lines
+# pass through it: refcount[node] is the number of line stops at the node and the
+# network coverage is the sum of coverage over the nodes with refcount > 0.
+#
+# Every move (inserting, removing or swapping a stop, rerouting a segment) replaces
+# the slice line[start:end] by a new segment, and its exact change in union coverage
+# only looks at the nodes that leave or enter the line.
+#
+# With a catchment matrix (catchment.catchment_matrix) a stop reaches every node in
+# its row instead of only itself, and refcount counts the stops reaching each node, so
+# the total is the same union as CatchmentCoverage.network_coverage.
+
+
+class NetworkCoverage:
+    def __init__(self, coverage, lines=(), catchment=None):
+        # coverage: dense id -> coverage array; catchment: optional CSR matrix whose
+        # row s marks the nodes reached by a stop at s
+        self.coverage = np.asarray(coverage, dtype=np.float64)
+        self.catchment = None if catchment is None else catchment.tocsr()
+        self.refcount = np.zeros(len(self.coverage), dtype=np.int32)
+        self.lines = []
+        self.total = 0.0
+        for line in lines:
+            self.add_line(line)
+
+    def reached(self, stops):
+        # Nodes reached by the stops, once per stop reaching them
+        stops = np.asarray(stops, dtype=np.int64)
+        if self.catchment is None:
+            return stops
+        indptr, indices = self.catchment.indptr, self.catchment.indices
+        lengths = indptr[stops + 1] - indptr[stops]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return indices[np.repeat(indptr[stops], lengths) + offsets].astype(np.int64)
+
+    def change(self, removed, added):
+        # Change in union coverage if the removed stops left and the added ones entered
+        net = Counter(self.reached(added).tolist())
+        net.subtract(self.reached(removed).tolist())
+        delta = 0.0
+        for node, change in net.items():
+            if change == 0:
+                continue
+            before = self.refcount[node]
+            after = before + change
+            if before == 0 and after > 0:
+                delta += self.coverage[node]
+            elif before > 0 and after == 0:
+                delta -= self.coverage[node]
+        return float(delta)
+
+    def apply(self, removed, added):
+        delta = self.change(removed, added)
+        np.subtract.at(self.refcount, self.reached(removed), 1)
+        np.add.at(self.refcount, self.reached(added), 1)
+        self.total += delta
+        return delta
+
+    def add_line(self, line):
+        line = [int(node) for node in line]
+        self.lines.append(line)
+        return self.apply([], line)
+
+    def remove_line(self, index):
+        return self.apply(self.lines.pop(index), [])
+
+    def add_line_delta(self, line):
+        return self.change([], [int(node) for node in line])
+
+    def remove_line_delta(self, index):
+        return self.change(self.lines[index], [])
+
+    def reroute_delta(self, index, start, end, segment):
+        # Change if line[start:end] were replaced by segment
+        return self.change(self.lines[index][start:end], segment)
+
+    def reroute(self, index, start, end, segment):
+        line = self.lines[index]
+        segment = [int(node) for node in segment]
+        delta = self.apply(line[start:end], segment)
+        line[start:end] = segment
+        return delta
+
+    def insert_delta(self, index, position, node):
+        return self.reroute_delta(index, position, position, [node])
+
+    def insert(self, index, position, node):
+        return self.reroute(index, position, position, [node])
+
+    def remove_delta(self, index, position):
+        return self.reroute_delta(index, position, position + 1, [])
+
+    def remove(self, index, position):
+        return self.reroute(index, position, position + 1, [])
+
+    def swap_delta(self, index, position, node):
+        return self.reroute_delta(index, position, position + 1, [node])
+
+    def swap(self, index, position, node):
+        return self.reroute(index, position, position + 1, [node])
+
+    def recompute(self):
+        # Full recomputation, for checking the incremental total
+        return float(self.coverage[self.refcount > 0].sum())
+
+
+def neighbor_sets(sources, targets, num_ids):
+    # Undirected id -> set of neighbor ids
+    neighbors = [set() for _ in range(num_ids)]
+    for source, target in zip(np.asarray(sources).tolist(), np.asarray(targets).tolist()):
+        if source != target:
+            neighbors[source].add(target)
+            neighbors[target].add(source)
+    return neighbors
+
+
+def best_move(network, index, neighbors, growth_left):
+    # Best improving move on one line: swap a stop v between u and w for another
+    # common neighbor of u and w, or (while the length budget lasts) replace the hop
+    # u -> w by the detour u -> a -> b -> w. Endpoints never move.
+    line = network.lines[index]
+    on_line = set(line)
+    best = (1e-12, None)
+    for position in range(1, len(line) - 1):
+        u, v, w = line[position - 1], line[position], line[position + 1]
+        for candidate in (neighbors[u] & neighbors[w]) - on_line:
+            delta = network.swap_delta(index, position, candidate)
+            if delta > best[0]:
+                best = (delta, (position, position + 1, [candidate]))
+    if growth_left >= 2:
+        for position in range(len(line) - 1):
+            u, w = line[position], line[position + 1]
+            for a in neighbors[u] - on_line:
+                for b in (neighbors[a] & neighbors[w]) - on_line - {a}:
+                    delta = network.reroute_delta(index, position + 1, position + 1, [a, b])
+                    if delta > best[0]:
+                        best = (delta, (position + 1, position + 1, [a, b]))
+    return best
+
+
+@timed('network_coverage.improve_lines')
+def improve_lines(network, neighbors, max_growth=0.0, max_rounds=1000):
+    # Local search on the network's lines: apply the best improving move of each line
+    # in turn until no line improves. Lines may grow by max_growth times their
+    # original number of stops. Returns the total gain in union coverage.
+    budgets = [int(max_growth * len(line)) for line in network.lines]
+    gain = 0.0
+    for _ in range(max_rounds):
+        improved = False
+        for index, line in enumerate(network.lines):
+            delta, move = best_move(network, index, neighbors, budgets[index])
+            if move is None:
+                continue
+            start, end, segment = move
+            budgets[index] -= len(segment) - (end - start)
+            gain += network.reroute(index, start, end, segment)
+            count('local_search_moves')
+            improved = True
+        if not improved:
+            break
+    return gain
@@ -0,0 +1,60 @@
+import numpy as np
+import scipy.sparse as sp
+
+from converter_planilha import CAMINHO_MATRIZ_OD, carregar_matriz_od
+from instrumentation import timed
+
+# OD demand served by metro lines. A line serves the trips whose origin and
+# destination zones are both touched by it (no transfers). With L the line x zone
+# incidence matrix and OD the zone x zone trip matrix, the demand served by each
+# line is rowsum((L @ OD) .* L), a handful of sparse products for any number of lines.
+
+
+class ServedDemand:
+    def __init__(self, nodes_df, zones, od_matrix, include_intrazonal=False):
+        # zones: OD matrix labels; node zones are matched to them as strings
+        od_matrix = sp.csr_matrix(od_matrix, dtype=np.float64)
+        if not include_intrazonal:
+            od_matrix.setdiag(0)
+            od_matrix.eliminate_zeros()
+        self.zones = np.asarray(zones, dtype=str)
+        self.od_matrix = od_matrix
+
+        # Dense node id -> OD zone index, -1 for zones without trips
+        node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+        position = {zone: i for i, zone in enumerate(self.zones.tolist())}
+        self.node_zone = np.full(int(node_ids.max()) + 1 if len(node_ids) else 0, -1, dtype=np.int64)
+        self.node_zone[node_ids] = [position.get(str(zone), -1) for zone in nodes_df['zone'].tolist()]
+
+    @classmethod
+    def load(cls, nodes_df, path=CAMINHO_MATRIZ_OD, include_intrazonal=False):
+        zones, od_matrix = carregar_matriz_od(path)
+        return cls(nodes_df, zones, od_matrix, include_intrazonal)
+
+    def line_zones(self, paths):
+        # (num_lines x num_zones) with a 1 for every zone a line stops in
+        lengths = [len(path) for path in paths]
+        rows = np.repeat(np.arange(len(paths)), lengths)
+        nodes = np.concatenate([np.asarray(path, dtype=np.int64) for path in paths] + [np.empty(0, dtype=np.int64)])
+        zones = self.node_zone[nodes]
+        inside = zones >= 0
+        incidence = sp.csr_matrix((np.ones(inside.sum()), (rows[inside], zones[inside])),
+                                  shape=(len(paths), len(self.zones)))
+        incidence.data[:] = 1
+        return incidence
+
+    @timed('od_demand.paths_served')
+    def paths_served(self, paths):
+        # Demand served by each path on its own
+        incidence = self.line_zones(paths)
+        return np.asarray((incidence @ self.od_matrix).multiply(incidence).sum(axis=1)).ravel()
+
+    def path_served(self, path):
+        return float(self.paths_served([path])[0])
+
+    def network_served(self, paths):
+        # Demand served by a set of lines: an OD pair counts once if any line touches both zones
+        incidence = self.line_zones(paths)
+        connected = incidence.T @ incidence
+        connected.data[:] = 1
+        return float(self.od_matrix.multiply(connected).sum())
@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from algorithm5_2 import MetroNetworkDesign
+from converter_planilha import agregar_planilha
+from create_points_and_nodes import (ADAPTIVE_LEVELS, MIN_SPACING_IN_METERS, SPACING_IN_METERS, assign_zones,
+                                     build_adaptive_grid, build_edges, grid_coordinates, load_zones)
+from geometry_store import file_hash, load_zone_store
+from instrumentation import add_report_arguments, finish_from_arguments, start_from_arguments, stage
+from snapshot import SNAPSHOT_VERSION, load_snapshot, save_snapshot, update_snapshot_column
+
+# Incremental runner for converter_planilha -> zone GeoJSON -> grid -> coverage -> Algorithm 5.
+# Every stage is keyed by a fingerprint of its inputs and parameters and is skipped
+# while the fingerprint matches the one stored in <workdir>/state.json:
+#
+#   demand    survey CSV (or resultado.csv / GeoJSON FREQUENCIA) -> frequency per zone
+#   grid      zone geometries + spacing                          -> points and edges
+#   coverage  grid + demand                                      -> path_coverage, updated in place
+#   solve     coverage + coverage_threshold + target_zones       -> zone-pair paths
+#
+# When only the demand changes, the grid is reused and only the node_coverage column is
+# rewritten. Edge weights are 1 / coverage, so when every changed zone lost demand
+# (its weights only went up) the routes that avoid the changed zones stay shortest and
+# only the pairs whose routes touch one are solved again; if any zone gained demand,
+# every pair is solved again, which gives the same paths as a full solve.
+
+STATE_FILE = 'state.json'
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Pipeline:
+    def __init__(self, workdir, zones_geojson, survey_csv=None, demand_csv='resultado.csv',
+                 spacing=SPACING_IN_METERS, coverage_threshold=0.01, target_zones=(173, 53, 24, 215, 59),
+                 method='csgraph', workers=None, adaptive=False, levels=ADAPTIVE_LEVELS,
+                 min_spacing=MIN_SPACING_IN_METERS):
+        self.workdir = workdir
+        self.zones_geojson = zones_geojson
+        self.survey_csv = survey_csv
+        self.demand_csv = demand_csv
+        self.spacing = spacing
+        self.coverage_threshold = coverage_threshold
+        self.target_zones = list(target_zones)
+        self.method = method
+        self.workers = workers
+        # Adaptive grids use min_spacing as the finest cell size, like create_points_and_nodes.py
+        self.adaptive = adaptive
+        self.levels = levels
+        self.min_spacing = min_spacing
+        self.grid_dir = os.path.join(workdir, 'grid')
+        self.nodes_dir = os.path.join(workdir, 'nodes')
+        self.results_dir = os.path.join(workdir, 'results')
+        os.makedirs(workdir, exist_ok=True)
+        self.state = self.load_state()
+        self.zones = None
+
+    def load_state(self):
+        path = os.path.join(self.workdir, STATE_FILE)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self):
+        with open(os.path.join(self.workdir, STATE_FILE), 'w') as f:
+            json.dump(self.state, f, indent=2)
+
+    def is_fresh(self, name, key, *outputs):
+        return (self.state.get(name, {}).get('fingerprint') == key
+                and all(os.path.exists(output) for output in outputs))
+
+    def zone_data(self):
+        if self.zones is None:
+            self.zones = load_zones(self.zones_geojson)
+        return self.zones
+
+    def run_demand(self, force=False):
+        # Frequency per zone, keyed by the zone as a string
+        if self.survey_csv is not None and os.path.exists(self.survey_csv):
+            key = fingerprint('survey', file_hash(self.survey_csv))
+            if force or not self.is_fresh('demand', key, self.demand_csv):
+                with stage('pipeline.demand'):
+                    agregar_planilha(self.survey_csv).to_csv(self.demand_csv, index=False)
+                print(f"demand: aggregated {self.survey_csv} into {self.demand_csv}")
+            else:
+                print("demand: up to date")
+
+        if self.demand_csv is not None and os.path.exists(self.demand_csv):
+            demand = pd.read_csv(self.demand_csv, dtype={'ZONA': str})
+            frequencies = dict(zip(demand['ZONA'], demand['FREQUENCIA'].astype(int).tolist()))
+        else:
+            _, properties = self.zone_data()
+            frequencies = {str(prop['ZONA']): int(prop['FREQUENCIA']) for prop in properties}
+
+        self.state['demand'] = {'fingerprint': fingerprint('frequencies', frequencies), 'frequencies': frequencies}
+        return frequencies
+
+    def geometry_key(self):
+        # Only the geometry and zone ids matter for the grid, not the FREQUENCIA property.
+        # The cached WKB of the zones stands for the geometry
+        store = load_zone_store(self.zones_geojson, prepare=False)
+        zones = [prop['ZONA'] for prop in store.properties]
+        geometry = file_hash(os.path.join(store.directory, 'geometry.wkb'))
+        layout = ('adaptive', self.min_spacing, self.levels) if self.adaptive else ('uniform', self.spacing)
+        return fingerprint('grid', SNAPSHOT_VERSION, zones, geometry, layout)
+
+    def run_grid(self, force=False):
+        key = self.geometry_key()
+        if not force and self.is_fresh('grid', key, os.path.join(self.grid_dir, 'meta.json')):
+            print("grid: up to date")
+            return key, False
+
+        with stage('pipeline.grid'):
+            geometries, properties = self.zone_data()
+            bounds = shapely.total_bounds(geometries)
+            if self.adaptive:
+                points_df, edges_df = build_adaptive_grid(geometries, properties, bounds, self.min_spacing,
+                                                          self.levels)
+            else:
+                grid_x, grid_y, distance_in_degrees = grid_coordinates(bounds, self.spacing)
+                points_df = assign_zones(geometries, properties, grid_x, grid_y)
+                edges_df = build_edges(points_df, distance_in_degrees)
+            save_snapshot(self.grid_dir, points_df, edges_df)
+        self.state['grid'] = {'fingerprint': key}
+        print(f"grid: {len(points_df)} nodes, {len(edges_df)} edges")
+        return key, True
+
+    def run_coverage(self, grid_key, grid_rebuilt, frequencies, force=False):
+        key = fingerprint('coverage', grid_key, self.state['demand']['fingerprint'])
+        if not force and self.is_fresh('coverage', key, os.path.join(self.nodes_dir, 'meta.json')):
+            print("coverage: up to date")
+            return key
+
+        with stage('pipeline.coverage'):
+            grid = load_snapshot(self.grid_dir)
+            zones = grid['zone_categories'][grid['node_zone']].astype(str)
+            zone_frequency = pd.Series(frequencies, dtype=np.float64)
+            counts = pd.Series(zones).value_counts()
+
+            # Same normalization as readcsv.py: zone frequency divided among the zone's points
+            coverage = (zone_frequency.reindex(zones).fillna(0).to_numpy()
+                        / counts.reindex(zones).to_numpy())
+
+            previous = self.state.get('coverage', {})
+            if not grid_rebuilt and previous.get('grid') == grid_key and os.path.exists(
+                    os.path.join(self.nodes_dir, 'meta.json')):
+                update_snapshot_column(self.nodes_dir, 'node_coverage', coverage)
+                print("coverage: updated path_coverage in place")
+            else:
+                nodes_df = grid.nodes_df()
+                nodes_df['path_coverage'] = coverage
+                save_snapshot(self.nodes_dir, nodes_df, grid.edges_df())
+                print("coverage: rebuilt nodes snapshot")
+        self.state['coverage'] = {'fingerprint': key, 'grid': grid_key}
+        return key
+
+    def run_solve(self, grid_key, coverage_key, frequencies, force=False):
+        params = fingerprint('solve', self.coverage_threshold, self.target_zones, self.method)
+        key = fingerprint(params, coverage_key)
+        paths_file = os.path.join(self.workdir, 'paths_saved.json')
+        if not force and self.is_fresh('solve', key, paths_file):
+            print("solve: up to date")
+            return self.load_paths(paths_file)
+
+        nodes = load_snapshot(self.nodes_dir)
+        nodes_df = nodes.nodes_df()
+        metro_network = MetroNetworkDesign(nodes_df, nodes.edges_df(), self.coverage_threshold, self.target_zones)
+        zone_representatives = {zone: int(node) for zone, node in metro_network.find_zone_representatives().items()}
+
+        previous = self.state.get('solve', {})
+        pairs = None
+        old_paths = {}
+        if (not force and previous.get('params') == params and previous.get('grid') == grid_key
+                and os.path.exists(paths_file)):
+            # Only the demand changed
+            old_frequencies = previous.get('frequencies', {})
+            changed = {zone for zone in set(old_frequencies) | set(frequencies)
+                       if old_frequencies.get(zone) != frequencies.get(zone)}
+            grown = [zone for zone in changed if frequencies.get(zone, 0) > old_frequencies.get(zone, 0)]
+            if grown:
+                # Lower weights in a grown zone can attract any route
+                print(f"solve: {len(changed)} zone(s) changed, {len(grown)} gained demand, re-solving every pair")
+            else:
+                # Re-solve the pairs whose routes touch a changed zone or whose representative moved
+                old_paths = self.load_paths(paths_file)
+                old_representatives = {int(zone): node
+                                       for zone, node in previous.get('representatives', {}).items()}
+                node_zone = pd.Series(nodes_df['zone'].astype(str).to_numpy(), index=nodes_df['id'].to_numpy())
+                pairs = [
+                    pair for pair, (path, _) in old_paths.items()
+                    if not path
+                    or any(old_representatives.get(zone) != zone_representatives.get(zone) for zone in pair)
+                    or node_zone.reindex(path).isin(changed).any()
+                ]
+                print(f"solve: {len(changed)} zone(s) changed, re-solving {len(pairs)} of {len(old_paths)} pairs")
+
+        with stage('pipeline.solve'):
+            if pairs is None or pairs:
+                new_paths = metro_network.algorithm_5(zone_representatives, self.method, self.workers,
+                                                      verbose=False, pairs=pairs)
+            else:
+                new_paths = {}
+
+        if pairs is None:
+            paths = new_paths
+        else:
+            # Unchanged routes keep their nodes but are re-scored with the new coverage
+            coverage = metro_network.coverage_by_id()
+            paths = {pair: new_paths[pair] if pair in new_paths else (path, metro_network.path_coverage(path, coverage))
+                     for pair, (path, _) in old_paths.items()}
+
+        metro_network.save_results(paths, os.path.join(self.workdir, 'nodes_saved.csv'), paths_file,
+                                   snapshot_dir=self.results_dir)
+        self.state['solve'] = {
+            'fingerprint': key,
+            'params': params,
+            'grid': grid_key,
+            'frequencies': frequencies,
+            'representatives': {str(zone): node for zone, node in zone_representatives.items()},
+        }
+        return paths
+
+    def load_paths(self, paths_file):
+        with open(paths_file, 'r') as f:
+            paths_str_keys = json.load(f)
+        return {(int(k.split('-')[0]), int(k.split('-')[1])): (v[0], v[1]) for k, v in paths_str_keys.items()}
+
+    def run(self, force=False):
+        frequencies = self.run_demand(force)
+        grid_key, grid_rebuilt = self.run_grid(force)
+        coverage_key = self.run_coverage(grid_key, grid_rebuilt, frequencies, force)
+        paths = self.run_solve(grid_key, coverage_key, frequencies, force)
+        self.save_state()
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental pipeline from the OD survey to Algorithm 5 paths")
+    parser.add_argument('--workdir', default='pipeline_cache', help="directory for stage outputs and state")
+    parser.add_argument('--zones-geojson', default='zonas_com_frequencia.geojson')
+    parser.add_argument('--survey', default='BANCO DE DADOS OD 2018 Março_2020.csv',
+                        help="OD survey CSV; skipped when missing")
+    parser.add_argument('--demand', default='resultado.csv', help="zone frequencies produced from the survey")
+    parser.add_argument('--spacing', type=float, default=SPACING_IN_METERS, help="uniform grid spacing in meters")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="quadtree grid refined where zone demand density is high")
+    parser.add_argument('--min-spacing', type=float, default=MIN_SPACING_IN_METERS,
+                        help="finest adaptive cell size in meters")
+    parser.add_argument('--levels', type=int, default=ADAPTIVE_LEVELS,
+                        help="adaptive cell sizes (min-spacing doubled each level)")
+    parser.add_argument('--coverage-threshold', type=float, default=0.01)
+    parser.add_argument('--target-zones', type=int, nargs='+', default=[173, 53, 24, 215, 59])
+    parser.add_argument('--method', choices=['networkx', 'csgraph'], default='csgraph')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="rerun every stage")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
+
+    pipeline = Pipeline(args.workdir, args.zones_geojson, args.survey, args.demand, args.spacing,
+                        args.coverage_threshold, args.target_zones, args.method, args.workers,
+                        args.adaptive, args.levels, args.min_spacing)
+    paths = pipeline.run(args.force)
+    print(f"{len(paths)} zone-pair paths in {os.path.join(args.workdir, 'paths_saved.json')}")
+
+    finish_from_arguments(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,79 @@
+import argparse
 import pandas as pd
 import io
 
-# Path to the CSV file
-csv_path = 'grid.csv'
+from instrumentation import add_report_arguments, finish_from_arguments, start_from_arguments, stage, timed
+from snapshot import load_snapshot, save_snapshot, snapshot_is_current
+from zone_index import ZoneIndex
 
-# Read the entire CSV file into a DataFrame
-with open(csv_path, 'r') as f:
-    content = f.read()
 
-# Split the content by sections
-sections = content.split('\n# ')
+@timed('readcsv.read_grid')
+def read_grid(csv_path, snapshot_path=None):
+    if snapshot_path is not None and snapshot_is_current(snapshot_path, csv_path):
+        # Load the memory-mapped columns instead of parsing the text file, unless the
+        # CSV was written after the snapshot
+        snapshot = load_snapshot(snapshot_path)
+        return snapshot.nodes_df(), snapshot.edges_df()
 
-# Parse the points section
-points_section = sections[0].split('\n', 1)[1]
-points_df = pd.read_csv(io.StringIO(points_section))
+    # Read the entire CSV file into a DataFrame
+    with open(csv_path, 'r') as f:
+        content = f.read()
 
-# Parse the edges section
-edges_section = sections[1].split('\n', 1)[1]
-edges_df = pd.read_csv(io.StringIO(edges_section))
+    # Split the content by sections
+    sections = content.split('\n# ')
 
-zone_counts = points_df['zone'].value_counts()
+    # Parse the points section
+    points_section = sections[0].split('\n', 1)[1]
+    points_df = pd.read_csv(io.StringIO(points_section))
 
-# Update the path_coverage for each point
-points_df['path_coverage'] = points_df.apply(
-    lambda row: row['path_coverage'] / zone_counts[row['zone']], axis=1
-)
+    # Parse the edges section
+    edges_section = sections[1].split('\n', 1)[1]
+    edges_df = pd.read_csv(io.StringIO(edges_section))
+    return points_df, edges_df
 
-# Save the updated points and edges back to the CSV file
-output_csv = 'grid_updated.csv'
-with open(output_csv, 'w') as f:
-    f.write('# Points\n')
-    points_df.to_csv(f, index=False)
-    f.write('\n# Edges\n')
-    edges_df.to_csv(f, index=False)
 
-print(f"Updated CSV file created at: {output_csv}")
+@timed('readcsv.normalize_coverage')
+def normalize_coverage(points_df):
+    zone_index = ZoneIndex(points_df['zone'].to_numpy())
 
+    # Divide the path_coverage of each point by the number of points in its zone
+    points_df['path_coverage'] = points_df['path_coverage'].to_numpy(dtype=float) / zone_index.per_node(zone_index.counts)
+    return points_df
 
-# Display the data
-print("Points DataFrame:")
-print(points_df.head())
 
-print("\nEdges DataFrame:")
-print(edges_df.head())
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Normalize grid path_coverage by the number of points per zone")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
 
-# Now you can work with the DataFrames
+    # Path to the CSV file and to the binary snapshot written next to it
+    points_df, edges_df = read_grid('grid.csv', 'grid_snapshot')
+    points_df = normalize_coverage(points_df)
+
+    # Save the updated points and edges back to the CSV file
+    output_csv = 'grid_updated.csv'
+    with stage('readcsv.write_csv'), open(output_csv, 'w') as f:
+        f.write('# Points\n')
+        points_df.to_csv(f, index=False)
+        f.write('\n# Edges\n')
+        edges_df.to_csv(f, index=False)
+
+    print(f"Updated CSV file created at: {output_csv}")
+
+    output_snapshot = 'grid_updated_snapshot'
+    with stage('readcsv.save_snapshot'):
+        save_snapshot(output_snapshot, points_df, edges_df)
+    print(f"Updated binary snapshot created at: {output_snapshot}")
+
+    finish_from_arguments(args)
+
+
+    # Display the data
+    print("Points DataFrame:")
+    print(points_df.head())
+
+    print("\nEdges DataFrame:")
+    print(edges_df.head())
+
+    # Now you can work with the DataFrames
@@ -0,0 +1,105 @@
+import numpy as np
+import folium
+from folium import plugins
+from shapely.geometry import LineString
+
+# Above this many nodes the markers are drawn by a single FastMarkerCluster layer
+# instead of one GeoJSON point per node
+CLUSTER_THRESHOLD = 5000
+
+
+class NodeIndex:
+    # Dense id -> coordinate/attribute arrays, so path and node lookups are array indexing
+    def __init__(self, nodes_df):
+        node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+        size = int(node_ids.max()) + 1 if len(node_ids) else 0
+        self.x = np.full(size, np.nan)
+        self.y = np.full(size, np.nan)
+        self.coverage = np.full(size, np.nan)
+        self.zone = np.empty(size, dtype=object)
+        self.x[node_ids] = nodes_df['x'].to_numpy(dtype=np.float64)
+        self.y[node_ids] = nodes_df['y'].to_numpy(dtype=np.float64)
+        self.coverage[node_ids] = nodes_df['path_coverage'].to_numpy(dtype=np.float64)
+        self.zone[node_ids] = nodes_df['zone'].to_numpy()
+
+    def locations(self, node_ids, round_digits=None):
+        # (lat, lng) rows for the given ids
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        locations = np.column_stack((self.y[node_ids], self.x[node_ids]))
+        if round_digits is not None:
+            locations = np.round(locations, round_digits)
+        return locations
+
+
+def normalize_paths(paths):
+    # Accept algorithm5/algorithm5_2 results ({(zone_src, zone_dest): (path, coverage)})
+    # and plain lists of (path, coverage)
+    if isinstance(paths, dict):
+        return [(f"Zone {zone_src} → Zone {zone_dest}", path, coverage)
+                for (zone_src, zone_dest), (path, coverage) in paths.items()]
+    return [(f"Line {i + 1}", path, coverage) for i, (path, coverage) in enumerate(paths)]
+
+
+def path_locations(index, path, round_digits=None, simplify_tolerance=None):
+    locations = index.locations(path)
+    if simplify_tolerance is not None and len(locations) > 2:
+        # Simplify in (lng, lat) space; the tolerance is in degrees
+        line = LineString(locations[:, ::-1]).simplify(simplify_tolerance, preserve_topology=False)
+        locations = np.asarray(line.coords)[:, ::-1]
+    if round_digits is not None:
+        locations = np.round(locations, round_digits)
+    return locations.tolist()
+
+
+def nodes_layer(index, node_ids, round_digits=None, color='blue', cluster_threshold=CLUSTER_THRESHOLD):
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    locations = index.locations(node_ids, round_digits)
+    if len(node_ids) > cluster_threshold:
+        return plugins.FastMarkerCluster(locations.tolist(), name='Nodes')
+
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+            'properties': {'id': node_id, 'zone': zone, 'path_coverage': coverage},
+        }
+        for node_id, (lat, lng), zone, coverage in zip(
+            node_ids.tolist(), locations.tolist(), index.zone[node_ids].tolist(), index.coverage[node_ids].tolist()
+        )
+    ]
+    return folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name='Nodes',
+        marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=0.7),
+        style_function=lambda feature: {'color': color, 'fillColor': color},
+        popup=folium.GeoJsonPopup(fields=['id', 'zone', 'path_coverage'], aliases=['Node ID', 'Zone', 'Coverage']),
+    )
+
+
+def generate_network_map(nodes_df, paths, output_filename, node_ids=None, round_digits=6,
+                         simplify_tolerance=None, line_color='red', node_color='blue',
+                         cluster_threshold=CLUSTER_THRESHOLD):
+    # Render solution paths as one polyline each plus a single layer for the nodes.
+    # node_ids defaults to the nodes on the paths.
+    index = NodeIndex(nodes_df)
+    lines = [(label, path, coverage) for label, path, coverage in normalize_paths(paths) if len(path) > 0]
+    if node_ids is None:
+        node_ids = np.unique(np.concatenate([np.asarray(path, dtype=np.int64) for _, path, _ in lines])) \
+            if lines else np.array([], dtype=np.int64)
+
+    m = folium.Map(location=[nodes_df['y'].mean(), nodes_df['x'].mean()], zoom_start=13)
+
+    if len(node_ids) > 0:
+        nodes_layer(index, node_ids, round_digits, node_color, cluster_threshold).add_to(m)
+
+    for label, path, coverage in lines:
+        folium.PolyLine(
+            locations=path_locations(index, path, round_digits, simplify_tolerance),
+            color=line_color,
+            weight=3,
+            opacity=0.7,
+            tooltip=f"{label} | Coverage: {coverage:.4f}",
+        ).add_to(m)
+
+    m.save(output_filename)
+    return output_filename
@@ -0,0 +1,249 @@
+import hashlib
+import heapq
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+from instrumentation import count, timed
+from snapshot import index_dtype
+
+# Precomputed routing index for repeated shortest-path queries on one weighted graph.
+#
+# - Hub trees: full shortest-path trees (predecessor arrays) from hub nodes such as
+#   the zone representatives. Any query starting or ending at a hub is answered by
+#   walking the tree, in time proportional to the path length.
+# - ALT (A*, landmarks, triangle inequality): distances from a few landmarks; for a
+#   node v and target t, max over landmarks |d(l, t) - d(l, v)| is a lower bound on
+#   d(v, t) that steers an A* search towards the target for all other queries.
+#
+# The index is persisted as .npy files next to the saved results and checked against
+# the graph it was built for.
+
+INDEX_VERSION = 1
+
+
+def graph_fingerprint(matrix):
+    # Identifies the weighted graph the index was built for
+    matrix = sp.csr_matrix(matrix)
+    digest = hashlib.sha256()
+    digest.update(np.asarray(matrix.shape, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(matrix.indptr, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(matrix.indices, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(matrix.data, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def symmetric_csr(matrix):
+    # Undirected adjacency with both directions stored and unusable (infinite) edges dropped
+    matrix = sp.csr_matrix(matrix)
+    matrix = matrix.maximum(matrix.T).tocsr()
+    matrix.data[~np.isfinite(matrix.data)] = 0
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    return matrix
+
+
+ARRAYS = ('indptr', 'indices', 'weights', 'landmarks', 'distances', 'hubs', 'hub_predecessors', 'hub_distances')
+
+
+class RoutingIndex:
+    def __init__(self, indptr, indices, weights, landmarks, distances, hubs, hub_predecessors, hub_distances,
+                 graph_key):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.landmarks = landmarks
+        self.distances = distances  # (num_ids, num_landmarks), node-major for the A* lookups
+        self.hubs = hubs
+        self.hub_predecessors = hub_predecessors  # (num_hubs, num_ids), -1 where unreachable
+        self.hub_distances = hub_distances  # (num_hubs, num_ids)
+        self.hub_rows = {int(hub): row for row, hub in enumerate(np.asarray(hubs).tolist())}
+        self.graph_key = graph_key
+        self.adjacency = None
+        self.landmark_distances = None
+        self.active_landmarks = 4
+
+    @classmethod
+    @timed('routing_index.build')
+    def build(cls, matrix, hubs=(), num_landmarks=16, seed=0):
+        graph_key = graph_fingerprint(matrix)
+        matrix = symmetric_csr(matrix)
+        num_ids = matrix.shape[0]
+
+        # One shortest-path tree per hub, all in a single csgraph call
+        hubs = np.unique(np.asarray(hubs, dtype=np.int64))
+        if len(hubs):
+            hub_distances, hub_predecessors = csgraph.dijkstra(matrix, directed=False, indices=hubs,
+                                                               return_predecessors=True)
+            count('dijkstra_calls', len(hubs))
+            hub_predecessors = np.where(hub_predecessors < 0, -1, hub_predecessors).astype(index_dtype(num_ids))
+        else:
+            hub_distances = np.empty((0, num_ids))
+            hub_predecessors = np.empty((0, num_ids), dtype=np.int32)
+
+        landmarks, distances = cls.select_landmarks(matrix, num_landmarks, seed)
+        return cls(matrix.indptr, matrix.indices, matrix.data, landmarks, distances, hubs, hub_predecessors,
+                   hub_distances, graph_key)
+
+    @staticmethod
+    def select_landmarks(matrix, num_landmarks, seed):
+        num_ids = matrix.shape[0]
+        degree = np.diff(matrix.indptr)
+
+        # Farthest-point landmark selection: each new landmark is the node farthest
+        # from the landmarks chosen so far, starting from a random connected node
+        rng = np.random.default_rng(seed)
+        connected = degree > 0
+        landmarks = []
+        rows = []
+        if connected.any():
+            start = int(rng.choice(np.flatnonzero(connected)))
+            nearest = csgraph.dijkstra(matrix, directed=False, indices=start)
+            while len(landmarks) < num_landmarks:
+                # Nodes of a component without a landmark come first, then the
+                # reachable node farthest from every landmark
+                unreached = connected & ~np.isfinite(nearest)
+                if landmarks and unreached.any():
+                    current = int(np.flatnonzero(unreached)[0])
+                else:
+                    current = int(np.argmax(np.where(connected & np.isfinite(nearest), nearest, -1)))
+                if current in landmarks:
+                    break
+                landmarks.append(current)
+                row = csgraph.dijkstra(matrix, directed=False, indices=current)
+                count('dijkstra_calls')
+                rows.append(row)
+                nearest = row if len(landmarks) == 1 else np.minimum(nearest, row)
+        distances = np.vstack(rows).T if rows else np.empty((num_ids, 0))
+
+        return np.asarray(landmarks, dtype=np.int64), np.ascontiguousarray(distances)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'graph_key': self.graph_key,
+                       'num_landmarks': len(self.landmarks), 'num_hubs': len(self.hubs)}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError(f"Unsupported routing index version {meta['version']} in {directory}")
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ARRAYS}
+        return cls(graph_key=meta['graph_key'], **arrays)
+
+    def matches(self, matrix):
+        return self.graph_key == graph_fingerprint(matrix)
+
+    def prepare(self):
+        # Python adjacency and landmark-distance lists, built on the first query; heap
+        # operations on Python floats are much faster than indexing NumPy arrays one
+        # element at a time
+        if self.adjacency is None:
+            indptr = np.asarray(self.indptr).tolist()
+            indices = np.asarray(self.indices).tolist()
+            weights = np.asarray(self.weights).tolist()
+            self.adjacency = [list(zip(indices[indptr[v]:indptr[v + 1]], weights[indptr[v]:indptr[v + 1]]))
+                              for v in range(len(indptr) - 1)]
+            self.landmark_distances = np.asarray(self.distances).tolist()
+        return self.adjacency, self.landmark_distances
+
+    def hub_path(self, hub, node):
+        # Path hub -> node read from the hub's shortest-path tree
+        row = self.hub_rows[hub]
+        distance = float(self.hub_distances[row, node])
+        if distance == np.inf:
+            return None, np.inf
+        predecessors = self.hub_predecessors[row]
+        path = [node]
+        while path[-1] != hub:
+            path.append(int(predecessors[path[-1]]))
+        return path[::-1], distance
+
+    def query(self, source, target):
+        # Shortest path source -> target; returns (path, distance) or (None, inf)
+        source = int(source)
+        target = int(target)
+        if source == target:
+            return [source], 0.0
+        if source in self.hub_rows:
+            count('hub_queries')
+            return self.hub_path(source, target)
+        if target in self.hub_rows:
+            count('hub_queries')
+            path, distance = self.hub_path(target, source)
+            return (path[::-1] if path is not None else None), distance
+        return self.alt_query(source, target)
+
+    def alt_query(self, source, target):
+        # A* search guided by the landmark lower bounds
+        adjacency, landmark_distances = self.prepare()
+        count('alt_queries')
+
+        # Only the landmarks with the tightest bounds for this source/target pair are
+        # used during the search. A landmark that reaches only one of the two nodes
+        # proves they are disconnected
+        gaps = []
+        for landmark, (to_target, to_source) in enumerate(zip(landmark_distances[target], landmark_distances[source])):
+            if (to_target == np.inf) != (to_source == np.inf):
+                return None, np.inf
+            if to_target != np.inf:
+                gaps.append((abs(to_target - to_source), landmark))
+        active = [landmark for _, landmark in sorted(gaps, reverse=True)[:self.active_landmarks]]
+        target_distances = [landmark_distances[target][landmark] for landmark in active]
+
+        bounds = {}
+
+        def lower_bound(node):
+            # max over the active landmarks of |d(l, t) - d(l, v)|; nodes in the target's
+            # component are reachable from the same landmarks
+            if node not in bounds:
+                node_distances = landmark_distances[node]
+                bound = 0.0
+                for to_target, landmark in zip(target_distances, active):
+                    gap = to_target - node_distances[landmark]
+                    if gap < 0:
+                        gap = -gap
+                    if gap > bound:
+                        bound = gap
+                bounds[node] = bound
+            return bounds[node]
+
+        best = {source: 0.0}
+        previous = {source: None}
+        heap = [(lower_bound(source), 0.0, source)]
+        settled = set()
+        relaxed = 0
+        while heap:
+            _, distance, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            if node == target:
+                count('edges_relaxed', relaxed)
+                path = [node]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                return path[::-1], distance
+            settled.add(node)
+            for neighbor, weight in adjacency[node]:
+                relaxed += 1
+                candidate = distance + weight
+                if candidate < best.get(neighbor, np.inf):
+                    bound = lower_bound(neighbor)
+                    best[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (candidate + bound, candidate, neighbor))
+        count('edges_relaxed', relaxed)
+        return None, np.inf
+
+    def query_many(self, source, targets):
+        # Several targets from one source: {target: path or None}
+        return {target: self.query(source, target)[0] for target in targets}
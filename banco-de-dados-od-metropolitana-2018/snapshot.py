@@ -0,0 +1,190 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Binary graph snapshot: one raw .npy file per column inside a directory, so every
+# array can be memory-mapped with np.load(mmap_mode='r') instead of re-parsing CSV.
+#
+#   node_id, node_x, node_y, node_coverage, node_zone   nodes (zone as int16 codes)
+#   zone_categories                                     zone value of each code
+#   indptr, indices, weights                            CSR adjacency, source -> target
+#   edge_order                                          input edge of each CSR entry
+#   path_keys, path_offsets, path_nodes, path_coverage  saved solution paths
+#   meta.json                                           counts and format version
+
+SNAPSHOT_VERSION = 2
+
+
+def index_dtype(max_value):
+    return np.int32 if max_value < np.iinfo(np.int32).max else np.int64
+
+
+def edges_to_csr(sources, targets, num_ids, weights=None):
+    # Group the edges by source, keeping the input order inside each group. order[i]
+    # is the input position of CSR entry i, so the input order can be restored.
+    order = np.argsort(sources, kind='stable')
+    dtype = index_dtype(max(num_ids, len(sources)))
+    indptr = np.zeros(num_ids + 1, dtype=dtype)
+    np.cumsum(np.bincount(sources, minlength=num_ids), out=indptr[1:])
+    indices = targets[order].astype(dtype)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[order]
+    return indptr, indices, weights, order.astype(dtype)
+
+
+def snapshot_is_current(directory, source_path):
+    # A snapshot written from source_path can stand in for it only if it is not older
+    meta = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta):
+        return False
+    return not os.path.exists(source_path) or os.path.getmtime(meta) >= os.path.getmtime(source_path)
+
+
+def save_snapshot(directory, nodes_df, edges_df=None, weights=None, paths=None):
+    os.makedirs(directory, exist_ok=True)
+    node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+    num_ids = int(node_ids.max()) + 1 if len(node_ids) else 0
+
+    # Zones read from the GeoJSON are numeric strings; store them as numbers like nodes.csv does
+    zones = nodes_df['zone']
+    numeric_zones = pd.to_numeric(zones, errors='coerce')
+    if not numeric_zones.isna().any() and (numeric_zones % 1 == 0).all():
+        zones = numeric_zones.astype(np.int64)
+    zone_categories, zone_codes = np.unique(zones.to_numpy(), return_inverse=True)
+    if zone_categories.dtype == object:
+        zone_categories = zone_categories.astype(str)
+    zone_dtype = np.int16 if len(zone_categories) <= np.iinfo(np.int16).max else np.int32
+
+    # Coordinates stay float64: float32 rounds them to ~1 m and breaks the lattice
+    # distances the radius queries rely on
+    columns = {
+        'node_id': node_ids.astype(index_dtype(num_ids)),
+        'node_x': nodes_df['x'].to_numpy(dtype=np.float64),
+        'node_y': nodes_df['y'].to_numpy(dtype=np.float64),
+        'node_coverage': nodes_df['path_coverage'].to_numpy(dtype=np.float64),
+        'node_zone': zone_codes.astype(zone_dtype),
+        'zone_categories': zone_categories,
+    }
+
+    num_edges = 0
+    if edges_df is not None:
+        sources = edges_df['source'].to_numpy(dtype=np.int64)
+        targets = edges_df['target'].to_numpy(dtype=np.int64)
+        num_ids = max(num_ids, int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1)
+        indptr, indices, weights, edge_order = edges_to_csr(sources, targets, num_ids, weights)
+        columns['indptr'] = indptr
+        columns['indices'] = indices
+        columns['edge_order'] = edge_order
+        if weights is not None:
+            columns['weights'] = weights
+        num_edges = len(sources)
+
+    num_paths = 0
+    if paths is not None:
+        keys, offsets, path_nodes, coverages = [], [0], [], []
+        for (zone_src, zone_dest), (path, coverage) in paths.items():
+            keys.append((zone_src, zone_dest))
+            path_nodes.extend(int(node) for node in path)
+            offsets.append(len(path_nodes))
+            coverages.append(coverage)
+        columns['path_keys'] = np.array(keys, dtype=np.int64).reshape(-1, 2)
+        columns['path_offsets'] = np.array(offsets, dtype=np.int64)
+        columns['path_nodes'] = np.array(path_nodes, dtype=index_dtype(num_ids))
+        columns['path_coverage'] = np.array(coverages, dtype=np.float64)
+        num_paths = len(keys)
+
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f'{name}.npy'), values)
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'num_nodes': len(node_ids),
+        'num_ids': num_ids,
+        'num_edges': num_edges,
+        'num_paths': num_paths,
+        'columns': sorted(columns),
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def update_snapshot_column(directory, name, values):
+    # Rewrite a single column in place, e.g. node_coverage after a demand change,
+    # leaving the geometry and adjacency files untouched
+    path = os.path.join(directory, f'{name}.npy')
+    current = np.load(path, mmap_mode='r')
+    values = np.asarray(values, dtype=current.dtype)
+    if values.shape != current.shape:
+        raise ValueError(f"Column {name} has shape {current.shape}, got {values.shape}")
+    del current
+    np.save(path, values)
+
+
+class GraphSnapshot:
+    def __init__(self, directory, mmap=True):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.meta['version']} in {directory}")
+        self.directory = directory
+
+        # Memory-mapped columns are only paged in when they are read
+        mmap_mode = 'r' if mmap else None
+        self.columns = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in self.meta['columns']
+        }
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def nodes_df(self):
+        # Same schema as nodes.csv. The frame holds its own copy of the columns (the
+        # mapped arrays are read-only); read them through snapshot[name] to avoid copies.
+        return pd.DataFrame({
+            'id': self['node_id'],
+            'x': self['node_x'],
+            'y': self['node_y'],
+            'path_coverage': self['node_coverage'],
+            'zone': self['zone_categories'][self['node_zone']],
+        })
+
+    def edges_df(self):
+        # Edges in the order they were saved in, decoded from the CSR arrays
+        indptr = np.asarray(self['indptr'])
+        indices = self['indices']
+        sources = np.repeat(np.arange(len(indptr) - 1, dtype=indices.dtype), np.diff(indptr))
+        edge_order = self['edge_order']
+        source = np.empty_like(sources)
+        target = np.empty_like(sources)
+        source[edge_order] = sources
+        target[edge_order] = indices
+        return pd.DataFrame({'source': source, 'target': target})
+
+    def csr_matrix(self):
+        # Directed source -> target matrix over the mapped arrays; pass directed=False
+        # to scipy.sparse.csgraph to search it as the undirected graph
+        num_ids = self.meta['num_ids']
+        weights = self['weights'] if 'weights' in self else np.ones(len(self['indices']))
+        return sp.csr_matrix((weights, self['indices'], self['indptr']), shape=(num_ids, num_ids), copy=False)
+
+    def paths(self):
+        # Same structure as MetroNetworkDesign.load_results returns
+        if 'path_keys' not in self:
+            return {}
+        offsets = self['path_offsets']
+        path_nodes = self['path_nodes']
+        return {
+            (int(zone_src), int(zone_dest)): (path_nodes[offsets[i]:offsets[i + 1]].tolist(), float(coverage))
+            for i, ((zone_src, zone_dest), coverage) in enumerate(zip(self['path_keys'], self['path_coverage']))
+        }
+
+
+def load_snapshot(directory, mmap=True):
+    return GraphSnapshot(directory, mmap=mmap)
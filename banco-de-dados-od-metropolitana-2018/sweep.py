@@ -0,0 +1,191 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import algorithm5
+import algorithm5_2
+from instrumentation import add_report_arguments, finish_from_arguments, start_from_arguments, timed
+from snapshot import load_snapshot
+
+# Scenario sweep over coverage_threshold x target_zones for algorithm5 and
+# algorithm5_2. The nodes and edges tables are loaded once and their columns put in
+# multiprocessing.shared_memory blocks; every worker of the pool maps the same blocks
+# read-only and rebuilds its tables from them once, so a sweep holds one copy of the
+# graph per worker instead of one per scenario.
+#
+# algorithm5 prunes with coverage_threshold but always solves its fixed zone pairs;
+# algorithm5_2 ignores coverage_threshold and solves every pair of target_zones.
+
+ALGORITHMS = ('algorithm5', 'algorithm5_2')
+NODE_COLUMNS = ('id', 'x', 'y', 'path_coverage')
+EDGE_COLUMNS = ('source', 'target')
+
+
+def share_array(values, blocks):
+    # Copy values into a new shared memory block; returns the spec a worker attaches with
+    values = np.ascontiguousarray(values)
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+    blocks.append(block)
+    return block.name, values.shape, values.dtype.str
+
+
+def attach_array(spec, blocks):
+    name, shape, dtype = spec
+    # Workers share the main process's resource tracker, and the main process unlinks
+    # the block once the sweep is done
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+
+class SharedGraph:
+    # Nodes and edges columns in shared memory. Zones are stored as integer codes
+    # into zone_categories, which is small and sent to the workers as is.
+    def __init__(self, nodes_df, edges_df):
+        self.blocks = []
+        codes, categories = pd.factorize(nodes_df['zone'])
+        self.zone_categories = np.asarray(categories)
+        self.specs = {name: share_array(nodes_df[name].to_numpy(), self.blocks) for name in NODE_COLUMNS}
+        self.specs['zone'] = share_array(codes.astype(np.int32), self.blocks)
+        self.specs.update({name: share_array(edges_df[name].to_numpy(dtype=np.int64), self.blocks)
+                           for name in EDGE_COLUMNS})
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+# Tables and solvers held by each process of the sweep pool, built once by the initializer
+_sweep_blocks = []
+_sweep_columns = {}
+_sweep_nodes = None
+_sweep_edges = None
+_sweep_networks = {}
+
+
+def init_sweep_worker(specs, zone_categories):
+    # The frames wrap the shared arrays without copying them (copy=False, and any
+    # write goes through copy-on-write). Only the zone column is decoded from its
+    # codes into a per-process array.
+    global _sweep_nodes, _sweep_edges
+    _sweep_columns.clear()
+    _sweep_columns.update({name: attach_array(spec, _sweep_blocks) for name, spec in specs.items()})
+    nodes = {name: _sweep_columns[name] for name in NODE_COLUMNS}
+    nodes['zone'] = zone_categories[_sweep_columns['zone']]
+    _sweep_nodes = pd.DataFrame(nodes, copy=False)
+    _sweep_edges = pd.DataFrame({name: _sweep_columns[name] for name in EDGE_COLUMNS}, copy=False)
+    _sweep_networks.clear()
+
+
+def run_scenario(scenario):
+    # One scenario -> rows of the results table, one per path
+    rows = []
+    start = time.perf_counter()
+    zones = list(scenario['target_zones'])
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if scenario['algorithm'] == 'algorithm5':
+            network = algorithm5.MetroNetworkDesign(_sweep_nodes, _sweep_edges, scenario['coverage_threshold'], zones)
+            paths = network.algorithm_5()
+        else:
+            # The weighted graph does not depend on the scenario, so each worker builds it once
+            if 'algorithm5_2' not in _sweep_networks:
+                _sweep_networks['algorithm5_2'] = algorithm5_2.MetroNetworkDesign(_sweep_nodes, _sweep_edges)
+            network = _sweep_networks['algorithm5_2']
+            network.coverage_threshold = scenario['coverage_threshold']
+            network.target_zones = zones
+            paths = network.algorithm_5(network.find_zone_representatives(), scenario.get('method', 'csgraph'),
+                                        verbose=False)
+        for line, ((zone_src, zone_dest), (path, coverage)) in enumerate(paths.items()):
+            rows.append({'line': line, 'zone_src': zone_src, 'zone_dest': zone_dest,
+                         'path': path, 'coverage': coverage})
+    seconds = time.perf_counter() - start
+
+    for row in rows:
+        row['path'] = [int(node) for node in row['path']]
+        row['path_length'] = len(row['path'])
+        row['coverage'] = float(row['coverage'])
+        row.update(scenario=scenario['scenario'], seconds=seconds)
+    return rows
+
+
+def make_scenarios(algorithms, coverage_thresholds, target_zone_sets, method='csgraph'):
+    return [{'scenario': i, 'algorithm': algorithm, 'coverage_threshold': threshold,
+             'target_zones': list(zones), 'method': method}
+            for i, (algorithm, threshold, zones) in enumerate(
+                itertools.product(algorithms, coverage_thresholds, target_zone_sets))]
+
+
+@timed('sweep.run_sweep')
+def run_sweep(nodes_df, edges_df, scenarios, workers=None):
+    # Results table with one row per (scenario, path)
+    graph = SharedGraph(nodes_df, edges_df)
+    try:
+        if workers is not None and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_sweep_worker,
+                                     initargs=(graph.specs, graph.zone_categories)) as executor:
+                results = list(executor.map(run_scenario, scenarios))
+        else:
+            init_sweep_worker(graph.specs, graph.zone_categories)
+            results = [run_scenario(scenario) for scenario in scenarios]
+    finally:
+        graph.close()
+
+    settings = pd.DataFrame([{'scenario': scenario['scenario'], 'algorithm': scenario['algorithm'],
+                              'coverage_threshold': scenario['coverage_threshold'],
+                              'target_zones': ' '.join(map(str, scenario['target_zones']))}
+                             for scenario in scenarios])
+    rows = pd.DataFrame([row for scenario_rows in results for row in scenario_rows],
+                        columns=['scenario', 'line', 'zone_src', 'zone_dest', 'path_length', 'coverage', 'path',
+                                 'seconds'])
+    return settings.merge(rows, on='scenario', how='left')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Algorithm 5 over many coverage_threshold/target_zones scenarios")
+    parser.add_argument('--nodes', default='nodes.csv')
+    parser.add_argument('--edges', default='edges.csv')
+    parser.add_argument('--snapshot', help="load nodes and edges from this binary snapshot instead of the CSVs")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.01])
+    parser.add_argument('--target-zones', nargs='+', default=['173,53,24,215,59'],
+                        help="comma-separated zone sets, one scenario per set")
+    parser.add_argument('--method', choices=['networkx', 'csgraph'], default='csgraph',
+                        help="shortest-path backend of algorithm5_2")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='sweep_results.csv')
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
+
+    if args.snapshot:
+        snapshot = load_snapshot(args.snapshot)
+        nodes_df, edges_df = snapshot.nodes_df(), snapshot.edges_df()
+    else:
+        nodes_df, edges_df = pd.read_csv(args.nodes), pd.read_csv(args.edges)
+
+    target_zone_sets = [[int(zone) for zone in zones.split(',')] for zones in args.target_zones]
+    scenarios = make_scenarios(args.algorithms, args.thresholds, target_zone_sets, args.method)
+    results = run_sweep(nodes_df, edges_df, scenarios, args.workers)
+
+    results['path'] = results['path'].map(lambda path: json.dumps(path) if isinstance(path, list) else '')
+    results.to_csv(args.output, index=False)
+    print(f"{len(scenarios)} scenarios, {results['line'].notna().sum()} paths written to {args.output}")
+
+    finish_from_arguments(args)
+
+
+if __name__ == '__main__':
+    main()
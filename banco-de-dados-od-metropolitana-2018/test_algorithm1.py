@@ -0,0 +1,66 @@
+import numpy as np
+
+from algorithm1 import MetroNetworkDesignCoverage
+
+TRANSFER_AREAS = {'T1': ['A1', 'A2'], 'T2': ['A2', 'B1', 'B2'], 'T3': ['C1'], 'T4': ['D1', 'D2', 'D3']}
+TERMINAL_NODES = ['F1', 'F2', 'F3', 'F4']
+
+
+def coverage_function(start, end):
+    # Deterministic integer coverage with ties and non-positive rows (D1, D2)
+    if start in ('D1', 'D2'):
+        return -1 if end == 'F1' else 0
+    return (sum(map(ord, start)) * 7 + sum(map(ord, end)) * 3) % 5 * 37
+
+
+def baseline_algorithm_1(transfer_areas, terminal_nodes, coverage_function):
+    # The original row loop: first terminal with strictly higher coverage wins
+    solutions = {}
+    for area_key, area_nodes in transfer_areas.items():
+        solutions[area_key] = {}
+        for start_node in area_nodes:
+            best_line = None
+            max_coverage = 0
+            for end_node in terminal_nodes:
+                coverage = coverage_function(start_node, end_node)
+                if coverage > max_coverage:
+                    max_coverage = coverage
+                    best_line = (start_node, end_node)
+            solutions[area_key][start_node] = (best_line, max_coverage)
+    return solutions
+
+
+def coverage_types(solutions):
+    return [type(coverage) for lines in solutions.values() for _, coverage in lines.values()]
+
+
+def test_cached_and_threaded_match_the_baseline_loop():
+    expected = baseline_algorithm_1(TRANSFER_AREAS, TERMINAL_NODES, coverage_function)
+    for block_size, workers in ((256, None), (1, None), (2, 3)):
+        network = MetroNetworkDesignCoverage(TRANSFER_AREAS, TERMINAL_NODES, coverage_function,
+                                             block_size=block_size, workers=workers)
+        solutions = network.algorithm_1()
+        assert solutions == expected
+        # The callback's integers are returned as integers, not floats
+        assert coverage_types(solutions) == coverage_types(expected)
+
+
+def test_shared_nodes_are_computed_once():
+    calls = []
+
+    def counted(start, end):
+        calls.append((start, end))
+        return coverage_function(start, end)
+
+    MetroNetworkDesignCoverage(TRANSFER_AREAS, TERMINAL_NODES, counted).algorithm_1()
+    assert len(calls) == len(set(calls)) == 8 * len(TERMINAL_NODES)
+
+
+def test_matrix_function_matches_the_scalar_function():
+    def coverage_matrix_function(start_nodes, end_nodes):
+        return np.array([[coverage_function(start, end) for end in end_nodes] for start in start_nodes])
+
+    expected = baseline_algorithm_1(TRANSFER_AREAS, TERMINAL_NODES, coverage_function)
+    network = MetroNetworkDesignCoverage(TRANSFER_AREAS, TERMINAL_NODES,
+                                         coverage_matrix_function=coverage_matrix_function, block_size=2, workers=2)
+    assert network.algorithm_1() == expected
@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from algorithm5 import MetroNetworkDesign, init_beam_worker
+
+
+def make_beam_lattice(make_lattice):
+    # 2 x 4 lattice, ids row by row, edges only from lower to higher ids. Zone 1 is
+    # the left column, zone 2 the right one.
+    #   0 - 1 - 2 - 3
+    #   |   |   |   |
+    #   4 - 5 - 6 - 7
+    nodes_df, edges_df = make_lattice(2, 4)
+    nodes_df['path_coverage'] = [1.0, 5.0, 2.0, 1.0, 1.0, 1.0, 9.0, 1.0]
+    nodes_df['zone'] = [1, 3, 3, 2, 1, 3, 3, 2]
+    return nodes_df, edges_df
+
+
+def test_beam_reaches_a_destination_with_lower_ids(make_lattice):
+    nodes_df, edges_df = make_beam_lattice(make_lattice)
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2])
+
+    # The greedy walk only follows edges towards higher ids
+    greedy_path, _ = network.find_best_path(3, 0)
+    assert greedy_path[-1] != 0
+
+    path, coverage = network.find_best_path_beam(2, 1, beam_width=4)
+    assert path[0] in (3, 7)
+    assert path[-1] in (0, 4)
+    assert len(set(path)) == len(path)
+    undirected = set(zip(edges_df['source'], edges_df['target'])) | set(zip(edges_df['target'], edges_df['source']))
+    assert all((a, b) in undirected for a, b in zip(path, path[1:]))
+    # The shortest routes have 4 nodes; within the detour budget the beam picks up node 6
+    assert 6 in path
+    assert coverage == nodes_df.set_index('id')['path_coverage'][path].sum()
+
+
+def test_beam_without_detour_takes_a_shortest_route(make_lattice):
+    nodes_df, edges_df = make_beam_lattice(make_lattice)
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2])
+    path, _ = network.find_best_path_beam(2, 1, beam_width=8, detour=0.0)
+    assert len(path) == 4
+    assert path == [7, 6, 5, 4]
+
+
+def test_beam_with_workers_matches_one_process(make_lattice):
+    nodes_df, edges_df = make_beam_lattice(make_lattice)
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2])
+    with ProcessPoolExecutor(max_workers=2, initializer=init_beam_worker,
+                             initargs=(network.beam_indptr, network.beam_indices, network.coverage)) as executor:
+        parallel = network.find_best_path_beam(2, 1, 4, executor, workers=2)
+    assert parallel[0][-1] in (0, 4)
+    assert parallel[1] >= network.find_best_path_beam(2, 1, 4)[1] - 1e-9
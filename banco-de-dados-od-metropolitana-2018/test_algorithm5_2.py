@@ -0,0 +1,48 @@
+import networkx as nx
+
+from algorithm5_2 import MetroNetworkDesign, single_source_paths
+from catchment import CatchmentCoverage
+
+
+def test_catchment_scores_lines_and_network_alike(make_lattice):
+    nodes_df, edges_df = make_lattice()
+    catchment = CatchmentCoverage(nodes_df, 400)
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2, 3, 4], catchment)
+    paths = network.algorithm_5(network.find_zone_representatives(), 'csgraph', verbose=False)
+    lines = [path for _, path in network.distinct_lines(paths).values()]
+    assert abs(network.network_coverage(paths).total - catchment.network_coverage(lines)) < 1e-9
+
+    improved = network.improve_lines(paths, max_growth=0.5)
+    improved_lines = [path for _, path in network.distinct_lines(improved).values()]
+    assert network.network_coverage(improved).total >= catchment.network_coverage(lines) - 1e-9
+    assert abs(network.network_coverage(improved).total - catchment.network_coverage(improved_lines)) < 1e-9
+    for path, coverage in improved.values():
+        assert abs(coverage - catchment.path_coverage(path)) < 1e-9
+
+
+def test_csgraph_breaks_ties_by_node_id(make_lattice):
+    # With equal coverage every monotone route between opposite corners ties
+    nodes_df, edges_df = make_lattice(4)
+    nodes_df['path_coverage'] = 1.0
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2, 3, 4])
+    graph = network.create_sparse_graph()
+    assert single_source_paths(graph, 0, [15], 'csgraph')[15] == [0, 1, 2, 3, 7, 11, 15]
+    assert single_source_paths(graph, 15, [0], 'csgraph')[0] == [15, 11, 7, 3, 2, 1, 0]
+
+
+def test_networkx_method_matches_per_pair_shortest_path(make_lattice):
+    nodes_df, edges_df = make_lattice()
+    nodes_df['path_coverage'] = 1.0 + (nodes_df['id'] % 2)
+    network = MetroNetworkDesign(nodes_df, edges_df, 0.0, [1, 2, 3, 4])
+    representatives = network.find_zone_representatives()
+    for workers in (None, 2):
+        paths = network.algorithm_5(representatives, 'networkx', workers, verbose=False)
+        for (zone_src, zone_dest), (path, _) in paths.items():
+            assert path == nx.shortest_path(network.graph, representatives[zone_src], representatives[zone_dest],
+                                            weight='weight')
+
+    # csgraph may pick another of the tied routes, never a heavier one
+    weight = lambda path: sum(network.graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+    fast = network.algorithm_5(representatives, 'csgraph', verbose=False)
+    for zone_pair, (path, _) in fast.items():
+        assert abs(weight(path) - weight(paths[zone_pair][0])) < 1e-9
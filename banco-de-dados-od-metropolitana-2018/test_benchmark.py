@@ -0,0 +1,18 @@
+import os
+
+from benchmark import benchmark_size, compare
+
+STAGES = ['zone_assignment', 'edge_building', 'coverage_normalization', 'algorithm5_init', 'algorithm5_routing',
+          'algorithm5_2_create_graph', 'algorithm5_2_routing', 'map_generation']
+
+
+def test_small_grid_keeps_the_map_in_output_dir(tmp_path, capsys):
+    results = benchmark_size(900, trace_memory=False, output_dir=str(tmp_path))
+    assert list(results['stages']) == STAGES
+    map_path = tmp_path / 'benchmark_map_900.html'
+    assert os.path.getsize(map_path) == results['stages']['map_generation']['html_bytes'] > 0
+
+    compare({'sizes': {'900': results}}, {'commit': '66d1e2b', 'sizes': {'900': results}})
+    output = capsys.readouterr().out
+    assert 'Change against 66d1e2b' in output
+    assert output.count('1.00x') == len(STAGES)
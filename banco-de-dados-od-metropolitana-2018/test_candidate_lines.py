@@ -0,0 +1,58 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from candidate_lines import candidate_paths
+
+
+def make_graph(rows, cols, weights):
+    # rows x cols lattice as an upper-triangular CSR matrix (as create_sparse_graph
+    # keeps one entry per edge before symmetric_csr) and the same networkx graph
+    ids = np.arange(rows * cols)
+    row, col = np.divmod(ids, cols)
+    right = ids[col < cols - 1]
+    down = ids[row < rows - 1]
+    sources = np.concatenate((right, down))
+    targets = np.concatenate((right + 1, down + cols))
+    weights = np.broadcast_to(weights, sources.shape).astype(float)
+    matrix = sp.csr_matrix((weights, (sources, targets)), shape=(len(ids), len(ids)))
+    graph = nx.Graph()
+    graph.add_weighted_edges_from(zip(sources.tolist(), targets.tolist(), weights.tolist()))
+    return matrix, graph
+
+
+def path_weight(graph, path):
+    return sum(graph[a][b]['weight'] for a, b in zip(path, path[1:]))
+
+
+def test_matches_shortest_simple_paths():
+    # Distinct random weights, so the k paths and their order are unique
+    matrix, graph = make_graph(5, 5, np.random.default_rng(0).uniform(1, 2, size=40))
+    pairs = [(0, 24), (4, 20), (12, 3), (7, 17)]
+    found = candidate_paths(matrix, pairs, 8)
+    for source, target in pairs:
+        expected = list(itertools.islice(nx.shortest_simple_paths(graph, source, target, weight='weight'), 8))
+        assert found[(source, target)] == expected
+
+
+def test_equal_weight_paths():
+    # Three equally short routes 0 -> 5 on a unit-weight 2 x 3 lattice
+    #   0 - 1 - 2
+    #   |   |   |
+    #   3 - 4 - 5
+    matrix, graph = make_graph(2, 3, 1.0)
+    expected = list(nx.shortest_simple_paths(graph, 0, 5, weight='weight'))
+    found = candidate_paths(matrix, [(0, 5)], len(expected))[(0, 5)]
+
+    assert [path_weight(graph, path) for path in found] == [path_weight(graph, path) for path in expected]
+    assert sorted(found) == sorted(expected)
+    # The tied paths come first, in any order among themselves
+    assert sorted(found[:3]) == [[0, 1, 2, 5], [0, 1, 4, 5], [0, 3, 4, 5]]
+
+
+def test_workers_match_one_process():
+    matrix, _ = make_graph(5, 5, np.random.default_rng(1).uniform(1, 2, size=40))
+    pairs = [(0, 24), (4, 20), (12, 3)]
+    assert candidate_paths(matrix, pairs, 5, workers=2) == candidate_paths(matrix, pairs, 5)
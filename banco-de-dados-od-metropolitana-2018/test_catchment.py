@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from catchment import CatchmentCoverage, meters_per_degree
+
+
+def make_nodes(seed=0):
+    # Jittered 400 m lattice with gaps in the ids
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(49), 7)
+    step = 400 / meters_per_degree
+    return pd.DataFrame({'id': np.arange(49) * 2 + 1,
+                         'x': (cols + rng.uniform(-0.3, 0.3, 49)) * step,
+                         'y': (rows + rng.uniform(-0.3, 0.3, 49)) * step,
+                         'path_coverage': rng.uniform(0, 3, 49)})
+
+
+def brute_force_reached(nodes_df, stops, radius_in_meters):
+    points = nodes_df.set_index('id')[['x', 'y']]
+    reached = set()
+    for stop in stops:
+        distances = np.hypot(points['x'] - points.loc[stop, 'x'], points['y'] - points.loc[stop, 'y']) * meters_per_degree
+        reached |= set(points.index[distances <= radius_in_meters])
+    return reached
+
+
+def test_coverage_matches_brute_force():
+    nodes_df = make_nodes()
+    coverage = nodes_df.set_index('id')['path_coverage']
+    catchment = CatchmentCoverage(nodes_df, 500)
+    paths = [[1, 3, 5, 19], [49, 51], [97], [1, 3, 5, 19, 33, 47]]
+    expected = [brute_force_reached(nodes_df, path, 500) for path in paths]
+    for path, reached, value in zip(paths, expected, catchment.paths_coverage(paths)):
+        assert abs(value - coverage[list(reached)].sum()) < 1e-9
+        assert abs(catchment.path_coverage(path) - value) < 1e-9
+
+    union = set().union(*expected)
+    assert abs(catchment.network_coverage(paths) - coverage[list(union)].sum()) < 1e-9
+    assert catchment.covered_nodes(paths).tolist() == sorted(union)
+
+
+def test_saved_matrix_scores_the_same(tmp_path):
+    nodes_df = make_nodes()
+    catchment = CatchmentCoverage(nodes_df, 500)
+    catchment.save(str(tmp_path / 'catchment.npz'))
+    loaded = CatchmentCoverage.load(nodes_df, str(tmp_path / 'catchment.npz'), 500)
+    paths = [[1, 3, 5, 19], [49, 51]]
+    assert loaded.paths_coverage(paths).tolist() == catchment.paths_coverage(paths).tolist()
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from converter_planilha import agregar_planilha, processar_planilha
+
+
+def write_survey(path, rows=500, seed=0):
+    # Synthetic survey with the columns of the OD spreadsheet plus one it ignores
+    rng = np.random.default_rng(seed)
+    origins = ['RESIDENCIA', 'OUTRO', 'ESCOLA']
+    pd.DataFrame({
+        'ID': np.arange(rows),
+        'Zona Residencia': rng.integers(1, 40, rows),
+        'Zona Trabalho': rng.integers(1, 40, rows),
+        'Zona Educacao': rng.integers(1, 40, rows),
+        'FREQUENCIA TRABALHO': rng.integers(0, 6, rows),
+        'FREQUENCIA AULA': rng.integers(0, 6, rows),
+        'ORIGEM TRABALHO': rng.choice(origins, rows),
+        'ORIGEM AULA': rng.choice(origins, rows),
+    }).to_csv(path, sep=';', index=False)
+
+
+def original_loop(path):
+    # The row loop the chunked aggregation replaced
+    df = pd.read_csv(path, sep=';')
+    result_rows = {}
+    for row in df.to_dict(orient="records"):
+        contributions = [(row['Zona Educacao'], row['FREQUENCIA AULA']),
+                         (row['Zona Trabalho'], row['FREQUENCIA TRABALHO'])]
+        if row['ORIGEM TRABALHO'] == 'RESIDENCIA':
+            contributions.append((row['Zona Residencia'], row['FREQUENCIA TRABALHO']))
+        if row['ORIGEM AULA'] == 'RESIDENCIA':
+            contributions.append((row['Zona Residencia'], row['FREQUENCIA AULA']))
+        for zone, frequency in contributions:
+            result_rows[zone] = int(frequency) + int(result_rows.get(zone, 0))
+    return pd.DataFrame([{'ZONA': key, 'FREQUENCIA': value} for key, value in result_rows.items()])
+
+
+def test_chunked_aggregation_matches_the_row_loop(tmp_path):
+    path = str(tmp_path / 'pesquisa.csv')
+    write_survey(path)
+    expected = original_loop(path).to_csv(index=False)
+    # Blocks that split the survey unevenly, and a single block
+    for tamanho_bloco in (7, 64, 10_000):
+        assert agregar_planilha(path, tamanho_bloco).to_csv(index=False) == expected
+        assert processar_planilha(path, tamanho_bloco)[0].to_csv(index=False) == expected
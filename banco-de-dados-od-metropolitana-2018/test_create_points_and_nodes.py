@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from shapely.geometry import Polygon, box
+
+from create_points_and_nodes import assign_zones, build_edges, build_grid_tiled, grid_coordinates
+
+# Bounding box of the Recife zones (zonas_com_frequencia.geojson)
+RECIFE_BOUNDS = (-35.26237522106447, -8.155636321722703, -34.85091768264767, -7.749049394713373)
+
+
+@pytest.mark.parametrize('spacing', [300, 400, 500, 600])
+def test_build_edges_links_every_lattice_neighbor(spacing):
+    # The np.arange steps of the 500 m and 600 m lattices exceed the spacing by a
+    # rounding error; without the slack half of their edges were dropped
+    grid_x, grid_y, distance_in_degrees = grid_coordinates(RECIFE_BOUNDS, spacing)
+    num_x = len(np.unique(grid_x))
+    num_y = len(grid_x) // num_x
+    points_df = pd.DataFrame({'x': grid_x, 'y': grid_y})
+    edges_df = build_edges(points_df, distance_in_degrees)
+    assert len(edges_df) == num_x * (num_y - 1) + num_y * (num_x - 1)
+
+
+def make_zones():
+    # An L-shaped zone, a triangle sharing its border and a separate box, leaving
+    # lattice points outside every zone
+    geometries = [Polygon([(0, 0), (0.06, 0), (0.06, 0.02), (0.02, 0.02), (0.02, 0.07), (0, 0.07)]),
+                  Polygon([(0.02, 0.02), (0.09, 0.02), (0.02, 0.09)]),
+                  box(0.07, 0.06, 0.1, 0.1)]
+    properties = [{'ZONA': str(i + 1), 'FREQUENCIA': 100 * (i + 1)} for i in range(3)]
+    return np.array(geometries, dtype=object), properties
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_tiled_build_matches_the_single_process_build(workers):
+    geometries, properties = make_zones()
+    bounds = tuple(shapely.total_bounds(geometries))
+    grid_x, grid_y, distance_in_degrees = grid_coordinates(bounds, 400)
+    points_df = assign_zones(geometries, properties, grid_x, grid_y)
+    edges_df = build_edges(points_df, distance_in_degrees)
+
+    tiled_points, tiled_edges = build_grid_tiled(geometries, properties, bounds, 400, tile_size=7, workers=workers)
+    pd.testing.assert_frame_equal(tiled_points, points_df)
+    expected_edges = sorted(map(tuple, np.sort(edges_df.to_numpy(), axis=1).tolist()))
+    assert list(map(tuple, tiled_edges.to_numpy().tolist())) == expected_edges
+    assert len(expected_edges) > 0
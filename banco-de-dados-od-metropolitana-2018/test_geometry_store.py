@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+import shapely
+from shapely.geometry import Point, box, mapping
+
+from geometry_store import ZoneStore, load_zone_store
+from instrumentation import instrumentation
+
+
+def write_zones(path, radius=0.01):
+    # Two squares and a densely sampled circle, which simplification shortens
+    zones = [box(0, 0, 0.02, 0.02), box(0.02, 0, 0.04, 0.02), Point(0.01, 0.04).buffer(radius, 64)]
+    features = [{'type': 'Feature', 'properties': {'CODIGOZONA': str(i + 1), 'ZONA': str(i + 1)},
+                 'geometry': mapping(zone)} for i, zone in enumerate(zones)]
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+    return zones
+
+
+def builds_and_hits():
+    return (instrumentation.stages.get('geometry_store.build', {}).get('calls', 0),
+            instrumentation.counters['geometry_cache_hits'])
+
+
+def test_second_load_hits_the_cache(tmp_path):
+    instrumentation.reset()
+    zones = write_zones(str(tmp_path / 'zones.geojson'))
+    first = load_zone_store(str(tmp_path / 'zones.geojson'))
+    assert builds_and_hits() == (1, 0)
+    second = load_zone_store(str(tmp_path / 'zones.geojson'))
+    assert builds_and_hits() == (1, 1)
+
+    assert shapely.equals_exact(second.geometries, np.array(zones, dtype=object), tolerance=0).all()
+    assert second.properties == first.properties
+    assert second.bounds.tolist() == first.bounds.tolist()
+    assert second.total_bounds == first.total_bounds
+
+
+def test_changed_file_gets_a_new_entry(tmp_path):
+    instrumentation.reset()
+    geojson_path = str(tmp_path / 'zones.geojson')
+    write_zones(geojson_path)
+    old_directory = ZoneStore.entry_directory(geojson_path)[2]
+    load_zone_store(geojson_path)
+
+    write_zones(geojson_path, radius=0.015)
+    new_directory = ZoneStore.entry_directory(geojson_path)[2]
+    assert new_directory != old_directory
+    store = load_zone_store(geojson_path)
+    assert builds_and_hits() == (2, 0)
+    assert store.directory == new_directory
+    assert not os.path.exists(old_directory)
+    assert abs(store.geometries[2].bounds[2] - 0.025) < 1e-9
+
+
+def test_simplified_copy_round_trips(tmp_path):
+    geojson_path = str(tmp_path / 'zones.geojson')
+    write_zones(geojson_path)
+    simplified = load_zone_store(geojson_path).simplified(0.001)
+    assert shapely.get_num_coordinates(simplified[2]) < shapely.get_num_coordinates(
+        load_zone_store(geojson_path).geometries[2])
+
+    # A fresh store reads the simplified copy written by the first one
+    store = load_zone_store(geojson_path)
+    assert os.path.exists(os.path.join(store.directory, 'simplified_0.001.wkb'))
+    assert shapely.equals_exact(store.simplified(0.001), simplified, tolerance=0).all()
+    assert store.geodataframe(0.001).geometry.tolist() == list(simplified)
@@ -0,0 +1,78 @@
+import csv
+import json
+import time
+
+from instrumentation import Instrumentation
+
+
+def test_stages_aggregate_calls_and_time():
+    instrumentation = Instrumentation()
+
+    @instrumentation.timed('work')
+    def work(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    assert work(0.01) == 0.01
+    work(0.02)
+    with instrumentation.stage('outer'):
+        with instrumentation.stage('inner'):
+            time.sleep(0.01)
+
+    assert instrumentation.stages['work']['calls'] == 2
+    assert instrumentation.stages['work']['seconds'] >= 0.03
+    assert instrumentation.stages['outer']['seconds'] >= instrumentation.stages['inner']['seconds'] >= 0.01
+    # Peak memory is only recorded when tracing is on
+    assert instrumentation.stages['work']['peak_mb'] is None
+
+
+def test_stage_records_a_failing_call():
+    instrumentation = Instrumentation()
+    try:
+        with instrumentation.stage('failing'):
+            raise ValueError
+    except ValueError:
+        pass
+    assert instrumentation.stages['failing']['calls'] == 1
+
+
+def test_counts_and_reset():
+    instrumentation = Instrumentation()
+    instrumentation.count('dijkstra_calls')
+    instrumentation.count('dijkstra_calls', 4)
+    instrumentation.count('dataframe_lookups', 2)
+    assert instrumentation.report()['counters'] == {'dijkstra_calls': 5, 'dataframe_lookups': 2}
+    instrumentation.reset()
+    assert instrumentation.report() == {'stages': {}, 'counters': {}}
+
+
+def test_csv_and_json_reports(tmp_path):
+    instrumentation = Instrumentation()
+    with instrumentation.stage('build'):
+        pass
+    instrumentation.count('edges_relaxed', 12)
+
+    instrumentation.write_report(str(tmp_path / 'report.csv'))
+    with open(tmp_path / 'report.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['kind'], row['name']) for row in rows] == [('stage', 'build'), ('counter', 'edges_relaxed')]
+    assert rows[0]['calls'] == '1' and float(rows[0]['seconds']) >= 0
+    assert rows[1]['value'] == '12'
+
+    instrumentation.write_report(str(tmp_path / 'report.json'))
+    with open(tmp_path / 'report.json') as f:
+        assert json.load(f) == json.loads(json.dumps(instrumentation.report()))
+
+
+def test_zone_lookups_use_the_documented_counter():
+    import pandas as pd
+
+    from algorithm5_2 import MetroNetworkDesign
+    from instrumentation import instrumentation
+
+    nodes_df = pd.DataFrame({'id': [0, 1, 2], 'x': [0.0, 1.0, 2.0], 'y': [0.0, 0.0, 0.0],
+                             'path_coverage': [1.0, 2.0, 3.0], 'zone': [1, 1, 2]})
+    network = MetroNetworkDesign(nodes_df, pd.DataFrame({'source': [0, 1], 'target': [1, 2]}), 0.0, [1, 2])
+    instrumentation.reset()
+    network.find_zone_representatives()
+    assert instrumentation.counters['dataframe_lookups'] == 2
@@ -0,0 +1,47 @@
+import numpy as np
+
+from catchment import CatchmentCoverage
+from network_coverage import NetworkCoverage, improve_lines, neighbor_sets
+
+
+def check_moves(network, covered):
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        index = int(rng.integers(len(network.lines)))
+        line = network.lines[index]
+        position = int(rng.integers(1, len(line) - 1))
+        node = int(rng.integers(len(network.coverage)))
+        expected = network.swap_delta(index, position, node)
+        before = network.total
+        assert abs(network.swap(index, position, node) - expected) < 1e-9
+        assert abs(network.total - before - expected) < 1e-9
+        assert abs(network.total - network.recompute()) < 1e-9
+        assert abs(network.total - covered(network.lines)) < 1e-9
+
+
+def test_node_union_deltas_are_exact(make_lattice):
+    nodes_df, _ = make_lattice()
+    coverage = nodes_df['path_coverage'].to_numpy()
+    network = NetworkCoverage(coverage, [[0, 1, 2, 10, 18], [2, 3, 11, 19, 27]])
+    check_moves(network, lambda lines: coverage[np.unique(np.concatenate(lines))].sum())
+
+
+def test_catchment_union_matches_catchment_coverage(make_lattice):
+    nodes_df, _ = make_lattice()
+    catchment = CatchmentCoverage(nodes_df, 400)
+    network = NetworkCoverage(catchment.coverage, [[0, 1, 2, 10, 18], [2, 3, 11, 19, 27]], catchment.matrix)
+    assert abs(network.total - catchment.network_coverage(network.lines)) < 1e-9
+    check_moves(network, catchment.network_coverage)
+
+
+def test_local_search_improves_the_catchment_union(make_lattice):
+    nodes_df, edges_df = make_lattice()
+    catchment = CatchmentCoverage(nodes_df, 400)
+    network = NetworkCoverage(catchment.coverage, [[0, 1, 2, 3, 4], [0, 8, 16, 24, 32]], catchment.matrix)
+    before = network.total
+    gain = improve_lines(network, neighbor_sets(edges_df['source'].to_numpy(), edges_df['target'].to_numpy(), len(nodes_df)), max_growth=0.5)
+    assert gain > 0
+    assert abs(network.total - before - gain) < 1e-9
+    assert abs(network.total - catchment.network_coverage(network.lines)) < 1e-9
+    assert [line[0] for line in network.lines] == [0, 0]
+    assert [line[-1] for line in network.lines] == [4, 32]
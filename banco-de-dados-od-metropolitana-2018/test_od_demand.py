@@ -0,0 +1,64 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from converter_planilha import carregar_matriz_od, processar_planilha, salvar_matriz_od
+from od_demand import ServedDemand
+
+
+def make_nodes():
+    # Two nodes per zone, zone 9 has no trips
+    return pd.DataFrame({'id': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+                         'zone': [1, 1, 2, 2, 3, 3, 4, 4, 9, 9]})
+
+
+def brute_force_served(od, lines, include_intrazonal=False):
+    # OD pairs (as zone positions) with a line touching both zones
+    zone_of = {0: 0, 1: 0, 2: 1, 3: 1, 4: 2, 5: 2, 6: 3, 7: 3}
+    pairs = set()
+    for line in lines:
+        zones = {zone_of[node] for node in line if node in zone_of}
+        pairs |= {(o, d) for o, d in itertools.product(zones, zones) if include_intrazonal or o != d}
+    return sum(od[o, d] for o, d in pairs)
+
+
+def test_served_demand_matches_brute_force():
+    od = np.arange(16, dtype=float).reshape(4, 4)
+    lines = [[0, 2, 3], [4, 8, 6], [9], [1, 7, 5, 3]]
+    for include_intrazonal in (False, True):
+        demand = ServedDemand(make_nodes(), ['1', '2', '3', '4'], od, include_intrazonal)
+        served = demand.paths_served(lines)
+        for line, value in zip(lines, served):
+            assert value == brute_force_served(od, [line], include_intrazonal)
+            assert demand.path_served(line) == value
+        assert demand.network_served(lines) == brute_force_served(od, lines, include_intrazonal)
+        assert demand.network_served(lines[:2]) == brute_force_served(od, lines[:2], include_intrazonal)
+
+
+def test_od_matrix_from_survey(tmp_path):
+    survey = pd.DataFrame({
+        'Zona Residencia': ['1', '1', '2', '3', '2'],
+        'Zona Trabalho': ['2', '3', '', '1', '1'],
+        'Zona Educacao': ['3', '', '1', '3', '4'],
+        'FREQUENCIA TRABALHO': [5, 2, 4, 1, 3],
+        'FREQUENCIA AULA': [1, 0, 2, 6, 7],
+        'ORIGEM TRABALHO': ['RESIDENCIA', 'RESIDENCIA', 'RESIDENCIA', 'OUTRO', 'RESIDENCIA'],
+        'ORIGEM AULA': ['RESIDENCIA', 'OUTRO', 'RESIDENCIA', 'RESIDENCIA', 'OUTRO'],
+    })
+    survey.to_csv(tmp_path / 'pesquisa.csv', sep=';', index=False)
+    _, (zones, matrix) = processar_planilha(str(tmp_path / 'pesquisa.csv'), tamanho_bloco=2)
+
+    # residence -> work and residence -> education trips; rows without a zone are skipped
+    expected = {('1', '2'): 5, ('1', '3'): 1 + 2, ('2', '1'): 2 + 3, ('3', '3'): 6}
+    assert zones.tolist() == ['1', '2', '3']
+    found = {(zones[o], zones[d]): v for (o, d), v in matrix.todok().items()}
+    assert found == expected
+
+    salvar_matriz_od(str(tmp_path / 'matriz_od.npz'), zones, matrix)
+    loaded_zones, loaded = carregar_matriz_od(str(tmp_path / 'matriz_od.npz'))
+    assert loaded_zones.tolist() == zones.tolist()
+    assert (loaded != matrix).nnz == 0
+
+    demand = ServedDemand.load(make_nodes(), str(tmp_path / 'matriz_od.npz'))
+    assert demand.network_served([[0, 2, 4]]) == 5 + 3 + 5
@@ -0,0 +1,102 @@
+import json
+
+import pandas as pd
+import shapely
+
+from create_points_and_nodes import build_adaptive_grid, load_zones
+from pipeline import Pipeline
+from snapshot import load_snapshot
+
+# 3 x 3 square zones numbered row by row, 0.02 degrees wide (about 5 x 5 grid points
+# each at 400 m). The target zones are the corners.
+ZONE_SIZE = 0.02
+TARGET_ZONES = [1, 3, 7, 9]
+
+
+def write_zones(path):
+    features = []
+    for zone in range(1, 10):
+        row, col = divmod(zone - 1, 3)
+        x0, y0 = -35.0 + col * ZONE_SIZE, -8.0 + row * ZONE_SIZE
+        ring = [[x0, y0], [x0 + ZONE_SIZE, y0], [x0 + ZONE_SIZE, y0 + ZONE_SIZE], [x0, y0 + ZONE_SIZE], [x0, y0]]
+        features.append({'type': 'Feature', 'properties': {'ZONA': zone, 'FREQUENCIA': 1},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def write_demand(path, frequencies):
+    pd.DataFrame({'ZONA': list(frequencies), 'FREQUENCIA': list(frequencies.values())}).to_csv(path, index=False)
+
+
+def run(tmp_path, name, frequencies, workdir):
+    demand = str(tmp_path / f'{name}.csv')
+    write_demand(demand, frequencies)
+    pipeline = Pipeline(str(workdir), str(tmp_path / 'zones.geojson'), survey_csv=None, demand_csv=demand,
+                        target_zones=TARGET_ZONES)
+    return pipeline.run()
+
+
+def assert_same_paths(incremental, full):
+    assert incremental.keys() == full.keys()
+    for pair in full:
+        assert incremental[pair][0] == full[pair][0]
+        assert abs(incremental[pair][1] - full[pair][1]) < 1e-9
+
+
+def test_incremental_solve_matches_full_solve_when_a_zone_gains_demand(tmp_path):
+    write_zones(tmp_path / 'zones.geojson')
+    # The middle zone starts with little demand, so the routes go around it
+    before = {zone: 1000 for zone in range(1, 10)}
+    before[5] = 1
+    after = dict(before)
+    after[5] = 100000
+
+    first = run(tmp_path, 'before', before, tmp_path / 'incremental')
+    incremental = run(tmp_path, 'after', after, tmp_path / 'incremental')
+    full = run(tmp_path, 'after', after, tmp_path / 'full')
+    assert_same_paths(incremental, full)
+    assert incremental != first
+
+
+def test_incremental_solve_matches_full_solve_when_a_zone_loses_demand(tmp_path):
+    write_zones(tmp_path / 'zones.geojson')
+    before = {zone: 1000 for zone in range(1, 10)}
+    before[5] = 100000
+    after = dict(before)
+    after[5] = 1
+
+    run(tmp_path, 'before', before, tmp_path / 'incremental')
+    incremental = run(tmp_path, 'after', after, tmp_path / 'incremental')
+    full = run(tmp_path, 'after', after, tmp_path / 'full')
+    assert_same_paths(incremental, full)
+
+
+def test_unchanged_demand_skips_every_stage(tmp_path, capsys):
+    write_zones(tmp_path / 'zones.geojson')
+    frequencies = {zone: 1000 for zone in range(1, 10)}
+    first = run(tmp_path, 'demand', frequencies, tmp_path / 'work')
+    capsys.readouterr()
+    again = run(tmp_path, 'demand', frequencies, tmp_path / 'work')
+    output = capsys.readouterr().out
+    assert "grid: up to date" in output
+    assert "coverage: up to date" in output
+    assert "solve: up to date" in output
+    assert_same_paths(again, first)
+
+
+def test_adaptive_grid_matches_the_standalone_script(tmp_path):
+    write_zones(tmp_path / 'zones.geojson')
+    demand = str(tmp_path / 'demand.csv')
+    write_demand(demand, {zone: 1000 * zone for zone in range(1, 10)})
+    pipeline = Pipeline(str(tmp_path / 'work'), str(tmp_path / 'zones.geojson'), survey_csv=None,
+                        demand_csv=demand, target_zones=TARGET_ZONES, adaptive=True)
+    pipeline.run()
+
+    # Same defaults as create_points_and_nodes.py --adaptive
+    geometries, properties = load_zones(str(tmp_path / 'zones.geojson'))
+    points_df, edges_df = build_adaptive_grid(geometries, properties, shapely.total_bounds(geometries))
+    grid = load_snapshot(pipeline.grid_dir)
+    assert grid['node_x'].tolist() == points_df['x'].tolist()
+    assert grid['node_y'].tolist() == points_df['y'].tolist()
+    assert grid.edges_df()['source'].tolist() == edges_df['source'].tolist()
@@ -0,0 +1,55 @@
+import folium
+import numpy as np
+import pandas as pd
+from folium import plugins
+
+from render import CLUSTER_THRESHOLD, NodeIndex, generate_network_map, nodes_layer, normalize_paths, path_locations
+
+
+def make_nodes(count):
+    # Nodes on a straight west-east line with gaps in the ids
+    ids = np.arange(count) * 3 + 2
+    return pd.DataFrame({'id': ids, 'x': -35.0 + np.arange(count) * 0.001, 'y': np.full(count, -8.0),
+                         'path_coverage': np.arange(count) / 10, 'zone': ids % 7})
+
+
+def test_nodes_layer_switches_to_a_cluster_above_the_threshold():
+    nodes_df = make_nodes(CLUSTER_THRESHOLD + 1)
+    index = NodeIndex(nodes_df)
+
+    layer = nodes_layer(index, nodes_df['id'][:CLUSTER_THRESHOLD])
+    assert isinstance(layer, folium.GeoJson)
+    features = layer.data['features']
+    assert len(features) == CLUSTER_THRESHOLD
+    assert features[4]['geometry']['coordinates'] == [-35.0 + 4 * 0.001, -8.0]
+    assert features[4]['properties'] == {'id': 14, 'zone': 0, 'path_coverage': 0.4}
+
+    layer = nodes_layer(index, nodes_df['id'])
+    assert isinstance(layer, plugins.FastMarkerCluster)
+    assert len(layer.data) == CLUSTER_THRESHOLD + 1
+
+    assert isinstance(nodes_layer(index, nodes_df['id'][:10], cluster_threshold=9), plugins.FastMarkerCluster)
+
+
+def test_normalize_paths_labels_both_result_shapes():
+    paths = {(59, 173): ([2, 5], 1.5), (59, 24): ([], 0)}
+    assert normalize_paths(paths) == [("Zone 59 → Zone 173", [2, 5], 1.5), ("Zone 59 → Zone 24", [], 0)]
+    assert normalize_paths([([2, 5], 1.5), ([8], 0.3)]) == [("Line 1", [2, 5], 1.5), ("Line 2", [8], 0.3)]
+
+
+def test_path_locations_round_and_simplify():
+    index = NodeIndex(make_nodes(10))
+    path = [2, 5, 8, 11]
+    assert path_locations(index, path) == [[-8.0, -35.0 + i * 0.001] for i in range(4)]
+    assert path_locations(index, path, round_digits=2) == [[-8.0, -35.0]] * 4
+    # Collinear points collapse to the two ends
+    assert path_locations(index, path, simplify_tolerance=1e-6) == [[-8.0, -35.0], [-8.0, -35.0 + 3 * 0.001]]
+
+
+def test_map_has_one_line_per_non_empty_path(tmp_path):
+    nodes_df = make_nodes(10)
+    output = str(tmp_path / 'map.html')
+    generate_network_map(nodes_df, {(1, 2): ([2, 5, 8], 1.0), (1, 3): ([], 0)}, output)
+    html = open(output).read()
+    assert html.count('L.polyline(') == 1
+    assert 'Zone 1 → Zone 2 | Coverage: 1.0000' in html
@@ -0,0 +1,60 @@
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from routing_index import RoutingIndex
+
+
+def make_graph(size=6, seed=0):
+    # Weighted lattice with one unusable (infinite) edge, plus a separate pair of
+    # nodes and an isolated node after it
+    rng = np.random.default_rng(seed)
+    ids = np.arange(size * size)
+    rows, cols = np.divmod(ids, size)
+    right = ids[cols < size - 1]
+    down = ids[rows < size - 1]
+    sources = np.concatenate((right, down, [size * size]))
+    targets = np.concatenate((right + 1, down + size, [size * size + 1]))
+    weights = rng.uniform(0.5, 2.0, size=len(sources))
+    weights[3] = np.inf
+    num_ids = size * size + 3
+    matrix = sp.csr_matrix((np.concatenate((weights, weights)),
+                            (np.concatenate((sources, targets)), np.concatenate((targets, sources)))),
+                           shape=(num_ids, num_ids))
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_ids))
+    graph.add_weighted_edges_from((s, t, w) for s, t, w in zip(sources.tolist(), targets.tolist(), weights.tolist())
+                                  if np.isfinite(w))
+    return matrix, graph
+
+
+def check_queries(index, graph):
+    weight = lambda path: sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+    for source in graph:
+        lengths = nx.single_source_dijkstra_path_length(graph, source)
+        for target in graph:
+            path, distance = index.query(source, target)
+            if target not in lengths:
+                assert path is None and distance == np.inf
+                continue
+            assert path[0] == source and path[-1] == target
+            assert abs(distance - lengths[target]) < 1e-9
+            assert abs(weight(path) - lengths[target]) < 1e-9
+
+
+def test_hub_and_landmark_queries_are_shortest():
+    matrix, graph = make_graph()
+    index = RoutingIndex.build(matrix, hubs=[0, 20], num_landmarks=4)
+    check_queries(index, graph)
+
+
+def test_saved_index_answers_the_same_and_checks_the_graph(tmp_path):
+    matrix, graph = make_graph()
+    RoutingIndex.build(matrix, hubs=[0, 20], num_landmarks=4).save(str(tmp_path / 'index'))
+    index = RoutingIndex.load(str(tmp_path / 'index'))
+    assert index.matches(matrix)
+    check_queries(index, graph)
+
+    other = matrix.copy()
+    other.data = other.data * 2
+    assert not index.matches(other)
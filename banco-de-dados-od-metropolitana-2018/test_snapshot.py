@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from readcsv import read_grid
+from snapshot import load_snapshot, save_snapshot, snapshot_is_current
+
+
+def make_grid():
+    nodes_df = pd.DataFrame({
+        'id': [0, 1, 2, 3],
+        'x': [-35.262375221064474, -35.25877807611327, -35.262375221064474, -35.25877807611327],
+        'y': [-8.15203917622148, -8.15203917622148, -8.148442031270256, -8.148442031270256],
+        'path_coverage': [0.5, 1.25, 0.0, 3.0],
+        'zone': [59, 59, 173, 24],
+    })
+    # Not grouped by source, as build_edges writes them
+    edges_df = pd.DataFrame({'source': [2, 0, 1, 0, 2], 'target': [3, 1, 3, 2, 0]})
+    return nodes_df, edges_df
+
+
+def write_grid_csv(path, nodes_df, edges_df):
+    with open(path, 'w') as f:
+        f.write('# Points\n')
+        nodes_df.to_csv(f, index=False)
+        f.write('\n# Edges\n')
+        edges_df.to_csv(f, index=False)
+
+
+def test_round_trip_keeps_coordinates_and_edge_order(tmp_path):
+    nodes_df, edges_df = make_grid()
+    save_snapshot(str(tmp_path / 'snapshot'), nodes_df, edges_df)
+    snapshot = load_snapshot(str(tmp_path / 'snapshot'))
+
+    loaded_nodes = snapshot.nodes_df()
+    assert loaded_nodes['x'].tolist() == nodes_df['x'].tolist()
+    assert loaded_nodes['y'].tolist() == nodes_df['y'].tolist()
+    assert loaded_nodes['path_coverage'].tolist() == nodes_df['path_coverage'].tolist()
+    assert loaded_nodes['zone'].tolist() == nodes_df['zone'].tolist()
+
+    loaded_edges = snapshot.edges_df()
+    assert loaded_edges['source'].tolist() == edges_df['source'].tolist()
+    assert loaded_edges['target'].tolist() == edges_df['target'].tolist()
+
+
+def test_csr_matrix_matches_edges(tmp_path):
+    nodes_df, edges_df = make_grid()
+    save_snapshot(str(tmp_path / 'snapshot'), nodes_df, edges_df, weights=np.arange(5.0))
+    matrix = load_snapshot(str(tmp_path / 'snapshot')).csr_matrix()
+    for (source, target), weight in zip(edges_df.to_numpy(), np.arange(5.0)):
+        assert matrix[source, target] == weight
+    assert matrix.nnz == len(edges_df)
+
+
+def test_paths_round_trip(tmp_path):
+    nodes_df, edges_df = make_grid()
+    paths = {(59, 173): ([0, 2], 0.5), (59, 24): ([0, 1, 3], 4.75)}
+    save_snapshot(str(tmp_path / 'snapshot'), nodes_df, edges_df, paths=paths)
+    assert load_snapshot(str(tmp_path / 'snapshot')).paths() == paths
+
+
+def test_read_grid_ignores_a_stale_snapshot(tmp_path):
+    nodes_df, edges_df = make_grid()
+    csv_path = str(tmp_path / 'grid.csv')
+    snapshot_path = str(tmp_path / 'grid_snapshot')
+    write_grid_csv(csv_path, nodes_df, edges_df)
+    save_snapshot(snapshot_path, nodes_df, edges_df)
+    assert snapshot_is_current(snapshot_path, csv_path)
+
+    # The CSV is rewritten after the snapshot with other coverage values
+    nodes_df['path_coverage'] = [9.0, 9.0, 9.0, 9.0]
+    write_grid_csv(csv_path, nodes_df, edges_df)
+    snapshot_time = os.path.getmtime(os.path.join(snapshot_path, 'meta.json'))
+    os.utime(csv_path, (snapshot_time + 10, snapshot_time + 10))
+    assert not snapshot_is_current(snapshot_path, csv_path)
+
+    points_df, _ = read_grid(csv_path, snapshot_path)
+    assert points_df['path_coverage'].tolist() == [9.0, 9.0, 9.0, 9.0]
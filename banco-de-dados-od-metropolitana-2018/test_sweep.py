@@ -0,0 +1,42 @@
+import numpy as np
+
+import algorithm5
+import sweep
+
+# algorithm5's fixed zone pairs use these zones
+ZONES = (59, 173, 24, 215)
+
+
+def test_worker_frames_share_memory(make_lattice):
+    nodes_df, edges_df = make_lattice(6, zones=ZONES)
+    graph = sweep.SharedGraph(nodes_df, edges_df)
+    try:
+        sweep.init_sweep_worker(graph.specs, graph.zone_categories)
+        for name in sweep.NODE_COLUMNS:
+            assert np.shares_memory(sweep._sweep_nodes[name].to_numpy(), sweep._sweep_columns[name])
+        for name in sweep.EDGE_COLUMNS:
+            assert np.shares_memory(sweep._sweep_edges[name].to_numpy(), sweep._sweep_columns[name])
+        assert sweep._sweep_nodes['zone'].tolist() == nodes_df['zone'].tolist()
+    finally:
+        sweep._sweep_nodes = sweep._sweep_edges = None
+        sweep._sweep_columns.clear()
+        for block in sweep._sweep_blocks:
+            block.close()
+        sweep._sweep_blocks.clear()
+        graph.close()
+
+
+def test_sweep_matches_direct_runs(make_lattice):
+    nodes_df, edges_df = make_lattice(6, zones=ZONES)
+    nodes_df['path_coverage'] = (nodes_df['id'] * 7 % 11) + 0.5
+    scenarios = sweep.make_scenarios(['algorithm5'], [0.0, 5.0], [[59, 215]])
+    results = sweep.run_sweep(nodes_df, edges_df, scenarios, workers=2)
+
+    for scenario in scenarios:
+        network = algorithm5.MetroNetworkDesign(nodes_df, edges_df, scenario['coverage_threshold'], [59, 215])
+        expected = network.algorithm_5()
+        rows = results[results['scenario'] == scenario['scenario']].dropna(subset=['line'])
+        assert len(expected) == 5
+        assert rows['path'].tolist() == [path for path, _ in expected.values()]
+        # The zone columns are the requested pair even where the greedy walk stops early
+        assert list(zip(rows['zone_src'], rows['zone_dest'])) == list(expected)
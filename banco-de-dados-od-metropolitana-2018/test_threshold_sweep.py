@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from threshold_sweep import threshold_sweep
+
+
+def prune(nodes_df, edges_df, threshold, target_zones):
+    # Same pruning as algorithm5.MetroNetworkDesign
+    nodes = nodes_df[(nodes_df['path_coverage'] > threshold) | nodes_df['zone'].isin(target_zones)]
+    edges = edges_df[edges_df['source'].isin(nodes['id']) & edges_df['target'].isin(nodes['id'])]
+    return nodes, edges
+
+
+def targets_connected(nodes, edges, target_zones):
+    position = pd.Series(np.arange(len(nodes)), index=nodes['id'].to_numpy())
+    matrix = sp.coo_matrix((np.ones(len(edges)), (position[edges['source']].to_numpy(),
+                                                   position[edges['target']].to_numpy())),
+                           shape=(len(nodes), len(nodes)))
+    _, labels = connected_components(matrix, directed=False)
+    components = [set(labels[(nodes['zone'] == zone).to_numpy()]) for zone in target_zones]
+    return bool(set.intersection(*components))
+
+
+def test_zero_coverage_connector_is_kept():
+    # Zones 1 and 2 are only connected through node 1, which has zero coverage
+    nodes_df = pd.DataFrame({'id': [0, 1, 2, 3], 'path_coverage': [1.0, 0.0, 1.0, 5.0], 'zone': [1, 3, 2, 3]})
+    edges_df = pd.DataFrame({'source': [0, 1, 2], 'target': [1, 2, 3]})
+    table, recommended = threshold_sweep(nodes_df, edges_df, [1, 2], [0.0, 1.0])
+
+    assert table['targets_connected'].tolist() == [False, False]
+    assert recommended < 0.0
+    assert targets_connected(*prune(nodes_df, edges_df, recommended, [1, 2]), [1, 2])
+
+
+def test_target_zones_already_connected():
+    nodes_df = pd.DataFrame({'id': [0, 1, 2], 'path_coverage': [1.0, 1.0, 3.0], 'zone': [1, 2, 3]})
+    edges_df = pd.DataFrame({'source': [0], 'target': [1]})
+    table, recommended = threshold_sweep(nodes_df, edges_df, [1, 2], [0.5])
+    assert table['targets_connected'].tolist() == [True]
+    assert recommended == 3.0
+
+
+def test_disconnected_target_zones():
+    nodes_df = pd.DataFrame({'id': [0, 1, 2], 'path_coverage': [1.0, 1.0, 3.0], 'zone': [1, 2, 3]})
+    edges_df = pd.DataFrame({'source': [0], 'target': [2]})
+    _, recommended = threshold_sweep(nodes_df, edges_df, [1, 2], [0.5])
+    assert recommended is None
+
+
+def test_matches_pruning_every_threshold():
+    rng = np.random.default_rng(0)
+    num_nodes = 300
+    nodes_df = pd.DataFrame({'id': np.arange(num_nodes),
+                             'path_coverage': np.round(rng.exponential(1.0, num_nodes), 1),
+                             'zone': rng.integers(0, 40, num_nodes)})
+    sources = rng.integers(0, num_nodes, 450)
+    targets = rng.integers(0, num_nodes, 450)
+    edges_df = pd.DataFrame({'source': sources, 'target': targets})
+    target_zones = [3, 7, 11]
+    thresholds = np.unique(nodes_df['path_coverage'])
+    table, recommended = threshold_sweep(nodes_df, edges_df, target_zones, thresholds)
+
+    for row in table.itertuples():
+        nodes, edges = prune(nodes_df, edges_df, row.coverage_threshold, target_zones)
+        assert row.nodes == len(nodes)
+        assert row.edges == len(edges)
+        assert row.targets_connected == targets_connected(nodes, edges, target_zones)
+        position = pd.Series(np.arange(len(nodes)), index=nodes['id'].to_numpy())
+        matrix = sp.coo_matrix((np.ones(len(edges)), (position[edges['source']].to_numpy(),
+                                                       position[edges['target']].to_numpy())),
+                               shape=(len(nodes), len(nodes)))
+        _, labels = connected_components(matrix, directed=False)
+        assert row.largest_component == np.bincount(labels).max()
+
+    assert recommended is not None
+    assert targets_connected(*prune(nodes_df, edges_df, recommended, target_zones), target_zones)
+    higher = nodes_df['path_coverage'][nodes_df['path_coverage'] > recommended].min()
+    assert not targets_connected(*prune(nodes_df, edges_df, higher, target_zones), target_zones)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from zone_index import ZoneIndex
+
+
+def make_nodes(seed=0):
+    # Shuffled ids, interleaved zones and repeated coverage values so zones tie
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'id': rng.permutation(400)[:200],
+                         'zone': rng.choice([173, 24, 59], size=200),
+                         'path_coverage': rng.integers(0, 5, size=200).astype(float)})
+
+
+def test_lookups_match_a_table_scan():
+    nodes_df = make_nodes()
+    index = ZoneIndex.from_nodes(nodes_df)
+    for zone in (173, 24, 59):
+        rows = nodes_df[nodes_df['zone'] == zone]
+        assert index.nodes(zone).tolist() == rows['id'].tolist()
+        assert index.rows(zone).tolist() == np.flatnonzero(nodes_df['zone'] == zone).tolist()
+        assert index.first_node(zone) == rows['id'].iloc[0]
+        assert index.count(zone) == len(rows)
+        assert index.coverage_sum(zone) == rows['path_coverage'].sum()
+        # Ties go to the first node in table order, as idxmax did
+        assert index.representative(zone) == nodes_df.loc[rows['path_coverage'].idxmax(), 'id']
+
+
+def test_missing_zone_and_per_node():
+    nodes_df = make_nodes()
+    index = ZoneIndex.from_nodes(nodes_df)
+    assert 999 not in index
+    assert index.first_node(999) is None
+    assert index.count(999) == 0
+    assert index.coverage_sum(999) == 0.0
+    assert index.per_node(index.zones).tolist() == nodes_df['zone'].tolist()
+
+
+def test_zones_without_coverage():
+    index = ZoneIndex([2, np.nan, 1, 2, np.nan])
+    assert index.nodes(2).tolist() == [0, 3]
+    assert index.nodes(1).tolist() == [2]
+    assert index.counts.tolist() == [2, 2, 1]
+    assert index.representatives is None
@@ -0,0 +1,164 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import minimum_spanning_tree
+
+from instrumentation import add_report_arguments, count, finish_from_arguments, start_from_arguments, timed
+from snapshot import load_snapshot
+
+# Connectivity of the algorithm5 pruned graph for every coverage_threshold in one pass.
+# Pruning keeps the target zone nodes and the nodes with path_coverage > threshold, so
+# lowering the threshold only adds nodes. Nodes are ranked once (target zones first,
+# then by decreasing coverage), every edge becomes active when its later endpoint is
+# added, and a union-find over the edges in activation order gives the state of every
+# threshold as a prefix of that order. Only the edges of a minimum spanning forest
+# (weighted by activation) can join two components, so the union-find runs on those.
+#
+# Connectivity is undirected (edge direction is ignored). The target zones are
+# connected when one component touches every target zone: each root keeps a bitmask
+# of the target zones in its component, OR-ed on union, so once full it stays full.
+
+
+def find(parent, node):
+    # Root of node, halving the path on the way
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+@timed('threshold_sweep.threshold_sweep')
+def threshold_sweep(nodes_df, edges_df, target_zones, thresholds):
+    # Returns (table, recommended): one row per threshold (decreasing) with the node
+    # and edge counts, the largest component and whether the target zones are
+    # connected, and the highest threshold keeping them connected (None if none does)
+    node_ids = nodes_df['id'].to_numpy(dtype=np.int64)
+    coverage = nodes_df['path_coverage'].to_numpy(dtype=np.float64)
+    zones = nodes_df['zone'].to_numpy()
+    zone_bit = {zone: i for i, zone in enumerate(target_zones)}
+    is_target = nodes_df['zone'].isin(target_zones).to_numpy()
+    num_targets = int(is_target.sum())
+
+    # Node order: target nodes, then the others by decreasing coverage
+    order = np.lexsort((-coverage, ~is_target))
+    num_ids = int(node_ids.max()) + 1 if len(node_ids) else 0
+    rank = np.full(num_ids, len(order), dtype=np.int64)
+    rank[node_ids[order]] = np.arange(len(order))
+    descending = coverage[order][num_targets:]
+
+    # An edge is active once both endpoints are; edges to unknown nodes never are
+    sources = edges_df['source'].to_numpy(dtype=np.int64)
+    targets = edges_df['target'].to_numpy(dtype=np.int64)
+    known = (sources < num_ids) & (targets < num_ids)
+    sources = rank[sources[known]]
+    targets = rank[targets[known]]
+    activation = np.maximum(sources, targets)
+
+    # Nodes and edges present at each threshold, from the highest threshold down
+    thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))[::-1]
+    num_nodes = num_targets + np.searchsorted(-descending, -thresholds, side='left')
+    num_edges = np.searchsorted(np.sort(activation), num_nodes, side='left')
+
+    # Spanning forest edges in activation order (weights must be positive; duplicate
+    # pairs share their activation, so keep one of each, and self-loops join nothing)
+    active = (activation < len(order)) & (sources != targets)
+    sources, targets, activation = sources[active], targets[active], activation[active]
+    pairs = np.unique(np.minimum(sources, targets) * len(order) + activation)
+    first, second = np.divmod(pairs, len(order))
+    forest = minimum_spanning_tree(sp.csr_matrix((second + 1.0, (first, second)),
+                                                 shape=(len(order), len(order)))).tocoo()
+    forest_order = np.argsort(forest.data, kind='stable')
+    forest_activation = (forest.data[forest_order] - 1).astype(np.int64)
+    forest_limits = np.searchsorted(forest_activation, num_nodes, side='left').tolist()
+    forest_sources = forest.row[forest_order].tolist()
+    forest_targets = forest.col[forest_order].tolist()
+
+    # Union-find over ranks
+    parent = list(range(len(order)))
+    size = [1] * len(order)
+    full = (1 << len(target_zones)) - 1
+    mask = [1 << zone_bit[zone] if target else 0 for zone, target in zip(zones[order].tolist(), is_target[order].tolist())]
+    connected = full == 0 or full in mask
+    largest = 1
+    # Rank of the node whose edges connected the target zones
+    connecting_rank = 0 if connected else None
+
+    rows = []
+    i = 0
+    for checkpoint in range(len(thresholds) + 1):
+        limit = forest_limits[checkpoint] if checkpoint < len(thresholds) else len(forest_sources)
+        if checkpoint == len(thresholds) and connected:
+            break
+        while i < limit:
+            a, b = find(parent, forest_sources[i]), find(parent, forest_targets[i])
+            if size[a] < size[b]:
+                a, b = b, a
+            parent[b] = a
+            size[a] += size[b]
+            mask[a] |= mask[b]
+            if size[a] > largest:
+                largest = size[a]
+            if not connected and mask[a] == full:
+                connected = True
+                connecting_rank = int(forest_activation[i])
+            i += 1
+        if checkpoint < len(thresholds):
+            rows.append({'coverage_threshold': float(thresholds[checkpoint]), 'nodes': int(num_nodes[checkpoint]),
+                         'edges': int(num_edges[checkpoint]),
+                         'largest_component': largest if num_nodes[checkpoint] else 0,
+                         'targets_connected': connected})
+    count('threshold_sweep_unions', i)
+
+    table = pd.DataFrame(rows, columns=['coverage_threshold', 'nodes', 'edges', 'largest_component',
+                                        'targets_connected'])
+    if connecting_rank is None:
+        return table, None
+    if connecting_rank < num_targets:
+        # The target zones alone are connected, any threshold keeps them so
+        return table, float(descending[0]) if len(descending) else 0.0
+    # Every node with the connecting node's coverage must stay, and pruning keeps
+    # coverage > threshold: the highest threshold is the largest value below it
+    critical = descending[connecting_rank - num_targets]
+    return table, float(np.nextafter(critical, -np.inf))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connectivity of the algorithm5 pruned graph for many coverage thresholds")
+    parser.add_argument('--nodes', default='nodes.csv')
+    parser.add_argument('--edges', default='edges.csv')
+    parser.add_argument('--snapshot', help="load nodes and edges from this binary snapshot instead of the CSVs")
+    parser.add_argument('--target-zones', default='173,53,24,215,59', help="comma-separated target zones")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=None,
+                        help="thresholds to report (default: the coverage at every 5th percentile)")
+    parser.add_argument('--output', default=None, help="write the table to this CSV")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    start_from_arguments(args)
+
+    if args.snapshot:
+        snapshot = load_snapshot(args.snapshot)
+        nodes_df, edges_df = snapshot.nodes_df(), snapshot.edges_df()
+    else:
+        nodes_df, edges_df = pd.read_csv(args.nodes), pd.read_csv(args.edges)
+
+    target_zones = [int(zone) for zone in args.target_zones.split(',')]
+    thresholds = args.thresholds
+    if thresholds is None:
+        thresholds = np.quantile(nodes_df['path_coverage'], np.linspace(0, 1, 21))
+    table, recommended = threshold_sweep(nodes_df, edges_df, target_zones, thresholds)
+
+    print(table.to_string(index=False))
+    if recommended is None:
+        print("The target zones are not connected at any threshold")
+    else:
+        print(f"Highest coverage_threshold keeping the target zones connected: {recommended:g}")
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+    finish_from_arguments(args)
+
+
+if __name__ == '__main__':
+    main()
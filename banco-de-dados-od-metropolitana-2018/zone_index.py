@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Nodes grouped by zone, built once from the nodes table so zone lookups do not scan
+# it. Rows are sorted by zone with a stable sort, so the nodes of a zone keep the
+# table's order; offsets[i]:offsets[i + 1] is the slice of the i-th zone.
+
+
+class ZoneIndex:
+    def __init__(self, zones, node_ids=None, coverage=None):
+        # Zones are numbered in order of first appearance; missing zones are a zone of their own
+        codes, uniques = pd.factorize(np.asarray(zones), use_na_sentinel=False)
+        self.codes = codes
+        self.zones = uniques
+        self.position = {zone: i for i, zone in enumerate(uniques.tolist())}
+
+        self.order = np.argsort(codes, kind='stable')
+        self.counts = np.bincount(codes, minlength=len(uniques))
+        self.offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.offsets[1:])
+
+        node_ids = np.arange(len(codes)) if node_ids is None else np.asarray(node_ids, dtype=np.int64)
+        self.node_ids = node_ids[self.order]
+
+        self.coverage_sums = None
+        self.representatives = None
+        if coverage is not None:
+            coverage = np.asarray(coverage, dtype=np.float64)
+            self.coverage_sums = np.bincount(codes, weights=coverage, minlength=len(uniques))
+            # Highest coverage per zone, ties going to the first node in table order like idxmax
+            best = np.lexsort((np.arange(len(codes)), -coverage, codes))
+            self.representatives = node_ids[best[self.offsets[:-1]]] if len(codes) else node_ids[:0]
+
+    @classmethod
+    def from_nodes(cls, nodes_df):
+        return cls(nodes_df['zone'].to_numpy(), nodes_df['id'].to_numpy(), nodes_df['path_coverage'].to_numpy())
+
+    def __contains__(self, zone):
+        return zone in self.position
+
+    def rows(self, zone):
+        # Positions of the zone's nodes in the nodes table
+        i = self.position[zone]
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def nodes(self, zone):
+        i = self.position[zone]
+        return self.node_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def first_node(self, zone):
+        # First node of the zone in table order, None if the zone has no nodes
+        if zone not in self.position:
+            return None
+        return int(self.node_ids[self.offsets[self.position[zone]]])
+
+    def count(self, zone):
+        return int(self.counts[self.position[zone]]) if zone in self.position else 0
+
+    def representative(self, zone):
+        return int(self.representatives[self.position[zone]])
+
+    def coverage_sum(self, zone):
+        return float(self.coverage_sums[self.position[zone]]) if zone in self.position else 0.0
+
+    def per_node(self, values):
+        # Broadcast one value per zone (in self.zones order) to every row of the table
+        return np.asarray(values)[self.codes]